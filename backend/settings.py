@@ -42,8 +42,10 @@ INSTALLED_APPS = [
     "quizes_agent",
     "diagram_agent",
     "summraiz_agent",
+    "studypack_agent",
     "file_processing",
     "chatbot_app",
+    "common",
     
 ]
 
@@ -127,6 +129,45 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files. Ingestion jobs keep their source here until they finish
+# so an interrupted job can be resumed.
+MEDIA_ROOT = BASE_DIR / 'media'
+INGESTION_ROOT = MEDIA_ROOT / 'ingestion'
+
+# The chatbot keeps knowledge-base readiness, ingestion jobs and chat sessions
+# in the default database, and job sources under INGESTION_ROOT. Workers on
+# one node share both. To run the chat service on several nodes, point
+# DATABASES at a server database (e.g. PostgreSQL) and INGESTION_ROOT at a
+# volume every node mounts, then set CHATBOT_MULTI_NODE so that
+# `manage.py check` (run by runserver and migrate) verifies it.
+CHATBOT_MULTI_NODE = False
+
+# A running ingestion job that has not checkpointed for this long is
+# considered abandoned and may be resumed by another worker.
+INGESTION_JOB_LEASE_SECONDS = 300
+
+# Minimum similarity between a chat question and a precomputed question for
+# the stored answer to be served without calling Gemini.
+CHATBOT_QA_MATCH_THRESHOLD = 0.92
+
+# Cache of summary, quiz, flashcard and diagram results (common/cache.py).
+# BACKEND "lru" keeps entries in each worker's memory; "django" uses the
+# CACHES alias ALIAS instead, e.g. a DatabaseCache shared by all workers
+# (run `python manage.py createcachetable` after configuring it).
+# Identical requests are coalesced within a process; CROSS_PROCESS also
+# coalesces them between workers through the common_generationlock table,
+# waiting at most LOCK_SECONDS. It needs the shared "django" backend.
+GENERATION_CACHE = {
+    'ENABLED': True,
+    'BACKEND': 'lru',
+    'ALIAS': 'default',
+    'TTL': 60 * 60 * 24,
+    'MAX_ENTRIES': 1000,
+    'MAX_BYTES': 64 * 1024 * 1024,
+    'CROSS_PROCESS': False,
+    'LOCK_SECONDS': 120,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -10,6 +10,7 @@ urlpatterns = [
     path('agent/', include('quizes_agent.urls')),
     path('agent/', include('diagram_agent.urls')),
     path('agent/', include('summraiz_agent.urls')),
+    path('agent/', include('studypack_agent.urls')),
     path('agent/', include('file_processing.urls')),
     path('agent/', include('chatbot_app.urls')),
     
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChatbotAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot_app'
+
+    def ready(self):
+        from . import checks  # noqa: F401
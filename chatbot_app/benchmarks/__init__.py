@@ -0,0 +1,48 @@
+import re
+import zlib
+import numpy as np
+
+# Offline stand-ins for the Cohere embedder, used by the benchmark commands.
+
+ARABIC_DIACRITICS = re.compile(r"[\u064B-\u0652\u0640]")
+TOKEN_PATTERN = re.compile(r"[\w\u0600-\u06FF]+")
+
+
+def normalize_token(token: str) -> str:
+    """
+    Lower-case Latin text and fold common Arabic letter variants.
+    """
+    token = ARABIC_DIACRITICS.sub("", token.lower())
+    return token.translate(str.maketrans("أإآىة", "ااايه"))
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-features embedder: words and character trigrams
+    hashed into a fixed number of dimensions, L2-normalized.
+
+    It is much weaker than embed-multilingual-light-v3.0 but needs no network
+    and gives the same vectors on every run, so chunking and top_k settings
+    can be compared against each other.
+    """
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def features(self, text: str):
+        for token in TOKEN_PATTERN.findall(text):
+            token = normalize_token(token)
+            yield token
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
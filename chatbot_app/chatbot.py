@@ -1,33 +1,125 @@
 import os
+import re
+import queue
+import threading
 import cohere
 from dotenv import load_dotenv
-from typing import List, Optional
-from langchain.text_splitter import CharacterTextSplitter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from langchain.docstore.document import Document
 from supabase import create_client, Client
 import google.generativeai as genai
+from django.conf import settings
+from common.language import contains_arabic
+from common.splitter import Chunk, iter_chunks
+from file_processing.utils import iter_file_pages
+from .models import KnowledgeBase
+from .router import ModelRouter, FAST_MODEL
+from .memory import ConversationMemory
+from .qa_index import QAIndex
+from .snapshot import SNAPSHOT_COLUMNS, read_snapshot, write_snapshot
 
 load_dotenv()
 
+# Knowledge bases are isolated by namespace so several users (and several
+# workers) can hold their own content in the shared Supabase table.
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+
+# Snapshots record the model so embeddings are never mixed across models
+EMBED_MODEL = "embed-multilingual-light-v3.0"
+
+NOT_READY_MESSAGE = "لم يتم تهيئة الروبوت المحادث بقاعدة معرفية بعد. يرجى تحميل النص أولاً."
+
+
+def normalize_namespace(namespace: Optional[str]) -> str:
+    """
+    Return a valid namespace, falling back to the default one.
+    Raises ValueError for namespaces with unsupported characters.
+    """
+    namespace = (namespace or "").strip() or DEFAULT_NAMESPACE
+    if not NAMESPACE_PATTERN.match(namespace):
+        raise ValueError(f"Invalid namespace: {namespace}")
+    return namespace
+
+
+# Marks the end of a stream passed between ingestion pipeline stages
+_PIPELINE_END = object()
+
+
+def _put(stage_queue: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Put an item on a bounded queue unless the pipeline was stopped.
+    """
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(stage_queue: queue.Queue, stop: threading.Event) -> Iterator:
+    """
+    Yield items from a queue until the end marker or until the pipeline is stopped.
+    """
+    while True:
+        try:
+            item = stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _PIPELINE_END:
+            return
+        yield item
+
+
+def join_pages(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Stream pages as one document, with a newline between consecutive pages.
+    Chunk offsets refer to this joined document.
+    """
+    for index, page in enumerate(pages):
+        if index:
+            yield "\n"
+        yield page
+
+
 class GymChatbot:
     def __init__(self):
         """
         Initialize the chatbot without immediately processing content.
+        Readiness is tracked per namespace in the database, not on the instance.
         """
         self.setup_gemini_api()
         self.supabase = self.initialize_supabase()
         self.setup_cohere_api()
-        self.is_initialized = False
+        # Chunking and retrieval settings; see the benchmark_retrieval command
         self.chunk_size = 1200
         self.chunk_overlap = 100
+        self.top_k = 6
+        self.match_threshold = 0.1
+        # Cohere accepts up to 96 texts per embed call
+        self.embed_batch_size = 96
+        # Bounded queues between extraction, chunking and embedding
+        self.page_queue_size = 8
+        self.batch_queue_size = 2
+        # Precomputed answers are served when a question is at least this similar
+        self.qa_match_threshold = getattr(settings, "CHATBOT_QA_MATCH_THRESHOLD", 0.92)
+        self.qa_index = QAIndex(self.supabase, self.router.models[FAST_MODEL], self.embed_texts)
 
     def setup_gemini_api(self):
         """
         Set up Google Gemini API configuration.
+        Answers are routed between gemini-1.5-flash and gemini-1.5-pro.
         """
         try:
             genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            self.model = genai.GenerativeModel(model_name="gemini-1.5-pro")
+            self.router = ModelRouter()
+            # Conversation summaries are cheap; always use the fast model
+            self.memory = ConversationMemory(self.router.models[FAST_MODEL])
         except Exception as e:
             print(f"Error setting up Gemini API: {e}")
             raise
@@ -67,7 +159,7 @@ class GymChatbot:
         try:
             response = self.client.embed(
                 texts=[text], 
-                model="embed-multilingual-light-v3.0",  # This model supports Arabic
+                model=EMBED_MODEL,  # This model supports Arabic
                 input_type=input_type
             )
             return response.embeddings[0]
@@ -75,140 +167,418 @@ class GymChatbot:
             print(f"Error generating embeddings: {e}")
             return None
 
-    def delete_all_data(self):
+    def embed_texts(self, texts: List[str], input_type: str = "search_document") -> List[List[float]]:
+        """
+        Generate embeddings for a batch of texts with a single Cohere call.
+        """
+        response = self.client.embed(
+            texts=texts,
+            model=EMBED_MODEL,
+            input_type=input_type
+        )
+        return response.embeddings
+
+    def is_ready(self, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        """
+        Check whether the knowledge base of a namespace is fully built.
+        The flag lives in the database so every worker sees the same state.
+        """
+        return KnowledgeBase.objects.filter(namespace=namespace, is_ready=True).exists()
+
+    def mark_ready(self, namespace: str, is_ready: bool, chunk_count: int = 0):
         """
-        Delete all records from Supabase.
+        Record the readiness of a namespace in shared storage.
+        """
+        KnowledgeBase.objects.update_or_create(
+            namespace=namespace,
+            defaults={"is_ready": is_ready, "chunk_count": chunk_count}
+        )
+
+    def has_qa_index(self, namespace: str) -> bool:
+        """
+        Whether precomputed answers were built for a namespace, so they are
+        only looked up where they exist.
+        """
+        return KnowledgeBase.objects.filter(namespace=namespace, has_qa_index=True).exists()
+
+    def delete_all_data(self, namespace: str = DEFAULT_NAMESPACE):
+        """
+        Delete all records of a namespace from Supabase.
         """
         try:
-            self.supabase.table("chatbotcontent").delete().neq("id", 0).execute()
-            self.is_initialized = False
+            self.mark_ready(namespace, False)
+            KnowledgeBase.objects.filter(namespace=namespace).update(has_qa_index=False)
+            self.supabase.table("chatbotcontent").delete().eq("namespace", namespace).execute()
+            self.qa_index.delete(namespace)
         except Exception as e:
             print(f"Error deleting data: {e}")
 
-    def process_text(self, text: str) -> bool:
+    def fetch_chunks(self, namespace: str, columns: str = "chunk_index, content",
+                     page_size: int = 1000) -> Iterator[dict]:
         """
-        Process text and create a vector store in Supabase.
-        Works with multilingual text including Arabic.
+        Yield the stored chunks of a namespace in document order, one page of rows at a time.
+        """
+        start = 0
+        while True:
+            response = self.supabase.table("chatbotcontent").select(columns) \
+                .eq("namespace", namespace).order("chunk_index") \
+                .range(start, start + page_size - 1).execute()
+            yield from response.data
+            if len(response.data) < page_size:
+                return
+            start += page_size
+
+    def export_snapshot(self, namespace: str, fileobj, dtype: str = "float16") -> dict:
+        """
+        Write the chunks and embeddings of a namespace to a snapshot file.
+        Returns the snapshot header.
+        """
+        return write_snapshot(fileobj, namespace, EMBED_MODEL,
+                              self.fetch_chunks(namespace, SNAPSHOT_COLUMNS), dtype)
+
+    def import_snapshot(self, fileobj, namespace: Optional[str] = None, batch_size: int = 500) -> dict:
+        """
+        Replace the knowledge base of a namespace (by default the one it was
+        exported from) with the content of a snapshot. No embedding calls are made.
+        Returns the snapshot header.
+        """
+        snapshot = read_snapshot(fileobj)
+        if snapshot.header["model"] != EMBED_MODEL:
+            raise ValueError(f"Snapshot was embedded with {snapshot.header['model']}, not {EMBED_MODEL}")
+        namespace = normalize_namespace(namespace or snapshot.header["namespace"])
+
+        self.delete_all_data(namespace)
+        for start in range(0, len(snapshot.chunks), batch_size):
+            self.supabase.table("chatbotcontent").insert([
+                dict(chunk, namespace=namespace, embedding=embedding.tolist())
+                for chunk, embedding in zip(snapshot.chunks[start:start + batch_size],
+                                            snapshot.embeddings[start:start + batch_size])
+            ]).execute()
+        self.mark_ready(namespace, True, len(snapshot.chunks))
+        return snapshot.header
+
+    def build_qa_index(self, namespace: str) -> int:
+        """
+        Precompute question/answer pairs for every chunk of a namespace.
+        Returns the number of pairs stored.
+        """
+        KnowledgeBase.objects.filter(namespace=namespace).update(has_qa_index=False)
+        self.qa_index.delete(namespace)
+        pairs = self.qa_index.build(namespace, self.fetch_chunks(namespace))
+        KnowledgeBase.objects.filter(namespace=namespace).update(has_qa_index=pairs > 0)
+        return pairs
+
+    def lookup_answer(self, query_embedding: List[float], namespace: str) -> Optional[str]:
+        """
+        Stored answer of a near-duplicate question, if the QA index has one.
         """
         try:
-            # Start fresh
-            self.delete_all_data()
-            
-            # Use langchain's CharacterTextSplitter which handles Unicode properly
-            text_splitter = CharacterTextSplitter(
-                chunk_size=self.chunk_size, 
-                chunk_overlap=self.chunk_overlap,
-                separator="\n"  # Use newlines as separators to respect Arabic text structure
-            )
-            split_texts = text_splitter.split_text(text)
-            
-            # Process each chunk
-            for chunk in split_texts:
-                # Ensure the text is properly encoded
-                embedding = self.embed_text(chunk, input_type="search_document")
-                if embedding:
-                    self.supabase.table("chatbotcontent").insert({
-                        "content": chunk,
-                        "embedding": embedding
-                    }).execute()
-                    
-            self.is_initialized = True
-            return True
+            match = self.qa_index.lookup(query_embedding, namespace, self.qa_match_threshold)
+            return match["answer"] if match else None
         except Exception as e:
-            print(f"Error processing text: {e}")
-            return False
+            print(f"Error looking up precomputed answers: {e}")
+            return None
 
-    def process_file(self, file_path: str) -> bool:
+    def split_stream(self, pages: Iterable[str]) -> Iterator[Chunk]:
         """
-        Process a file and create a vector store in Supabase.
-        Supports files with Arabic text.
+        Split a stream of pages into chunks with this chatbot's chunk settings.
+        Chunks end at Arabic or Latin sentence boundaries and carry their offsets.
         """
-        try:
-            # Use utf-8 encoding to properly handle Arabic characters
-            with open(file_path, "r", encoding="utf-8") as file:
-                text = file.read()
-            return self.process_text(text)
-        except UnicodeDecodeError:
-            # If utf-8 fails, try with another encoding common for Arabic
+        return iter_chunks(join_pages(pages), self.chunk_size, self.chunk_overlap)
+
+    def run_ingestion_pipeline(self, pages: Iterable[str], namespace: str, start_index: int = 0,
+                               on_batch: Optional[Callable[[int], None]] = None,
+                               on_split: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Extract, chunk and embed concurrently.
+
+        An extraction thread pulls pages into a bounded queue, the calling thread
+        splits them into chunks and groups full batches, and an embedding thread
+        embeds and inserts each batch while later pages are still being extracted.
+
+        Chunks are numbered in document order and stored with their chunk_index.
+        Chunks before start_index are skipped, which lets an interrupted ingestion
+        resume from its last checkpoint. on_batch is called with the number of
+        chunks committed so far after every inserted batch, and on_split with the
+        total number of chunks once the whole document has been split.
+        Returns the total number of chunks in the document.
+        """
+        stop = threading.Event()
+        errors = []
+        page_queue = queue.Queue(maxsize=self.page_queue_size)
+        batch_queue = queue.Queue(maxsize=self.batch_queue_size)
+
+        def extract():
             try:
-                with open(file_path, "r", encoding="cp1256") as file:  # Windows Arabic encoding
-                    text = file.read()
-                return self.process_text(text)
+                for page in pages:
+                    if not _put(page_queue, page, stop):
+                        return
             except Exception as e:
-                print(f"Error reading file with alternative encoding: {e}")
-                return False
+                errors.append(e)
+                stop.set()
+            finally:
+                _put(page_queue, _PIPELINE_END, stop)
+
+        def embed():
+            try:
+                for first_index, batch in _drain(batch_queue, stop):
+                    embeddings = self.embed_texts([chunk.text for chunk in batch], input_type="search_document")
+                    self.supabase.table("chatbotcontent").insert([
+                        {
+                            "namespace": namespace,
+                            "chunk_index": first_index + offset,
+                            "content": chunk.text,
+                            "start_offset": chunk.start,
+                            "end_offset": chunk.end,
+                            "embedding": embedding
+                        }
+                        for offset, (chunk, embedding) in enumerate(zip(batch, embeddings))
+                    ]).execute()
+                    if on_batch:
+                        on_batch(first_index + len(batch))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        extractor = threading.Thread(target=extract, daemon=True)
+        embedder = threading.Thread(target=embed, daemon=True)
+        extractor.start()
+        embedder.start()
+        total = 0
+        try:
+            batch = []
+            for index, chunk in enumerate(self.split_stream(_drain(page_queue, stop))):
+                total = index + 1
+                if index < start_index:
+                    continue
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    _put(batch_queue, (index + 1 - len(batch), batch), stop)
+                    batch = []
+            if batch:
+                _put(batch_queue, (total - len(batch), batch), stop)
+            _put(batch_queue, _PIPELINE_END, stop)
+            if on_split and not stop.is_set():
+                on_split(total)
+        except Exception:
+            stop.set()
+            raise
+        finally:
+            embedder.join()
+            stop.set()
+            extractor.join()
+
+        if errors:
+            raise errors[0]
+        return total
+
+    def delete_chunks_from(self, namespace: str, start_index: int):
+        """
+        Delete the chunks of a namespace stored at or after start_index.
+        Used to drop a batch that was inserted but never checkpointed.
+        """
+        self.supabase.table("chatbotcontent").delete() \
+            .eq("namespace", namespace).gte("chunk_index", start_index).execute()
+
+    def ingest_pages(self, pages: Iterable[str], namespace: str = DEFAULT_NAMESPACE) -> bool:
+        """
+        Rebuild the knowledge base of a namespace from a stream of pages.
+        Works with multilingual text including Arabic.
+        """
+        try:
+            # Start fresh, only for this namespace
+            self.delete_all_data(namespace)
+            chunk_count = self.run_ingestion_pipeline(pages, namespace)
+            self.mark_ready(namespace, True, chunk_count)
+            return True
         except Exception as e:
-            print(f"Error reading file: {e}")
+            print(f"Error processing text: {e}")
             return False
 
-    def retrieve_relevant_context(self, query: str, top_k: int = 6) -> List[str]:
+    def process_text(self, text: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
         """
-        Retrieve relevant context from Supabase.
+        Process text and create a vector store in Supabase.
+        Works with multilingual text including Arabic.
+        """
+        return self.ingest_pages([text], namespace)
+
+    def process_file(self, file_path: str, namespace: str = DEFAULT_NAMESPACE,
+                     file_ext: Optional[str] = None) -> bool:
+        """
+        Process a PDF, DOCX, PPTX, image or text file and create a vector store in Supabase.
+        Pages are streamed from the file_processing extractors into the pipeline.
+        """
+        file_ext = (file_ext or os.path.splitext(file_path)[1].lstrip(".")).lower()
+        return self.ingest_pages(iter_file_pages(file_path, file_ext), namespace)
+
+    def match_context(self, query_embedding: List[float], namespace: str,
+                      top_k: Optional[int] = None) -> List[str]:
+        """
+        Find the chunks of a namespace closest to an already computed query embedding.
+        """
+        # match_documents filters on chatbotcontent.namespace = filter_namespace
+        response = self.supabase.rpc(
+            'match_documents', 
+            {
+                'query_embedding': query_embedding,
+                'match_threshold': self.match_threshold,
+                'match_count': top_k or self.top_k,
+                'filter_namespace': namespace
+            }
+        ).execute()
+
+        return [row["content"] for row in response.data]
+
+    def retrieve_relevant_context(self, query: str, namespace: str = DEFAULT_NAMESPACE,
+                                  top_k: Optional[int] = None) -> List[str]:
+        """
+        Retrieve relevant context from Supabase, restricted to one namespace.
         Works with Arabic queries.
         """
         try:
-            if not self.is_initialized:
+            if not self.is_ready(namespace):
                 return []
                 
             query_embedding = self.embed_text(query)
             if not query_embedding:
                 return []
 
-            response = self.supabase.rpc(
-                'match_documents', 
-                {'query_embedding': query_embedding, 'match_threshold': 0.1, 'match_count': top_k}
-            ).execute()
-
-            return [row["content"] for row in response.data]
+            return self.match_context(query_embedding, namespace, top_k)
         except Exception as e:
             print(f"Error retrieving context: {e}")
             return []
 
-    def generate_response(self, query: str) -> str:
+    def build_prompt(self, query: str, context: List[str], history: str = "") -> str:
         """
-        Generate a response using Gemini.
-        Supports Arabic queries and responses.
+        Build the answer prompt in the language of the query.
         """
-        try:
-            if not self.is_initialized:
-                return "لم يتم تهيئة الروبوت المحادث بقاعدة معرفية بعد. يرجى تحميل النص أولاً."
-                
-            context = self.retrieve_relevant_context(query)
-            if not context:
-                return "لم أتمكن من العثور على معلومات محددة. هل يمكنك إعادة صياغة سؤالك؟"
-            
-            # Detect if the query is in Arabic to respond in the same language
-            is_arabic = any('\u0600' <= c <= '\u06FF' for c in query)
+        # Respond in Arabic if the query has any Arabic in it
+        if contains_arabic(query):
+            return f"""
+            أنت مساعد خبير في صالة الألعاب الرياضية. استخدم السياق التالي للإجابة على الاستفسار:
+
+            السياق:
+            {chr(10).join([f"- {chunk}" for chunk in context])}
+
+            {f"المحادثة السابقة:{chr(10)}{history}" if history else ""}
+
+            استفسار المستخدم: {query}
             
-            if is_arabic:
-                prompt = f"""
-                أنت مساعد خبير في صالة الألعاب الرياضية. استخدم السياق التالي للإجابة على الاستفسار:
+            أجب فقط بناءً على السياق المقدم. إذا لم يكن لديك معلومات كافية، فأخبر بذلك.
+            """
+        return f"""
+            You are an expert gym assistant. Use the following context to answer the query:
 
-                السياق:
-                {chr(10).join([f"- {chunk}" for chunk in context])}
+            Context:
+            {chr(10).join([f"- {chunk}" for chunk in context])}
 
-                استفسار المستخدم: {query}
-                
-                أجب فقط بناءً على السياق المقدم. إذا لم يكن لديك معلومات كافية، فأخبر بذلك.
-                """
-            else:
-                prompt = f"""
-                You are an expert gym assistant. Use the following context to answer the query:
+            {f"Conversation so far:{chr(10)}{history}" if history else ""}
+
+            User Query: {query}
+            
+            Answer based only on the provided context. If you don't have enough information, say so.
+            """
 
-                Context:
-                {chr(10).join([f"- {chunk}" for chunk in context])}
+    def error_message(self, query: str) -> str:
+        if contains_arabic(query):
+            return "حدث خطأ أثناء معالجة استفسارك."
+        return "An error occurred while processing your query."
 
-                User Query: {query}
+    def answer_from_context(self, query: str, context: List[str],
+                            latency_budget_ms: Optional[int] = None, history: str = "") -> str:
+        """
+        Generate the answer for retrieved context with the routed model.
+        """
+        if not context:
+            return "لم أتمكن من العثور على معلومات محددة. هل يمكنك إعادة صياغة سؤالك؟"
+        
+        answer, _ = self.router.generate(
+            self.build_prompt(query, context, history), query,
+            sum(len(chunk) for chunk in context), latency_budget_ms
+        )
+        return answer
+
+    def generate_response(self, query: str, namespace: str = DEFAULT_NAMESPACE,
+                          latency_budget_ms: Optional[int] = None,
+                          session_id: Optional[str] = None) -> str:
+        """
+        Generate a response using Gemini from the knowledge base of a namespace,
+        or from the precomputed QA index when a near-duplicate question is stored.
+        The model is picked by the router; latency_budget_ms caps how long the
+        client is willing to wait. With a session_id, the bounded conversation
+        history is added to the prompt and the turn is remembered.
+        Supports Arabic queries and responses.
+        """
+        try:
+            if not self.is_ready(namespace):
+                return NOT_READY_MESSAGE
                 
-                Answer based only on the provided context. If you don't have enough information, say so.
-                """
+            query_embedding = self.embed_text(query)
+            if not query_embedding:
+                return self.answer_from_context(query, [])
+            history = self.memory.history_for_prompt(session_id, namespace) if session_id else ""
             
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            # Common questions are answered from the precomputed index. Follow-ups
+            # depend on the conversation, so they always go through retrieval.
+            use_index = not history and self.has_qa_index(namespace)
+            answer = self.lookup_answer(query_embedding, namespace) if use_index else None
+            if answer is None:
+                context = self.match_context(query_embedding, namespace)
+                answer = self.answer_from_context(query, context, latency_budget_ms, history)
+                if not context:
+                    return answer
+            if session_id:
+                self.memory.append_turn(session_id, namespace, query, answer)
+            return answer
         
         except Exception as e:
             print(f"Error generating response: {e}")
-            if any('\u0600' <= c <= '\u06FF' for c in query):  # Check if query is in Arabic
-                return "حدث خطأ أثناء معالجة استفسارك."
-            else:
-                return "An error occurred while processing your query."
\ No newline at end of file
+            return self.error_message(query)
+
+    def generate_responses(self, queries: List[str], namespace: str = DEFAULT_NAMESPACE,
+                           latency_budget_ms: Optional[int] = None,
+                           max_concurrency: int = 4) -> Iterator[Tuple[int, str]]:
+        """
+        Answer many questions against one namespace.
+
+        All queries are embedded with as few Cohere calls as possible, retrievals
+        run concurrently, and at most max_concurrency Gemini calls run at a time.
+        Questions found in the precomputed QA index skip retrieval and Gemini.
+
+        The readiness check and the embeddings run before this returns, so their
+        errors are raised here; the returned iterator yields (index, answer)
+        pairs as answers complete.
+        """
+        if not self.is_ready(namespace):
+            return iter([(index, NOT_READY_MESSAGE) for index in range(len(queries))])
+
+        embeddings = []
+        for start in range(0, len(queries), self.embed_batch_size):
+            embeddings.extend(self.embed_texts(
+                queries[start:start + self.embed_batch_size], input_type="search_query"
+            ))
+        return self._answer_all(queries, embeddings, namespace, latency_budget_ms, max_concurrency)
+
+    def _answer_all(self, queries: List[str], embeddings: List[List[float]], namespace: str,
+                    latency_budget_ms: Optional[int], max_concurrency: int) -> Iterator[Tuple[int, str]]:
+        use_index = self.has_qa_index(namespace)
+
+        def answer(index):
+            query = queries[index]
+            try:
+                answer = self.lookup_answer(embeddings[index], namespace) if use_index else None
+                if answer is not None:
+                    return index, answer
+                context = self.match_context(embeddings[index], namespace)
+                # The semaphore bounds generation, not retrieval
+                with generation_slots:
+                    return index, self.answer_from_context(query, context, latency_budget_ms)
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                return index, self.error_message(query)
+
+        generation_slots = threading.BoundedSemaphore(max_concurrency)
+        with ThreadPoolExecutor(max_workers=max(max_concurrency * 2, 8)) as executor:
+            futures = [executor.submit(answer, index) for index in range(len(queries))]
+            for future in as_completed(futures):
+                yield future.result()
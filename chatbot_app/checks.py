@@ -0,0 +1,29 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def shared_state_check(app_configs, **kwargs):
+    """
+    With CHATBOT_MULTI_NODE, the state the chatbot shares between workers must
+    be on storage every node sees: a server database and a shared INGESTION_ROOT.
+    """
+    if not getattr(settings, "CHATBOT_MULTI_NODE", False):
+        return []
+
+    errors = []
+    if settings.DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+        errors.append(Error(
+            "CHATBOT_MULTI_NODE is set but the default database is SQLite, a file local to one node.",
+            hint="Use a database server such as PostgreSQL for knowledge bases, jobs and sessions.",
+            id="chatbot_app.E001",
+        ))
+    ingestion_root = Path(settings.INGESTION_ROOT).resolve()
+    if ingestion_root.is_relative_to(Path(settings.BASE_DIR).resolve()):
+        errors.append(Error(
+            "CHATBOT_MULTI_NODE is set but INGESTION_ROOT is inside the project directory of this node.",
+            hint="Point INGESTION_ROOT at a volume mounted by every node, so any node can resume a job.",
+            id="chatbot_app.E002",
+        ))
+    return errors
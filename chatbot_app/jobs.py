@@ -0,0 +1,191 @@
+import os
+import uuid
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from file_processing.utils import iter_file_pages
+from .models import IngestionJob
+
+# Background ingestion jobs.
+#
+# The source document is copied to INGESTION_ROOT before the job starts and the
+# job row is checkpointed after every batch committed to Supabase, so a job whose
+# worker died can be resumed from its last checkpoint instead of starting over.
+# While a job runs, a heartbeat thread keeps its lease fresh, since extracting
+# (and OCR-ing) a large document can take longer than the lease before the
+# first batch is committed.
+
+
+def create_job(namespace: str, file_ext: str, text: str = None, uploaded_file=None,
+               generate_qa: bool = False) -> IngestionJob:
+    """
+    Store the source of an ingestion durably and create its job row.
+    Either text or uploaded_file (a Django UploadedFile) must be given.
+    With generate_qa, question/answer pairs are precomputed after ingestion.
+    """
+    os.makedirs(settings.INGESTION_ROOT, exist_ok=True)
+    job_id = uuid.uuid4()
+    source_path = os.path.join(settings.INGESTION_ROOT, f"{job_id}.{file_ext}")
+
+    if uploaded_file is not None:
+        with open(source_path, 'wb') as destination:
+            for chunk in uploaded_file.chunks():
+                destination.write(chunk)
+    else:
+        with open(source_path, 'w', encoding='utf-8') as destination:
+            destination.write(text)
+
+    return IngestionJob.objects.create(
+        id=job_id,
+        namespace=namespace,
+        source_path=source_path,
+        file_ext=file_ext,
+        generate_qa=generate_qa
+    )
+
+
+def claim_job(job_id) -> bool:
+    """
+    Atomically mark a job as running.
+    Pending and failed jobs can always be claimed; running jobs only once their
+    lease has expired, i.e. the worker running them stopped sending heartbeats.
+    """
+    lease_expired = timezone.now() - timedelta(seconds=settings.INGESTION_JOB_LEASE_SECONDS)
+    claimable = Q(status__in=[IngestionJob.STATUS_PENDING, IngestionJob.STATUS_FAILED]) | \
+        Q(status=IngestionJob.STATUS_RUNNING, updated_at__lt=lease_expired)
+    return IngestionJob.objects.filter(claimable, id=job_id).update(
+        status=IngestionJob.STATUS_RUNNING,
+        error='',
+        updated_at=timezone.now()
+    ) == 1
+
+
+def keep_alive(job_id, stop: threading.Event):
+    """
+    Refresh the lease of a running job three times per INGESTION_JOB_LEASE_SECONDS
+    until stop is set, however long a single page or batch takes.
+    """
+    while not stop.wait(settings.INGESTION_JOB_LEASE_SECONDS / 3):
+        IngestionJob.objects.filter(id=job_id, status=IngestionJob.STATUS_RUNNING).update(
+            updated_at=timezone.now()
+        )
+
+
+def start_heartbeat(job_id) -> threading.Event:
+    """
+    Run keep_alive in a background thread; set the returned event to stop it.
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        try:
+            keep_alive(job_id, stop)
+        finally:
+            connection.close()
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    return stop
+
+
+def run_job(chatbot, job_id):
+    """
+    Run (or resume) an ingestion job in the current thread.
+    """
+    if not claim_job(job_id):
+        return
+
+    heartbeat = start_heartbeat(job_id)
+    job = IngestionJob.objects.get(id=job_id)
+    namespace = job.namespace
+    try:
+        if job.chunks_embedded == 0:
+            # Fresh start: replace the namespace's knowledge base
+            chatbot.delete_all_data(namespace)
+        else:
+            # Resume: drop anything inserted after the last checkpoint
+            chatbot.mark_ready(namespace, False)
+            chatbot.delete_chunks_from(namespace, job.chunks_embedded)
+
+        def checkpoint(chunks_embedded):
+            IngestionJob.objects.filter(id=job_id).update(
+                chunks_embedded=chunks_embedded,
+                updated_at=timezone.now()
+            )
+
+        def record_total(chunks_total):
+            IngestionJob.objects.filter(id=job_id).update(chunks_total=chunks_total)
+
+        total = chatbot.run_ingestion_pipeline(
+            iter_file_pages(job.source_path, job.file_ext),
+            namespace,
+            start_index=job.chunks_embedded,
+            on_batch=checkpoint,
+            on_split=record_total
+        )
+
+        chatbot.mark_ready(namespace, True, total)
+        IngestionJob.objects.filter(id=job_id).update(
+            status=IngestionJob.STATUS_COMPLETED,
+            chunks_embedded=total,
+            chunks_total=total,
+            updated_at=timezone.now()
+        )
+        if os.path.exists(job.source_path):
+            os.remove(job.source_path)
+
+        # The knowledge base is already usable; precomputed answers come on top
+        if job.generate_qa:
+            try:
+                qa_pairs = chatbot.build_qa_index(namespace)
+                IngestionJob.objects.filter(id=job_id).update(qa_pairs=qa_pairs)
+            except Exception as e:
+                print(f"Error building question index for job {job_id}: {e}")
+    except Exception as e:
+        print(f"Error running ingestion job {job_id}: {e}")
+        IngestionJob.objects.filter(id=job_id).update(
+            status=IngestionJob.STATUS_FAILED,
+            error=str(e),
+            updated_at=timezone.now()
+        )
+    finally:
+        heartbeat.set()
+        close_old_connections()
+
+
+def start_job(chatbot, job_id) -> threading.Thread:
+    """
+    Run an ingestion job in a background thread and return immediately.
+    """
+    thread = threading.Thread(target=run_job, args=(chatbot, job_id), daemon=True)
+    thread.start()
+    return thread
+
+
+def resumable_jobs():
+    """
+    Jobs that did not finish: pending, failed, or running with an expired lease.
+    """
+    lease_expired = timezone.now() - timedelta(seconds=settings.INGESTION_JOB_LEASE_SECONDS)
+    return IngestionJob.objects.filter(
+        Q(status__in=[IngestionJob.STATUS_PENDING, IngestionJob.STATUS_FAILED]) |
+        Q(status=IngestionJob.STATUS_RUNNING, updated_at__lt=lease_expired)
+    ).order_by('created_at')
+
+
+def job_status(job: IngestionJob) -> dict:
+    """
+    Progress report of a job as returned by the API.
+    """
+    return {
+        'job_id': str(job.id),
+        'namespace': job.namespace,
+        'status': job.status,
+        'chunks_embedded': job.chunks_embedded,
+        'chunks_total': job.chunks_total,
+        'generate_qa': job.generate_qa,
+        'qa_pairs': job.qa_pairs,
+        'error': job.error
+    }
@@ -0,0 +1,115 @@
+import json
+import time
+from pathlib import Path
+import numpy as np
+from django.core.management.base import BaseCommand
+from chatbot_app.benchmarks import HashingEmbedder
+from common.splitter import iter_chunks
+from chatbot_app.memory import estimate_tokens
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / "benchmarks" / "retrieval_corpus.json"
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def percentile_ms(samples, pct):
+    return round(float(np.percentile(samples, pct)) * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chunk size, overlap and top_k on a labeled Arabic+English corpus "
+        "with a deterministic local embedder (no API calls)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+        parser.add_argument("--chunk-sizes", type=int_list, default=[400, 800, 1200])
+        parser.add_argument("--overlaps", type=int_list, default=[0, 100, 200])
+        parser.add_argument("--top-k", type=int_list, default=[3, 6, 10])
+        parser.add_argument("--match-threshold", type=float, default=0.1)
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="Times each question is retrieved for the latency percentiles")
+        parser.add_argument("--output", default="retrieval_benchmark.json")
+
+    def handle(self, *args, **options):
+        corpus = json.loads(Path(options["corpus"]).read_text(encoding="utf-8"))
+        documents = [document["text"] for document in corpus["documents"]]
+        questions = corpus["questions"]
+        embedder = HashingEmbedder()
+
+        results = []
+        for chunk_size in options["chunk_sizes"]:
+            for overlap in options["overlaps"]:
+                if overlap >= chunk_size:
+                    continue
+
+                # Ingestion: split every document and embed its chunks
+                start = time.perf_counter()
+                chunks = [chunk.text for document in documents
+                          for chunk in iter_chunks(document, chunk_size, overlap)]
+                chunk_matrix = embedder.embed(chunks)
+                ingestion_seconds = time.perf_counter() - start
+
+                for top_k in options["top_k"]:
+                    results.append(self.run_retrieval(
+                        embedder, questions, chunks, chunk_matrix,
+                        top_k, options["match_threshold"], options["repeat"]
+                    ) | {
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": overlap,
+                        "chunks": len(chunks),
+                        "ingestion_ms": round(ingestion_seconds * 1000, 3)
+                    })
+                    row = results[-1]
+                    self.stdout.write(
+                        f"size={chunk_size:>5} overlap={overlap:>4} top_k={top_k:>3} "
+                        f"recall={row['recall_at_k']:.3f} tokens={row['mean_prompt_tokens']:>7.1f} "
+                        f"p50={row['retrieval_p50_ms']:.3f}ms p99={row['retrieval_p99_ms']:.3f}ms"
+                    )
+
+        report = {
+            "corpus": options["corpus"],
+            "documents": len(documents),
+            "questions": len(questions),
+            "embedder": f"hashing-{embedder.dimensions}",
+            "match_threshold": options["match_threshold"],
+            "results": results
+        }
+        Path(options["output"]).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+    def run_retrieval(self, embedder, questions, chunks, chunk_matrix,
+                      top_k, match_threshold, repeat):
+        """
+        Retrieve every question the way match_documents does: cosine similarity,
+        threshold, then the top_k best chunks.
+        """
+        hits = 0
+        prompt_tokens = []
+        latencies = []
+        for index, item in enumerate(questions):
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query = embedder.embed([item["question"]])[0]
+                scores = chunk_matrix @ query
+                count = min(top_k, len(chunks))
+                best = np.argpartition(-scores, count - 1)[:count]
+                best = best[np.argsort(-scores[best])]
+                best = best[scores[best] > match_threshold]
+                latencies.append(time.perf_counter() - start)
+
+            context = [chunks[i] for i in best]
+            if any(item["evidence"] in chunk for chunk in context):
+                hits += 1
+            prompt_tokens.append(sum(estimate_tokens(chunk) for chunk in context))
+
+        return {
+            "top_k": top_k,
+            "recall_at_k": round(hits / len(questions), 4),
+            "mean_prompt_tokens": round(float(np.mean(prompt_tokens)), 1),
+            "retrieval_p50_ms": percentile_ms(latencies, 50),
+            "retrieval_p99_ms": percentile_ms(latencies, 99)
+        }
@@ -0,0 +1,122 @@
+import gc
+import json
+import logging
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from langchain.text_splitter import CharacterTextSplitter
+from common.splitter import iter_chunks
+
+SENTENCES = [
+    "Progressive overload means adding weight, reps or sets every week.",
+    "Rest two to three minutes between heavy compound sets.",
+    "Protein intake of 1.6 to 2.2 grams per kilogram supports muscle growth.",
+    "Is zone 2 cardio really worth the time?",
+    "Keep the bar close to the shins during the deadlift!",
+    "التحميل التدريجي يعني زيادة الوزن أو التكرارات كل أسبوع.",
+    "استرح من دقيقتين إلى ثلاث دقائق بين المجموعات الثقيلة.",
+    "هل تمارين الكارديو بعد الأوزان أفضل؟",
+    "الكرياتين مونوهيدرات هو أكثر المكملات دراسة۔",
+    "اشرب حوالي 500 مليلتر من الماء قبل التمرين بساعتين.",
+]
+
+
+def make_pages(count=8, page_chars=64 * 1024, sentences_per_line=40, seed=0):
+    """
+    A few distinct pages of mixed Arabic/English text with few newlines,
+    which is where the newline-only splitter produces oversized chunks.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        parts = []
+        size = 0
+        while size < page_chars:
+            line = " ".join(rng.choice(SENTENCES) for _ in range(sentences_per_line)) + "\n"
+            parts.append(line)
+            size += len(line)
+        pages.append("".join(parts)[:page_chars])
+    return pages
+
+
+def stream_pages(pages, total_chars):
+    """
+    Yield the prebuilt pages in a cycle until total_chars have been produced.
+    """
+    produced = 0
+    index = 0
+    while produced < total_chars:
+        page = pages[index % len(pages)]
+        yield page
+        produced += len(page)
+        index += 1
+
+
+class Command(BaseCommand):
+    help = "Compare the streaming splitter with CharacterTextSplitter on throughput and peak memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=float, default=100)
+        parser.add_argument("--chunk-size", type=int, default=1200)
+        parser.add_argument("--chunk-overlap", type=int, default=100)
+        parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+
+    def handle(self, *args, **options):
+        # CharacterTextSplitter logs a warning for every oversized chunk
+        logging.getLogger("langchain_text_splitters").setLevel(logging.ERROR)
+        logging.getLogger("langchain.text_splitter").setLevel(logging.ERROR)
+
+        total_chars = int(options["size_mb"] * 1024 * 1024)
+        chunk_size = options["chunk_size"]
+        chunk_overlap = options["chunk_overlap"]
+        pages = make_pages()
+
+        def legacy():
+            # The current splitter needs the whole document as one string
+            text = "".join(stream_pages(pages, total_chars))
+            splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separator="\n")
+            return [len(chunk) for chunk in splitter.split_text(text)]
+
+        def streaming():
+            return [len(chunk.text) for chunk in
+                    iter_chunks(stream_pages(pages, total_chars), chunk_size, chunk_overlap)]
+
+        results = {}
+        for name, run in [("character_text_splitter", legacy), ("streaming_splitter", streaming)]:
+            gc.collect()
+            start = time.perf_counter()
+            lengths = run()
+            seconds = time.perf_counter() - start
+
+            # Separate run for memory, tracemalloc slows everything down
+            gc.collect()
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                "seconds": round(seconds, 3),
+                "throughput_mb_s": round(total_chars / 1024 / 1024 / seconds, 2),
+                "peak_memory_mb": round(peak / 1024 / 1024, 2),
+                "chunks": len(lengths),
+                "max_chunk_chars": max(lengths, default=0),
+                "oversized_chunks": sum(1 for length in lengths if length > chunk_size)
+            }
+            row = results[name]
+            self.stdout.write(
+                f"{name:<24} {row['throughput_mb_s']:>8.2f} MB/s  peak {row['peak_memory_mb']:>9.2f} MB  "
+                f"{row['chunks']} chunks, max {row['max_chunk_chars']} chars, {row['oversized_chunks']} oversized"
+            )
+
+        if options["output"]:
+            report = {
+                "size_mb": options["size_mb"],
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "results": results
+            }
+            Path(options["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
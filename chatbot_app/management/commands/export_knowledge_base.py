@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot_app.chatbot import GymChatbot, normalize_namespace
+from chatbot_app.snapshot import DTYPES
+
+
+class Command(BaseCommand):
+    help = "Export the chunks and embeddings of a knowledge base to a snapshot file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Snapshot file to write")
+        parser.add_argument("--namespace", default=None)
+        parser.add_argument("--dtype", choices=DTYPES, default="float16",
+                            help="Embedding precision; int8 is half the size of float16")
+
+    def handle(self, *args, **options):
+        try:
+            namespace = normalize_namespace(options["namespace"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chatbot = GymChatbot()
+        with open(options["output"], "wb") as output:
+            header = chatbot.export_snapshot(namespace, output, options["dtype"])
+        if not header["count"]:
+            self.stdout.write(self.style.WARNING(f"Namespace {namespace} has no chunks"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {header['count']} chunks ({header['dimensions']} dimensions, "
+            f"{header['dtype']}) from {namespace} to {options['output']}"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot_app.chatbot import GymChatbot
+
+
+class Command(BaseCommand):
+    help = "Restore a knowledge base from a snapshot file without re-embedding it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Snapshot file written by export_knowledge_base")
+        parser.add_argument("--namespace", default=None,
+                            help="Target namespace; defaults to the one the snapshot was exported from")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chatbot = GymChatbot()
+        try:
+            with open(options["input"], "rb") as snapshot:
+                header = chatbot.import_snapshot(snapshot, options["namespace"], options["batch_size"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {header['count']} chunks into {options['namespace'] or header['namespace']}"
+        ))
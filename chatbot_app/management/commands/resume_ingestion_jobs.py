@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from chatbot_app.chatbot import GymChatbot
+from chatbot_app import jobs
+
+
+class Command(BaseCommand):
+    help = "Resume unfinished chatbot ingestion jobs from their last checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_ids", nargs="*", help="Only resume these jobs")
+
+    def handle(self, *args, **options):
+        pending = jobs.resumable_jobs()
+        if options["job_ids"]:
+            pending = pending.filter(id__in=options["job_ids"])
+
+        chatbot = GymChatbot()
+        for job in pending:
+            self.stdout.write(f"Resuming {job.id} ({job.namespace}) from chunk {job.chunks_embedded}")
+            jobs.run_job(chatbot, job.id)
+            job.refresh_from_db()
+            self.stdout.write(f"  {job.status}: {job.chunks_embedded}/{job.chunks_total or '?'} chunks")
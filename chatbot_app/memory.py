@@ -0,0 +1,175 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from django.db import close_old_connections, transaction
+from .models import ChatSession
+
+# Session ids are chosen by the client
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+
+
+def validate_session_id(session_id: Optional[str]) -> Optional[str]:
+    """
+    Return the session id, or None if none was given.
+    Raises ValueError for session ids with unsupported characters.
+    """
+    session_id = (session_id or "").strip()
+    if not session_id:
+        return None
+    if not SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"Invalid session id: {session_id}")
+    return session_id
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count. Three characters per token is conservative for both
+    English and Arabic, which tokenizes into more pieces per word.
+    """
+    return (len(text) + 2) // 3
+
+
+class ConversationMemory:
+    """
+    Server-side chat sessions with bounded prompt history.
+
+    The last max_turns turns are kept verbatim. Older turns are folded into a
+    rolling summary by a background thread, off the request path. Whatever the
+    state of the summary, the history put in a prompt never exceeds max_tokens.
+    """
+
+    def __init__(self, summarizer, max_turns: int = 6, max_tokens: int = 1500,
+                 max_turn_chars: int = 1200, max_stored_turns: int = 30):
+        # summarizer: a genai.GenerativeModel, normally gemini-1.5-flash
+        self.summarizer = summarizer
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_turn_chars = max_turn_chars
+        # Hard limit on stored turns in case summarization keeps failing
+        self.max_stored_turns = max_stored_turns
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.folding = set()
+        self.lock = threading.Lock()
+
+    def belongs_to(self, session_id: str, namespace: str) -> bool:
+        """
+        Whether a session can be used with namespace: it is new or was started there.
+        """
+        return not ChatSession.objects.filter(session_id=session_id).exclude(namespace=namespace).exists()
+
+    def history_for_prompt(self, session_id: str, namespace: str) -> str:
+        """
+        Summary plus recent turns of a session of namespace, trimmed to max_tokens.
+        The oldest verbatim turns are dropped first, then the summary is cut.
+        """
+        session = ChatSession.objects.filter(session_id=session_id, namespace=namespace).first()
+        if session is None:
+            return ""
+
+        turns: List[str] = [
+            f"User: {turn['question'][:self.max_turn_chars]}\n"
+            f"Assistant: {turn['answer'][:self.max_turn_chars]}"
+            for turn in session.turns[-self.max_turns:]
+        ]
+        budget = self.max_tokens
+        kept = []
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn)
+            if cost > budget:
+                break
+            kept.insert(0, turn)
+            budget -= cost
+
+        summary = session.summary
+        if summary and estimate_tokens(summary) > budget:
+            summary = summary[:budget * 3]
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        parts.extend(kept)
+        return "\n\n".join(parts)
+
+    def append_turn(self, session_id: str, namespace: str, question: str, answer: str):
+        """
+        Store a turn and schedule folding once there are more than max_turns.
+        Raises ValueError if the session was started in another namespace.
+        """
+        ChatSession.objects.get_or_create(session_id=session_id, defaults={"namespace": namespace})
+        with transaction.atomic():
+            # Locked, so concurrent turns of one session are appended one after the other
+            session = ChatSession.objects.select_for_update().get(session_id=session_id)
+            if session.namespace != namespace:
+                raise ValueError(f"Session {session_id} belongs to another namespace")
+            session.turns = (session.turns + [{"question": question, "answer": answer}])[-self.max_stored_turns:]
+            session.turn_count += 1
+            session.save(update_fields=["turns", "turn_count", "updated_at"])
+
+        if len(session.turns) > self.max_turns:
+            self.schedule_fold(session_id)
+
+    def schedule_fold(self, session_id: str):
+        with self.lock:
+            if session_id in self.folding:
+                return
+            self.folding.add(session_id)
+        self.executor.submit(self._fold, session_id)
+
+    def _fold(self, session_id: str):
+        """
+        Fold the turns older than the last max_turns into the rolling summary.
+        """
+        try:
+            session = ChatSession.objects.filter(session_id=session_id).first()
+            if session is None or len(session.turns) <= self.max_turns:
+                return
+            overflow = session.turns[:-self.max_turns]
+            # Turns are numbered from the first one ever appended; the folded ones
+            # are those numbered below folded_until
+            folded_until = session.turn_count - len(session.turns) + len(overflow)
+
+            transcript = "\n".join(
+                f"User: {turn['question'][:self.max_turn_chars]}\nAssistant: {turn['answer'][:self.max_turn_chars]}"
+                for turn in overflow
+            )
+            prompt = f"""
+            Update the running summary of a conversation with the new turns below.
+            Keep facts, user goals and open questions. Write in the language of the conversation.
+            Answer with the updated summary only, in at most {self.max_tokens // 2} tokens.
+
+            Current summary:
+            {session.summary or "(empty)"}
+
+            New turns:
+            {transcript}
+            """
+            summary = self.summarizer.generate_content(prompt).text.strip()
+
+            with transaction.atomic():
+                # The same row: a session cleared and started again meanwhile has another one
+                summarized_turns = session.summarized_turns
+                session = ChatSession.objects.select_for_update().get(pk=session.pk)
+                if session.summarized_turns != summarized_turns:
+                    # Another worker folded these turns first
+                    return
+                # Turns may have been appended, and the oldest trimmed by append_turn,
+                # meanwhile; drop whichever folded ones are still stored
+                first_stored = session.turn_count - len(session.turns)
+                session.turns = session.turns[max(0, folded_until - first_stored):]
+                session.summary = summary
+                session.summarized_turns += len(overflow)
+                session.save(update_fields=["turns", "summary", "summarized_turns", "updated_at"])
+        except Exception as e:
+            print(f"Error summarizing session {session_id}: {e}")
+        finally:
+            with self.lock:
+                self.folding.discard(session_id)
+            close_old_connections()
+
+    def clear(self, session_id: str, namespace: str) -> bool:
+        """
+        Forget a session of namespace; returns whether there was one.
+        """
+        deleted, _ = ChatSession.objects.filter(session_id=session_id, namespace=namespace).delete()
+        return bool(deleted)
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0003_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=128, unique=True)),
+                ('namespace', models.CharField(max_length=128)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('turns', models.JSONField(default=list)),
+                ('summarized_turns', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0004_chatsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='generate_qa',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='qa_pairs',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
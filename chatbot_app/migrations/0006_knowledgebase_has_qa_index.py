@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0005_ingestionjob_generate_qa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='has_qa_index',
+            field=models.BooleanField(default=False),
+        ),
+    ]
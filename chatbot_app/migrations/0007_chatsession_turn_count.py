@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+def count_existing_turns(apps, schema_editor):
+    ChatSession = apps.get_model('chatbot_app', 'ChatSession')
+    for session in ChatSession.objects.all():
+        session.turn_count = session.summarized_turns + len(session.turns)
+        session.save(update_fields=['turn_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot_app', '0006_knowledgebase_has_qa_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='turn_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_turns, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 
 class ChatDocument(models.Model):
@@ -6,4 +7,64 @@ class ChatDocument(models.Model):
     processed = models.BooleanField(default=False)
     
     def __str__(self):
-        return f"{self.document.name} (Processed: {self.processed})"
\ No newline at end of file
+        return f"{self.document.name} (Processed: {self.processed})"
+
+
+class KnowledgeBase(models.Model):
+    namespace = models.CharField(max_length=128, unique=True)
+    is_ready = models.BooleanField(default=False)
+    chunk_count = models.IntegerField(default=0)
+    # Whether precomputed question/answer pairs are stored for this namespace
+    has_qa_index = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.namespace} (Ready: {self.is_ready})"
+
+
+class IngestionJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    namespace = models.CharField(max_length=128)
+    source_path = models.CharField(max_length=512)
+    file_ext = models.CharField(max_length=16)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # Checkpoint: chunks [0, chunks_embedded) are committed to Supabase
+    chunks_embedded = models.IntegerField(default=0)
+    # Unknown until the whole document has been split
+    chunks_total = models.IntegerField(null=True, blank=True)
+    # Optional stage: precompute question/answer pairs once the chunks are stored
+    generate_qa = models.BooleanField(default=False)
+    qa_pairs = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.namespace} [{self.status}] {self.chunks_embedded}/{self.chunks_total or '?'}"
+
+
+class ChatSession(models.Model):
+    session_id = models.CharField(max_length=128, unique=True)
+    namespace = models.CharField(max_length=128)
+    # Rolling summary of the turns that no longer fit verbatim
+    summary = models.TextField(blank=True, default='')
+    # Most recent turns, oldest first: [{"question": ..., "answer": ...}]
+    turns = models.JSONField(default=list)
+    summarized_turns = models.IntegerField(default=0)
+    # Turns ever appended; the stored turns are the last len(turns) of them
+    turn_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.session_id} ({len(self.turns)} turns, {self.summarized_turns} summarized)"
@@ -0,0 +1,106 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+# Precomputed question/answer pairs per knowledge base.
+#
+# At ingestion time Gemini Flash writes likely questions with answers for every
+# chunk. The questions are embedded and stored in the chatbot_qa table, so a
+# near-duplicate question at chat time is answered straight from the index,
+# without retrieval or a Gemini call.
+
+QA_PROMPT = """
+Write {count} questions that a student or gym member is likely to ask about the text below,
+each with a short, self-contained answer taken only from the text.
+Write the questions and answers in the language of the text.
+Return a JSON list of objects with the keys "question" and "answer".
+
+Text:
+{text}
+"""
+
+
+class QAIndex:
+    def __init__(self, supabase, model, embed_texts: Callable[..., List[List[float]]],
+                 questions_per_chunk: int = 3, max_workers: int = 4, embed_batch_size: int = 96):
+        self.supabase = supabase
+        # A genai.GenerativeModel, normally gemini-1.5-flash
+        self.model = model
+        self.embed_texts = embed_texts
+        self.questions_per_chunk = questions_per_chunk
+        self.max_workers = max_workers
+        self.embed_batch_size = embed_batch_size
+
+    def generate_pairs(self, chunk: str) -> List[dict]:
+        """
+        Ask Gemini for question/answer pairs about one chunk.
+        """
+        response = self.model.generate_content(
+            QA_PROMPT.format(count=self.questions_per_chunk, text=chunk),
+            generation_config={"response_mime_type": "application/json", "temperature": 0.3}
+        )
+        pairs = json.loads(response.text)
+        return [
+            {"question": pair["question"].strip(), "answer": pair["answer"].strip()}
+            for pair in pairs
+            if isinstance(pair, dict) and pair.get("question") and pair.get("answer")
+        ]
+
+    def build(self, namespace: str, chunks: Iterable[dict]) -> int:
+        """
+        Generate, embed and store pairs for chunks ({"chunk_index", "content"} rows).
+        Chunks are processed concurrently; a chunk that fails is skipped.
+        Returns the number of stored pairs.
+        """
+        def generate(chunk):
+            try:
+                return chunk["chunk_index"], self.generate_pairs(chunk["content"])
+            except Exception as e:
+                print(f"Error generating questions for chunk {chunk['chunk_index']}: {e}")
+                return chunk["chunk_index"], []
+
+        stored = 0
+        pending = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for chunk_index, pairs in executor.map(generate, chunks):
+                pending.extend(dict(pair, chunk_index=chunk_index) for pair in pairs)
+                if len(pending) >= self.embed_batch_size:
+                    stored += self.store(namespace, pending)
+                    pending = []
+        if pending:
+            stored += self.store(namespace, pending)
+        return stored
+
+    def store(self, namespace: str, pairs: List[dict]) -> int:
+        # Questions are matched against user questions, so both use search_query
+        embeddings = self.embed_texts([pair["question"] for pair in pairs], input_type="search_query")
+        self.supabase.table("chatbot_qa").insert([
+            {
+                "namespace": namespace,
+                "chunk_index": pair["chunk_index"],
+                "question": pair["question"],
+                "answer": pair["answer"],
+                "embedding": embedding
+            }
+            for pair, embedding in zip(pairs, embeddings)
+        ]).execute()
+        return len(pairs)
+
+    def lookup(self, query_embedding: List[float], namespace: str, threshold: float) -> Optional[dict]:
+        """
+        The stored pair whose question is most similar to the query, if it reaches threshold.
+        """
+        # match_qa filters on chatbot_qa.namespace = filter_namespace
+        response = self.supabase.rpc(
+            'match_qa',
+            {
+                'query_embedding': query_embedding,
+                'match_threshold': threshold,
+                'match_count': 1,
+                'filter_namespace': namespace
+            }
+        ).execute()
+        return response.data[0] if response.data else None
+
+    def delete(self, namespace: str):
+        self.supabase.table("chatbot_qa").delete().eq("namespace", namespace).execute()
@@ -0,0 +1,161 @@
+import re
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, Optional, Tuple
+import google.generativeai as genai
+
+FAST_MODEL = "gemini-1.5-flash"
+SLOW_MODEL = "gemini-1.5-pro"
+
+# Words that usually mean the answer needs reasoning rather than a lookup
+COMPLEX_QUERY_PATTERN = re.compile(
+    r"\b(why|how|compare|difference|explain|analy[sz]e|plan|recommend|versus|vs)\b"
+    r"|لماذا|كيف|قارن|الفرق|اشرح|حلل|خطة|انصح",
+    re.IGNORECASE
+)
+
+
+class LatencyStats:
+    """
+    Rolling per-model latency samples, used both for routing and for tuning thresholds.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.samples: Dict[str, deque] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def record_timeout(self, model: str):
+        with self.lock:
+            self.timeouts[model] = self.timeouts.get(model, 0) + 1
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        with self.lock:
+            values = sorted(self.samples.get(model, ()))
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self.lock:
+            counts = {model: len(samples) for model, samples in self.samples.items()}
+        report = {}
+        for model, count in counts.items():
+            p50 = self.percentile(model, 50)
+            p95 = self.percentile(model, 95)
+            report[model] = {
+                "count": count,
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                "timeouts": self.timeouts.get(model, 0)
+            }
+        return report
+
+
+class ModelRouter:
+    """
+    Route chat answers between a fast and a slow Gemini model.
+
+    Simple lookups go to the fast model. Complex questions go to the slow model
+    unless its expected latency does not fit the client's budget. A slow call
+    that overruns its deadline is abandoned and the fast model answers instead.
+    At most max_workers slow calls run at once, including abandoned ones that
+    are still running; beyond that the fast model answers rather than queueing.
+    """
+
+    def __init__(self, fast_model: str = FAST_MODEL, slow_model: str = SLOW_MODEL,
+                 slow_deadline: float = 8.0, complex_query_chars: int = 160,
+                 large_context_chars: int = 6000, max_workers: int = 8):
+        self.fast_model = fast_model
+        self.slow_model = slow_model
+        self.slow_deadline = slow_deadline
+        self.complex_query_chars = complex_query_chars
+        self.large_context_chars = large_context_chars
+        self.models = {
+            fast_model: genai.GenerativeModel(model_name=fast_model),
+            slow_model: genai.GenerativeModel(model_name=slow_model)
+        }
+        # Expected latency before any samples exist, in seconds
+        self.default_latency = {fast_model: 1.5, slow_model: 5.0}
+        self.stats = LatencyStats()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # One slot per pool thread, so a slow call never waits in the pool's queue
+        self.slow_slots = threading.BoundedSemaphore(max_workers)
+
+    def is_complex(self, query: str, context_chars: int) -> bool:
+        """
+        Guess whether a query needs the slow model.
+        """
+        if len(query) >= self.complex_query_chars:
+            return True
+        if query.count("?") + query.count("؟") > 1:
+            return True
+        if COMPLEX_QUERY_PATTERN.search(query):
+            return True
+        # Lots of retrieved context is more material to reason over
+        return context_chars >= self.large_context_chars
+
+    def expected_latency(self, model: str, context_chars: int) -> float:
+        """
+        Expected latency in seconds: observed p50, scaled up for large prompts.
+        """
+        p50 = self.stats.percentile(model, 50) or self.default_latency[model]
+        return p50 * max(1.0, context_chars / self.large_context_chars)
+
+    def choose(self, query: str, context_chars: int, budget_ms: Optional[int] = None) -> str:
+        """
+        Pick the model for a query.
+        """
+        if not self.is_complex(query, context_chars):
+            return self.fast_model
+        if budget_ms is not None and self.expected_latency(self.slow_model, context_chars) * 1000 > budget_ms:
+            return self.fast_model
+        return self.slow_model
+
+    def _call(self, model: str, prompt: str) -> str:
+        start = time.monotonic()
+        try:
+            return self.models[model].generate_content(prompt).text.strip()
+        finally:
+            self.stats.record(model, time.monotonic() - start)
+
+    def generate(self, prompt: str, query: str, context_chars: int,
+                 budget_ms: Optional[int] = None) -> Tuple[str, str]:
+        """
+        Generate an answer and return it together with the model that produced it.
+        """
+        model = self.choose(query, context_chars, budget_ms)
+        if model == self.fast_model:
+            return self._call(model, prompt), model
+
+        deadline = self.slow_deadline
+        if budget_ms is not None:
+            deadline = min(deadline, budget_ms / 1000)
+
+        if not self.slow_slots.acquire(blocking=False):
+            print(f"{model} is saturated, answering with {self.fast_model}")
+            return self._call(self.fast_model, prompt), self.fast_model
+        try:
+            future = self.executor.submit(self._call, model, prompt)
+        except Exception:
+            self.slow_slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slow_slots.release())
+        try:
+            return future.result(timeout=deadline), model
+        except TimeoutError:
+            # Cancelled if it has not started; otherwise it keeps its slot until it
+            # ends, and its latency is recorded then
+            future.cancel()
+            self.stats.record_timeout(model)
+            print(f"{model} exceeded {deadline:.1f}s, falling back to {self.fast_model}")
+        except Exception as e:
+            print(f"{model} failed ({e}), falling back to {self.fast_model}")
+        return self._call(self.fast_model, prompt), self.fast_model
@@ -0,0 +1,184 @@
+import itertools
+import json
+import shutil
+import struct
+import tempfile
+import zlib
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, List, NamedTuple
+import numpy as np
+
+# Knowledge-base snapshots.
+#
+# A snapshot holds everything stored for a namespace in chatbotcontent, so a
+# knowledge base can be restored with a bulk insert instead of re-embedding.
+#
+# Layout (little-endian):
+#   MAGIC
+#   uint32 header length, header JSON (namespace, model, count, dimensions, dtype, ...)
+#   int32[count]  chunk_index
+#   int64[count]  start_offset (-1 when unknown)
+#   int64[count]  end_offset (-1 when unknown)
+#   uint32[count] UTF-8 byte length of each chunk text
+#   zlib-compressed UTF-8 chunk texts, header["text_bytes"] bytes
+#   float32[count] per-row scale (int8 only)
+#   embeddings, count x dimensions float16 or int8
+
+MAGIC = b"GKBSNAP\x01"
+FORMAT_VERSION = 1
+DTYPES = ("float16", "int8")
+SNAPSHOT_COLUMNS = "chunk_index, content, start_offset, end_offset, embedding"
+# Rows converted at a time while writing; the rest of a namespace is never in memory
+WRITE_BATCH_ROWS = 1000
+
+
+class Snapshot(NamedTuple):
+    header: dict
+    # {"chunk_index", "content", "start_offset", "end_offset"} per chunk, in document order
+    chunks: List[dict]
+    # float32, count x dimensions
+    embeddings: np.ndarray
+
+
+def parse_embedding(value) -> List[float]:
+    """
+    pgvector columns come back from PostgREST as a "[0.1,0.2,...]" string.
+    """
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def quantize(matrix: np.ndarray, dtype: str):
+    """
+    Pack a float32 matrix as float16, or as int8 with one scale per row.
+    Returns (values, scales); scales is None for float16.
+    """
+    if dtype == "float16":
+        return matrix.astype("<f2"), None
+    scales = np.abs(matrix).max(axis=1, initial=0) / 127
+    scales[scales == 0] = 1
+    values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype("i1")
+    return values, scales.astype("<f4")
+
+
+def dequantize(values: np.ndarray, scales) -> np.ndarray:
+    matrix = values.astype(np.float32)
+    if scales is not None:
+        matrix *= scales[:, None]
+    return matrix
+
+
+def write_snapshot(fileobj: BinaryIO, namespace: str, model: str, rows: Iterable[dict],
+                   dtype: str = "float16") -> dict:
+    """
+    Write the rows of a namespace (SNAPSHOT_COLUMNS) as a snapshot.
+
+    Rows are consumed as they come, WRITE_BATCH_ROWS at a time: each column
+    is spooled to a temporary file, and the columns are copied after the
+    header once the counts are known.
+    Returns the header.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+
+    with ExitStack() as stack:
+        columns = {
+            name: stack.enter_context(tempfile.TemporaryFile())
+            for name in ("indexes", "starts", "ends", "lengths", "texts", "scales", "values")
+        }
+        compressor = zlib.compressobj(6)
+        count, dimensions = 0, None
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, WRITE_BATCH_ROWS))
+            if not batch:
+                break
+            texts = [row["content"].encode("utf-8") for row in batch]
+            matrix = np.asarray([parse_embedding(row["embedding"]) for row in batch], dtype=np.float32)
+            if matrix.ndim != 2 or dimensions not in (None, matrix.shape[1]):
+                raise ValueError("Embeddings must all have the same number of dimensions")
+            dimensions = matrix.shape[1]
+            values, scales = quantize(matrix, dtype)
+
+            columns["indexes"].write(np.asarray([row["chunk_index"] for row in batch], dtype="<i4").tobytes())
+            columns["starts"].write(np.asarray(
+                [-1 if row.get("start_offset") is None else row["start_offset"] for row in batch], dtype="<i8"
+            ).tobytes())
+            columns["ends"].write(np.asarray(
+                [-1 if row.get("end_offset") is None else row["end_offset"] for row in batch], dtype="<i8"
+            ).tobytes())
+            columns["lengths"].write(np.asarray([len(text) for text in texts], dtype="<u4").tobytes())
+            columns["texts"].write(compressor.compress(b"".join(texts)))
+            if scales is not None:
+                columns["scales"].write(scales.tobytes())
+            columns["values"].write(values.tobytes())
+            count += len(batch)
+        columns["texts"].write(compressor.flush())
+
+        header = {
+            "version": FORMAT_VERSION,
+            "namespace": namespace,
+            "model": model,
+            "count": count,
+            "dimensions": dimensions or 0,
+            "dtype": dtype,
+            "text_bytes": columns["texts"].tell(),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        fileobj.write(MAGIC)
+        fileobj.write(struct.pack("<I", len(header_bytes)))
+        fileobj.write(header_bytes)
+        for column in columns.values():
+            column.seek(0)
+            shutil.copyfileobj(column, fileobj)
+    return header
+
+
+def _read_array(fileobj: BinaryIO, dtype: str, count: int) -> np.ndarray:
+    size = np.dtype(dtype).itemsize * count
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated snapshot")
+    return np.frombuffer(data, dtype=dtype)
+
+
+def read_snapshot(fileobj: BinaryIO) -> Snapshot:
+    """
+    Read a snapshot written by write_snapshot.
+    Raises ValueError for files that are not snapshots or are truncated.
+    """
+    if fileobj.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a knowledge-base snapshot")
+    (header_length,) = struct.unpack("<I", fileobj.read(4))
+    header = json.loads(fileobj.read(header_length).decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+
+    count = header["count"]
+    indexes = _read_array(fileobj, "<i4", count)
+    starts = _read_array(fileobj, "<i8", count)
+    ends = _read_array(fileobj, "<i8", count)
+    lengths = _read_array(fileobj, "<u4", count)
+    text_blob = zlib.decompress(fileobj.read(header["text_bytes"]))
+
+    scales = _read_array(fileobj, "<f4", count) if header["dtype"] == "int8" else None
+    values = _read_array(fileobj, "<f2" if header["dtype"] == "float16" else "i1",
+                         count * header["dimensions"])
+    embeddings = dequantize(values.reshape(count, header["dimensions"]), scales)
+
+    chunks = []
+    offset = 0
+    for i in range(count):
+        end = offset + int(lengths[i])
+        chunks.append({
+            "chunk_index": int(indexes[i]),
+            "content": text_blob[offset:end].decode("utf-8"),
+            "start_offset": int(starts[i]) if starts[i] >= 0 else None,
+            "end_offset": int(ends[i]) if ends[i] >= 0 else None
+        })
+        offset = end
+    return Snapshot(header, chunks, embeddings)
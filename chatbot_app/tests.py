@@ -1,3 +1,296 @@
-from django.test import TestCase
+import io
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from . import jobs
+from .chatbot import GymChatbot, NOT_READY_MESSAGE
+from .checks import shared_state_check
+from .memory import ConversationMemory, validate_session_id
+from .models import ChatSession, IngestionJob, KnowledgeBase
+from .router import ModelRouter
+from .snapshot import DTYPES, parse_embedding, quantize, read_snapshot, write_snapshot
 
-# Create your tests here.
+
+class SharedStateCheckTests(SimpleTestCase):
+    def test_single_node_needs_nothing(self):
+        self.assertEqual(shared_state_check(None), [])
+
+    @override_settings(CHATBOT_MULTI_NODE=True)
+    def test_multi_node_rejects_node_local_state(self):
+        ids = [error.id for error in shared_state_check(None)]
+        self.assertEqual(ids, ["chatbot_app.E001", "chatbot_app.E002"])
+
+    @override_settings(CHATBOT_MULTI_NODE=True, INGESTION_ROOT="/mnt/shared/ingestion",
+                       DATABASES={"default": {"ENGINE": "django.db.backends.postgresql"}})
+    def test_multi_node_accepts_shared_state(self):
+        self.assertEqual(shared_state_check(None), [])
+
+
+class IngestionJobTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        override = override_settings(INGESTION_ROOT=root.name, INGESTION_JOB_LEASE_SECONDS=300)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.job = jobs.create_job("gym", "txt", text="Rest between sets.")
+
+    def test_running_job_is_claimable_only_after_its_lease(self):
+        self.assertTrue(jobs.claim_job(self.job.id))
+        self.assertFalse(jobs.claim_job(self.job.id))
+        IngestionJob.objects.filter(id=self.job.id).update(updated_at=timezone.now() - timedelta(seconds=301))
+        self.assertTrue(jobs.resumable_jobs().filter(id=self.job.id).exists())
+        self.assertTrue(jobs.claim_job(self.job.id))
+
+    def test_heartbeat_keeps_a_running_job_leased(self):
+        self.assertTrue(jobs.claim_job(self.job.id))
+        IngestionJob.objects.filter(id=self.job.id).update(updated_at=timezone.now() - timedelta(seconds=301))
+        stop = mock.Mock()
+        # One beat, then the job finishes
+        stop.wait.side_effect = [False, True]
+        jobs.keep_alive(self.job.id, stop)
+        stop.wait.assert_called_with(100)
+        # Still extracting, but no longer claimable by another worker
+        self.assertFalse(jobs.claim_job(self.job.id))
+        self.assertFalse(jobs.resumable_jobs().filter(id=self.job.id).exists())
+
+    def test_heartbeat_runs_while_the_job_runs(self):
+        stop = threading.Event()
+        def pipeline(*args, **kwargs):
+            self.assertFalse(stop.is_set())
+            return 3
+        chatbot = mock.Mock()
+        chatbot.run_ingestion_pipeline.side_effect = pipeline
+        with mock.patch.object(jobs, "start_heartbeat", return_value=stop) as start_heartbeat:
+            jobs.run_job(chatbot, self.job.id)
+        start_heartbeat.assert_called_once_with(self.job.id)
+        self.assertTrue(stop.is_set())
+
+    def test_failed_job_resumes_from_its_checkpoint(self):
+        chatbot = mock.Mock()
+        def interrupted(pages, namespace, start_index, on_batch, on_split):
+            on_batch(20)
+            raise RuntimeError("embedding quota exceeded")
+        chatbot.run_ingestion_pipeline.side_effect = interrupted
+        jobs.run_job(chatbot, self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.chunks_embedded), (IngestionJob.STATUS_FAILED, 20))
+        self.assertIn("quota", self.job.error)
+        chatbot.delete_all_data.assert_called_once_with("gym")
+
+        chatbot.run_ingestion_pipeline.side_effect = None
+        chatbot.run_ingestion_pipeline.return_value = 35
+        jobs.run_job(chatbot, self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.chunks_total), (IngestionJob.STATUS_COMPLETED, 35))
+        # Rows inserted after the checkpoint are dropped and the pipeline skips the rest
+        chatbot.delete_chunks_from.assert_called_once_with("gym", 20)
+        self.assertEqual(chatbot.run_ingestion_pipeline.call_args.kwargs["start_index"], 20)
+        chatbot.mark_ready.assert_called_with("gym", True, 35)
+        chatbot.delete_all_data.assert_called_once()
+
+
+class ModelRouterTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("chatbot_app.router.genai.GenerativeModel")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ModelRouter(slow_deadline=0.1, max_workers=1)
+        self.addCleanup(self.router.executor.shutdown, wait=False, cancel_futures=True)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        def call(model, prompt):
+            if model == self.router.slow_model:
+                self.release.wait(5)
+            return f"{model} answer"
+        self.router._call = mock.Mock(side_effect=call)
+
+    def test_overrunning_slow_call_falls_back_and_is_cancelled_if_queued(self):
+        # A busy single-thread pool with two slots, so the slow call has to queue
+        self.router.slow_slots = threading.BoundedSemaphore(2)
+        self.router.executor.submit(self.release.wait, 5)
+        futures = []
+        submit = self.router.executor.submit
+        with mock.patch.object(self.router.executor, "submit",
+                               side_effect=lambda *args: futures.append(submit(*args)) or futures[-1]):
+            answer, model = self.router.generate("prompt", "Why rest between sets?", 0)
+        self.assertEqual((answer, model), (f"{self.router.fast_model} answer", self.router.fast_model))
+        self.assertTrue(futures[0].cancelled())
+        self.assertEqual(self.router.stats.timeouts[self.router.slow_model], 1)
+        # The slot of the cancelled call is free again
+        self.assertTrue(self.router.slow_slots.acquire(blocking=False))
+        self.assertTrue(self.router.slow_slots.acquire(blocking=False))
+
+    def test_saturated_slow_model_answers_with_the_fast_one(self):
+        self.router.generate("prompt", "Why rest between sets?", 0)
+        calls = self.router._call.call_count
+        # The abandoned slow call still holds the only slot
+        answer, model = self.router.generate("prompt", "How should I plan a deload?", 0)
+        self.assertEqual(model, self.router.fast_model)
+        self.assertEqual(self.router._call.call_count, calls + 1)
+
+
+class ConversationMemoryTests(TestCase):
+    def setUp(self):
+        self.summarizer = mock.Mock()
+        self.summarizer.generate_content.return_value.text = "The user trains three times a week."
+        self.memory = ConversationMemory(self.summarizer, max_turns=2, max_tokens=60)
+        self.memory.schedule_fold = mock.Mock()
+
+    def test_history_is_bounded_and_folded(self):
+        for number in range(3):
+            self.memory.append_turn("s1", "gym", f"Question {number}?", "A long answer. " * 5)
+        self.memory.schedule_fold.assert_called_with("s1")
+        self.memory._fold("s1")
+
+        session = ChatSession.objects.get(session_id="s1")
+        self.assertEqual((len(session.turns), session.summarized_turns), (2, 1))
+        history = self.memory.history_for_prompt("s1", "gym")
+        self.assertIn("Summary of earlier conversation", history)
+        self.assertLessEqual(len(history), 60 * 3 + 100)
+        self.assertNotIn("Question 0?", history)
+
+    def test_fold_survives_turns_trimmed_meanwhile(self):
+        memory = ConversationMemory(self.summarizer, max_turns=2, max_tokens=60, max_stored_turns=3)
+        memory.schedule_fold = mock.Mock()
+        for number in range(3):
+            memory.append_turn("s1", "gym", f"Question {number}?", "Answer.")
+
+        def summarize(prompt):
+            # A new turn arrives while Question 0 is being folded, and trims it
+            memory.append_turn("s1", "gym", "Question 3?", "Answer.")
+            return mock.Mock(text="Asked about question 0.")
+        self.summarizer.generate_content.side_effect = summarize
+        memory._fold("s1")
+
+        session = ChatSession.objects.get(session_id="s1")
+        self.assertEqual(session.summary, "Asked about question 0.")
+        self.assertEqual([turn["question"] for turn in session.turns], ["Question 1?", "Question 2?", "Question 3?"])
+        self.assertEqual((session.turn_count, session.summarized_turns), (4, 1))
+
+        # The next fold covers only the turns that were not folded yet
+        self.summarizer.generate_content.side_effect = None
+        memory._fold("s1")
+        session.refresh_from_db()
+        self.assertEqual([turn["question"] for turn in session.turns], ["Question 2?", "Question 3?"])
+        self.assertIn("Question 1?", self.summarizer.generate_content.call_args.args[0])
+        self.assertNotIn("Question 0?", self.summarizer.generate_content.call_args.args[0])
+
+    def test_sessions_stay_in_their_namespace(self):
+        self.memory.append_turn("s1", "gym", "How long should I rest?", "Two minutes.")
+        self.assertEqual(self.memory.history_for_prompt("s1", "nutrition"), "")
+        self.assertFalse(self.memory.belongs_to("s1", "nutrition"))
+        with self.assertRaises(ValueError):
+            self.memory.append_turn("s1", "nutrition", "What about protein?", "1.6 g/kg.")
+        self.assertFalse(self.memory.clear("s1", "nutrition"))
+        self.assertTrue(self.memory.clear("s1", "gym"))
+
+    def test_session_ids_are_validated(self):
+        self.assertIsNone(validate_session_id(" "))
+        self.assertEqual(validate_session_id("user-1:chat"), "user-1:chat")
+        with self.assertRaisesMessage(ValueError, "Invalid session id"):
+            validate_session_id("user 1")
+
+
+class BatchResponseTests(SimpleTestCase):
+    def setUp(self):
+        # Only the attributes generate_responses uses, no API clients
+        self.chatbot = GymChatbot.__new__(GymChatbot)
+        self.chatbot.embed_batch_size = 2
+        self.chatbot.is_ready = mock.Mock(return_value=True)
+        self.chatbot.embed_texts = mock.Mock(side_effect=lambda texts, input_type: [[0.1]] * len(texts))
+        self.chatbot.has_qa_index = mock.Mock(return_value=False)
+        self.chatbot.lookup_answer = mock.Mock(return_value=None)
+        self.chatbot.match_context = mock.Mock(return_value=["Rest two minutes."])
+        self.chatbot.answer_from_context = mock.Mock(side_effect=lambda query, context, budget: query.upper())
+
+    def test_errors_before_answering_are_raised_eagerly(self):
+        self.chatbot.embed_texts.side_effect = RuntimeError("cohere unavailable")
+        with self.assertRaisesMessage(RuntimeError, "cohere unavailable"):
+            self.chatbot.generate_responses(["why rest?"], "gym")
+
+    def test_answers_every_question(self):
+        answers = dict(self.chatbot.generate_responses(["a?", "b?", "c?"], "gym"))
+        self.assertEqual(answers, {0: "A?", 1: "B?", 2: "C?"})
+        self.assertEqual(self.chatbot.embed_texts.call_count, 2)
+
+        self.chatbot.is_ready.return_value = False
+        self.assertEqual(list(self.chatbot.generate_responses(["a?"], "gym")), [(0, NOT_READY_MESSAGE)])
+
+    def test_precomputed_answers_are_only_looked_up_where_built(self):
+        dict(self.chatbot.generate_responses(["a?", "b?"], "gym"))
+        self.chatbot.lookup_answer.assert_not_called()
+
+        self.chatbot.has_qa_index.return_value = True
+        self.chatbot.lookup_answer.return_value = "stored"
+        self.assertEqual(dict(self.chatbot.generate_responses(["a?", "b?"], "gym")), {0: "stored", 1: "stored"})
+        self.assertEqual(self.chatbot.lookup_answer.call_count, 2)
+
+
+class QAIndexFlagTests(TestCase):
+    def test_flag_follows_the_index(self):
+        chatbot = GymChatbot.__new__(GymChatbot)
+        chatbot.qa_index = mock.Mock()
+        chatbot.supabase = mock.Mock()
+        chatbot.fetch_chunks = mock.Mock(return_value=[])
+        chatbot.mark_ready("gym", True, 10)
+        self.assertFalse(chatbot.has_qa_index("gym"))
+
+        chatbot.qa_index.build.return_value = 30
+        chatbot.build_qa_index("gym")
+        self.assertTrue(chatbot.has_qa_index("gym"))
+
+        chatbot.delete_all_data("gym")
+        self.assertFalse(KnowledgeBase.objects.get(namespace="gym").has_qa_index)
+
+
+class SnapshotTests(SimpleTestCase):
+    def rows(self, count, dimensions=8):
+        rng = random.Random(count)
+        for index in range(count):
+            embedding = [rng.uniform(-1, 1) for _ in range(dimensions)]
+            yield {
+                "chunk_index": index,
+                "content": f"Chunk {index}: التحميل التدريجي",
+                "start_offset": index * 10 if index % 2 else None,
+                "end_offset": index * 10 + 9 if index % 2 else None,
+                # PostgREST returns pgvector columns as strings
+                "embedding": str(embedding) if index % 3 else embedding,
+            }
+
+    def round_trip(self, rows, dtype):
+        buffer = io.BytesIO()
+        header = write_snapshot(buffer, "gym", "embed-test", rows, dtype)
+        buffer.seek(0)
+        return header, read_snapshot(buffer)
+
+    def test_round_trip_for_each_dtype(self):
+        expected = list(self.rows(5))
+        for dtype in DTYPES:
+            with self.subTest(dtype), mock.patch("chatbot_app.snapshot.WRITE_BATCH_ROWS", 2):
+                header, snapshot = self.round_trip(iter(expected), dtype)
+                self.assertEqual((header["count"], header["dimensions"]), (5, 8))
+                self.assertEqual(snapshot.chunks, [
+                    {key: row[key] for key in ("chunk_index", "content", "start_offset", "end_offset")}
+                    for row in expected
+                ])
+                for row, embedding in zip(expected, snapshot.embeddings):
+                    original = parse_embedding(row["embedding"])
+                    self.assertLess(max(abs(a - b) for a, b in zip(original, embedding)), 0.01)
+
+    def test_empty_namespace(self):
+        for dtype in DTYPES:
+            with self.subTest(dtype):
+                header, snapshot = self.round_trip([], dtype)
+                self.assertEqual((header["count"], header["dimensions"]), (0, 0))
+                self.assertEqual((snapshot.chunks, snapshot.embeddings.shape), ([], (0, 0)))
+                values, _ = quantize(np.zeros((0, 0), dtype=np.float32), dtype)
+                self.assertEqual(values.shape, (0, 0))
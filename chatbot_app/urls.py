@@ -3,6 +3,10 @@ from . import views
 
 urlpatterns = [
     path('text/', views.upload_text, name='upload_text'),
+    path('text/jobs/<uuid:job_id>/', views.job_status, name='ingestion_job_status'),
+    path('text/jobs/<uuid:job_id>/resume/', views.resume_job, name='resume_ingestion_job'),
     path('chat/', views.chat, name='chat'),
+    path('chat/batch/', views.batch_chat, name='batch_chat'),
+    path('chat/router/', views.router_stats, name='chat_router_stats'),
     path('reset/', views.reset, name='reset'),
 ]
\ No newline at end of file
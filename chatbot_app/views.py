@@ -1,18 +1,39 @@
-import os
 import json
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.conf import settings
-from .chatbot import GymChatbot
+from common.language import contains_arabic
+from file_processing.utils import SUPPORTED_FORMATS
+from .chatbot import GymChatbot, normalize_namespace
+from .memory import validate_session_id
+from .models import IngestionJob
+from . import jobs
 
-# Initialize the chatbot as a global instance
+# Initialize the chatbot as a global instance. It holds only API clients;
+# knowledge bases live in Supabase per namespace, and their readiness in the
+# Django database, which all workers share (see CHATBOT_MULTI_NODE for nodes).
 chatbot = GymChatbot()
 
+# Limits of the batch chat endpoint
+MAX_BATCH_QUESTIONS = 500
+MAX_BATCH_CONCURRENCY = 8
+
+def get_namespace(request, data=None):
+    """
+    Resolve the knowledge-base namespace of a request.
+    Looks at the JSON body, then form fields, then the X-Chatbot-Namespace header.
+    """
+    namespace = (data or {}).get('namespace') or request.POST.get('namespace') \
+        or request.META.get('HTTP_X_CHATBOT_NAMESPACE')
+    return normalize_namespace(namespace)
+
 @csrf_exempt
 def upload_text(request):
     """
     Endpoint for uploading text or a file to be processed by the chatbot.
-    Supports Arabic content.
+    Accepts PDF, DOCX, PPTX, images and text files. Supports Arabic content.
+    
+    Ingestion runs as a background job: the response carries the job id right
+    away and progress is available from the job status endpoint.
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Only POST method is allowed'})
@@ -21,55 +42,42 @@ def upload_text(request):
         # Check if it's a file upload
         if request.FILES.get('file'):
             uploaded_file = request.FILES.get('file')
+            namespace = get_namespace(request)
+            file_ext = uploaded_file.name.split(".")[-1].lower()
             
-            # Create temp directory if it doesn't exist
-            temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Save the file temporarily
-            file_path = os.path.join(temp_dir, uploaded_file.name)
-            
-            with open(file_path, 'wb+') as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
+            if file_ext not in SUPPORTED_FORMATS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Unsupported file format: .{file_ext}',
+                    'supported_formats': SUPPORTED_FORMATS
+                })
             
-            # Process the file
-            success = chatbot.process_file(file_path)
+            # Keep the file until the job finishes so it can be resumed
+            job = jobs.create_job(namespace, file_ext, uploaded_file=uploaded_file,
+                                  generate_qa=request.POST.get('generate_qa') in ('1', 'true'))
+            jobs.start_job(chatbot, job.id)
             
-            # Clean up
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                
-            if success:
-                return JsonResponse({'success': True, 'message': 'File processed successfully'})
-            else:
-                return JsonResponse({'success': False, 'error': 'Error processing file'})
+            return JsonResponse({'success': True, 'message': 'File processing started', **jobs.job_status(job)},
+                                status=202)
                 
         # Check if it's a JSON with text
         elif request.content_type == 'application/json':
             # Use json.loads with proper encoding to handle Arabic
             data = json.loads(request.body.decode('utf-8'))
             text = data.get('text', '')
+            namespace = get_namespace(request, data)
             
             if not text:
                 return JsonResponse({'success': False, 'error': 'No text provided'})
                 
-            # Process the text
-            success = chatbot.process_text(text)
+            # Process the text in the background
+            job = jobs.create_job(namespace, 'txt', text=text, generate_qa=bool(data.get('generate_qa')))
+            jobs.start_job(chatbot, job.id)
             
-            if success:
-                # Detect if the text was primarily Arabic for the response message
-                is_arabic = any('\u0600' <= c <= '\u06FF' for c in text[:100])
-                
-                if is_arabic:
-                    return JsonResponse({'success': True, 'message': 'تمت معالجة النص بنجاح'})
-                else:
-                    return JsonResponse({'success': True, 'message': 'Text processed successfully'})
-            else:
-                if any('\u0600' <= c <= '\u06FF' for c in text[:100]):
-                    return JsonResponse({'success': False, 'error': 'حدث خطأ أثناء معالجة النص'})
-                else:
-                    return JsonResponse({'success': False, 'error': 'Error processing text'})
+            # Detect if the text was primarily Arabic for the response message
+            message = 'بدأت معالجة النص' if contains_arabic(text[:100]) else 'Text processing started'
+            return JsonResponse({'success': True, 'message': message, **jobs.job_status(job)},
+                                status=202, json_dumps_params={'ensure_ascii': False})
         
         else:
             return JsonResponse({'success': False, 'error': 'No file or text provided'})
@@ -77,6 +85,40 @@ def upload_text(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def job_status(request, job_id):
+    """
+    Endpoint reporting the progress of an ingestion job.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method is allowed'})
+    
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+    except IngestionJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    return JsonResponse({'success': True, **jobs.job_status(job)})
+
+@csrf_exempt
+def resume_job(request, job_id):
+    """
+    Endpoint for resuming a failed or abandoned ingestion job from its last checkpoint.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method is allowed'})
+    
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+    except IngestionJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    if not jobs.resumable_jobs().filter(id=job.id).exists():
+        return JsonResponse({'success': False, 'error': f'Job is {job.status} and cannot be resumed',
+                             **jobs.job_status(job)}, status=409)
+    
+    jobs.start_job(chatbot, job.id)
+    return JsonResponse({'success': True, 'message': 'Job resumed', **jobs.job_status(job)}, status=202)
+
 @csrf_exempt
 def chat(request):
     """
@@ -90,22 +132,32 @@ def chat(request):
         # Use proper encoding for decoding JSON with Arabic text
         data = json.loads(request.body.decode('utf-8'))
         message = data.get('message', '')
+        namespace = get_namespace(request, data)
+        # Optional: how long the client is willing to wait for the answer
+        latency_budget_ms = data.get('latency_budget_ms')
+        # Optional: conversation id for multi-turn chat
+        session_id = validate_session_id(data.get('session_id'))
         
         if not message:
             return JsonResponse({'success': False, 'error': 'No message provided'})
+        if session_id and not chatbot.memory.belongs_to(session_id, namespace):
+            return JsonResponse({'success': False, 'error': 'Session belongs to another namespace'})
         
-        # Generate a response
-        response = chatbot.generate_response(message)
+        # Generate a response from this namespace's knowledge base
+        response = chatbot.generate_response(
+            message, namespace,
+            latency_budget_ms=int(latency_budget_ms) if latency_budget_ms else None,
+            session_id=session_id
+        )
         
-        return JsonResponse({'success': True, 'response': response}, json_dumps_params={'ensure_ascii': False})
+        return JsonResponse({'success': True, 'response': response, 'session_id': session_id},
+                            json_dumps_params={'ensure_ascii': False})
         
     except Exception as e:
         # Check if the original query was in Arabic to respond accordingly
         try:
             original_message = json.loads(request.body.decode('utf-8')).get('message', '')
-            is_arabic = any('\u0600' <= c <= '\u06FF' for c in original_message)
-            
-            if is_arabic:
+            if contains_arabic(original_message):
                 return JsonResponse({'success': False, 'error': 'حدث خطأ أثناء معالجة استفسارك'}, 
                                    json_dumps_params={'ensure_ascii': False})
         except:
@@ -113,17 +165,77 @@ def chat(request):
             
         return JsonResponse({'success': False, 'error': str(e)})
 
+@csrf_exempt
+def batch_chat(request):
+    """
+    Endpoint for answering many questions against one knowledge base.
+    Queries are embedded in batches and answered concurrently. Answers are
+    returned in input order, or streamed as NDJSON lines as they complete
+    when "stream" is true. Embedding errors are reported before the stream
+    starts; a later failure ends it with an {"error": ...} line.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method is allowed'})
+    
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        questions = data.get('questions', [])
+        namespace = get_namespace(request, data)
+        latency_budget_ms = data.get('latency_budget_ms')
+        max_concurrency = min(int(data.get('max_concurrency', 4)), MAX_BATCH_CONCURRENCY)
+        
+        if not questions or not all(isinstance(question, str) and question for question in questions):
+            return JsonResponse({'success': False, 'error': 'questions must be a non-empty list of strings'})
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_BATCH_QUESTIONS} questions per batch'})
+        
+        answers = chatbot.generate_responses(
+            questions, namespace,
+            latency_budget_ms=int(latency_budget_ms) if latency_budget_ms else None,
+            max_concurrency=max(1, max_concurrency)
+        )
+        
+        if data.get('stream'):
+            def lines():
+                try:
+                    for index, answer in answers:
+                        yield json.dumps({'index': index, 'question': questions[index], 'response': answer},
+                                         ensure_ascii=False) + '\n'
+                except Exception as e:
+                    # The status line has been sent; the error goes in a last line
+                    yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+            return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        
+        responses = [None] * len(questions)
+        for index, answer in answers:
+            responses[index] = answer
+        return JsonResponse({'success': True, 'responses': responses}, json_dumps_params={'ensure_ascii': False})
+    
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
 @csrf_exempt
 def reset(request):
     """
-    Endpoint for resetting the chatbot's knowledge base.
+    Endpoint for resetting the chatbot's knowledge base, or with a
+    "session_id" only that conversation.
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Only POST method is allowed'})
         
     try:
-        # Reset the chatbot
-        chatbot.delete_all_data()
+        data = {}
+        if request.content_type == 'application/json' and request.body:
+            data = json.loads(request.body.decode('utf-8'))
+        
+        namespace = get_namespace(request, data)
+        session_id = validate_session_id(data.get('session_id'))
+        if session_id:
+            # Only forget the conversation; the knowledge base stays
+            chatbot.memory.clear(session_id, namespace)
+        else:
+            # Reset only the requested namespace
+            chatbot.delete_all_data(namespace)
         
         # Try to detect language preference from headers if available
         accept_language = request.META.get('HTTP_ACCEPT_LANGUAGE', '')
@@ -133,4 +245,13 @@ def reset(request):
         
         return JsonResponse({'success': True, 'message': 'Chatbot reset successfully'})
     except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)})
+
+def router_stats(request):
+    """
+    Endpoint reporting per-model answer latency, used to tune the routing thresholds.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Only GET method is allowed'})
+    
+    return JsonResponse({'success': True, 'models': chatbot.router.stats.snapshot()})
\ No newline at end of file
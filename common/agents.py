@@ -0,0 +1,22 @@
+from langchain.agents import initialize_agent, AgentType
+from langchain.memory import ConversationBufferMemory
+
+# Agents used to be built once per module with a global ConversationBufferMemory.
+# That memory kept the full input of every request for the life of the worker,
+# and every later prompt carried other users' documents. Agents are now built
+# per request, so their memory lives exactly as long as the request.
+
+
+def build_agent(tools, llm, verbose=True):
+    """
+    A structured-chat agent with its own, empty conversation memory.
+    Build one per request; never share the result between requests.
+    """
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    return initialize_agent(
+        tools=tools,
+        llm=llm,
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=verbose,
+        memory=memory
+    )
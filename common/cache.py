@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+from .singleflight import SingleFlight, run_exclusive
+from .streaming import wants_stream
+
+# Shared cache for generation results.
+#
+# The same handouts are sent to the summary, quiz, flashcard and diagram
+# endpoints again and again, and every request was a fresh Gemini call.
+# Results are cached under (endpoint, hash of the normalized text, request
+# parameters, prompt version). Every response carries a Cache-Status header
+# (RFC 9211); clients that need fresh output send "no_cache": true or
+# "Cache-Control: no-cache", which regenerates and replaces the cached result.
+#
+# Misses are coalesced: identical requests that arrive while a result is being
+# generated wait for it ("collapsed" in Cache-Status). With CROSS_PROCESS set
+# this also holds across worker processes, which needs a shared backend.
+
+CACHE_NAME = "generation"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Unicode-normalize and collapse whitespace, so trivially different copies
+    of the same document share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(endpoint: str, text: str, params: dict, version: str) -> str:
+    digest = hashlib.sha256(json.dumps(
+        [endpoint, version, normalize_text(text), params], sort_keys=True, ensure_ascii=False
+    ).encode("utf-8")).hexdigest()
+    return f"generation:{endpoint}:{digest}"
+
+
+class LRUCacheBackend:
+    """
+    In-process LRU cache with a TTL, bounded by entry count and total size.
+    Sizes are measured as the length of the UTF-8 JSON encoding of the value.
+    """
+
+    def __init__(self, ttl: int = 86400, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, size, value)
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class DjangoCacheBackend:
+    """
+    A cache from settings.CACHES, e.g. a DatabaseCache on the SQLite database
+    or a shared Redis cache, so every worker sees the same entries.
+    Eviction follows the cache's own TIMEOUT and MAX_ENTRIES options.
+    """
+
+    def __init__(self, alias: str = "default", ttl: int = 86400):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Any):
+        self.cache.set(key, value, self.ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def get_backend():
+    """
+    The backend configured by settings.GENERATION_CACHE, created on first use.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            config = getattr(settings, "GENERATION_CACHE", {})
+            ttl = config.get("TTL", 86400)
+            if config.get("BACKEND", "lru") == "django":
+                _backend = DjangoCacheBackend(config.get("ALIAS", "default"), ttl)
+            else:
+                _backend = LRUCacheBackend(ttl, config.get("MAX_ENTRIES", 1000),
+                                           config.get("MAX_BYTES", 64 * 1024 * 1024))
+        return _backend
+
+
+def wants_fresh(request) -> bool:
+    """
+    Whether the client asked to bypass the cache.
+    """
+    flag = request.data.get("no_cache", False)
+    if isinstance(flag, str):
+        flag = flag.lower() in ("1", "true")
+    return bool(flag) or "no-cache" in request.headers.get("Cache-Control", "")
+
+
+def storable(response) -> bool:
+    """
+    Successful responses are cached unless the view marked them no-store,
+    e.g. because part of the result is missing.
+    """
+    return response.status_code == 200 and "no-store" not in response.get("Cache-Control", "")
+
+
+def cached_generation(endpoint: str, params: dict, version: str):
+    """
+    Cache the successful responses of a DRF generation view.
+
+    params maps the request fields that change the output to their defaults;
+    version is the prompt version of the endpoint. Apply below @api_view.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            text = request.data.get("text", "")
+            config = getattr(settings, "GENERATION_CACHE", {})
+            # Streamed responses are neither cached nor shared
+            if not text or not config.get("ENABLED", True) or wants_stream(request):
+                return view(request, *args, **kwargs)
+
+            values = {name: request.data.get(name, default) for name, default in params.items()}
+            key = cache_key(endpoint, text, values, version)
+            backend = get_backend()
+            fresh = wants_fresh(request)
+
+            if not fresh:
+                data = backend.get(key)
+                if data is not None:
+                    response = Response(data)
+                    response["Cache-Status"] = f"{CACHE_NAME}; hit"
+                    return response
+
+            def generate():
+                response = view(request, *args, **kwargs)
+                if storable(response):
+                    backend.set(key, response.data)
+                return response
+
+            def generate_once():
+                if not config.get("CROSS_PROCESS", False):
+                    return generate(), False
+                # Another process may be generating the same result already
+                response, shared = run_exclusive(
+                    key, generate, lambda: backend.get(key), config.get("LOCK_SECONDS", 120)
+                )
+                return (Response(response) if shared else response), shared
+
+            (response, collapsed), shared = _flight.do(key, generate_once)
+            if shared:
+                # Waiters get their own copy; a Response is rendered once per request
+                response = Response(response.data, status=response.status_code,
+                                    headers={"Cache-Control": response["Cache-Control"]}
+                                    if response.has_header("Cache-Control") else None)
+
+            status = "fwd=bypass" if fresh else "fwd=miss"
+            if storable(response):
+                status += "; stored"
+            if collapsed or shared:
+                status += "; collapsed"
+            response["Cache-Status"] = f"{CACHE_NAME}; {status}"
+            return response
+        return wrapper
+    return decorator
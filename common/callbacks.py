@@ -0,0 +1,43 @@
+from typing import Any, List, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Per-request capture of agent output.
+#
+# The agent views used to swap sys.stdout for a StringIO and scrape the verbose
+# agent log. sys.stdout is shared by every thread in the process, so concurrent
+# requests read each other's output. A callback handler only ever sees the run
+# it was passed to.
+
+
+class ObservationCollector(BaseCallbackHandler):
+    """
+    Collect the tool observations and the final answer of one agent run.
+    """
+
+    def __init__(self):
+        self.observations: List[str] = []
+        self.final_output = ""
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self.observations.append(str(output))
+
+    def on_agent_finish(self, finish, **kwargs: Any) -> None:
+        self.final_output = str(finish.return_values.get("output", ""))
+
+    def transcript(self) -> str:
+        """
+        The run in the "Observation: ... Thought:" layout of the verbose agent
+        log, which the extract_*_from_output functions parse.
+        """
+        parts = [f"Observation: {observation}\nThought:" for observation in self.observations]
+        parts.append(self.final_output)
+        return "\n".join(parts)
+
+
+def run_agent(agent, agent_input) -> Tuple[Any, str]:
+    """
+    Invoke an agent and return its result with the transcript of this run only.
+    """
+    collector = ObservationCollector()
+    result = agent.invoke(agent_input, config={"callbacks": [collector]})
+    return result, collector.transcript()
@@ -0,0 +1,114 @@
+import hashlib
+import re
+from typing import Callable, FrozenSet, List, TypeVar
+import numpy as np
+
+# Cheap near-duplicate detection for generated items (quiz questions,
+# flashcards) produced independently for different sections of a document.
+
+T = TypeVar("T")
+
+ARABIC_DIACRITICS = re.compile(r"[ً-ْـ]")
+WORD_PATTERN = re.compile(r"\w+")
+# Words too common to tell two questions apart
+STOP_WORDS = frozenset(
+    "a an the of to in on for and or is are was were be what which who why how does do did "
+    "with by from that this these those it its as at".split()
+    + "ما ماذا من هل في على عن إلى الى او أو و هو هي ان أن التي الذي".split()
+)
+
+
+def normalize_words(text: str, stop_words: FrozenSet[str] = STOP_WORDS) -> List[str]:
+    """
+    Lower-cased words with Arabic diacritics and letter variants folded,
+    without stop_words.
+    """
+    text = ARABIC_DIACRITICS.sub("", text.lower()).translate(str.maketrans("أإآىة", "ااايه"))
+    return [word for word in WORD_PATTERN.findall(text) if word not in stop_words]
+
+
+def shingles(text: str, size: int = 2) -> FrozenSet[str]:
+    """
+    Word n-grams of text, plus the words themselves so short texts still compare.
+    """
+    words = normalize_words(text)
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return frozenset(grams | set(words))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe(items: List[T], key: Callable[[T], str], threshold: float = 0.6) -> List[T]:
+    """
+    Drop items whose key text is at least threshold-similar to an earlier item.
+    Quadratic in the number of items, which is fine for a few hundred.
+    """
+    kept, kept_shingles = [], []
+    for item in items:
+        item_shingles = shingles(key(item))
+        if any(jaccard(item_shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(item)
+        kept_shingles.append(item_shingles)
+    return kept
+
+
+# Largest prime below 2^32: with a, b and x below it, a * x + b fits in 64 bits
+_PRIME = 4294967291
+
+
+class MinHashDeduper:
+    """
+    Incremental near-duplicate filter for large sets of items.
+
+    Each text is reduced to a MinHash signature of its shingles and indexed
+    with LSH (bands x rows = num_perm), so a new text is only compared with
+    the few earlier texts that share a band. Candidates are confirmed with the
+    exact Jaccard similarity of their shingles.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 128, bands: int = 32, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self.buckets = [dict() for _ in range(bands)]
+        self.shingles: List[FrozenSet[str]] = []
+
+    def signature(self, text_shingles: FrozenSet[str]) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") % _PRIME
+             for s in text_shingles] or [0],
+            dtype=np.uint64
+        )
+        # One universal hash (a * x + b) mod p per permutation
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % _PRIME).min(axis=1)
+
+    def add(self, text: str) -> bool:
+        """
+        Index text unless it is a near-duplicate of an earlier one.
+        Returns True if it was new.
+        """
+        text_shingles = shingles(text)
+        signature = self.signature(text_shingles)
+        keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(self.buckets[band].get(key, ()))
+        if any(jaccard(text_shingles, self.shingles[index]) >= self.threshold for index in candidates):
+            return False
+
+        index = len(self.shingles)
+        self.shingles.append(text_shingles)
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, []).append(index)
+        return True
@@ -0,0 +1,261 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .dedupe import ARABIC_DIACRITICS, WORD_PATTERN, normalize_words
+
+# Local extractive processing, no model calls.
+#
+# Sentences are turned into TF-IDF vectors over their normalized words (Arabic
+# diacritics and letter variants folded, stop words dropped) and ranked with
+# TextRank: PageRank over the cosine-similarity graph of the sentences. Key
+# terms are the words and word pairs with the most TF-IDF weight over windows
+# of consecutive sentences, related by how often they share a window. All of
+# it is NumPy on bounded matrices, which takes milliseconds.
+
+SENTENCE_END = re.compile(r"(?<=[.!?؟。])\s+|\n+")
+BULLET = re.compile(r"^\s*(?:[-•*]+|\d+[.)])\s*")
+MIN_SENTENCE_WORDS = 4
+# Bounds on the dense matrices: sentences x terms and sentences x sentences
+MAX_TERMS = 3000
+MAX_SENTENCES = 1500
+# Sentences more similar than this to a higher-ranked one are skipped
+REDUNDANCY_THRESHOLD = 0.5
+# Shortest word that can be a key term on its own
+MIN_TERM_CHARS = 3
+# Function words, pronouns, auxiliaries and vague quantifiers: never part of a
+# key term. Folded like the words they are compared with.
+TERM_STOP_WORDS = frozenset(normalize_words(
+    "a about above after again against all also am an and any are as at be because been before being below "
+    "between both but by can cannot could did do does doing down during each either else even ever every few "
+    "for from further get gets got had has have having he her here hers herself him himself his how however i "
+    "if in into is it its itself just let may me might more most much must my myself neither no nor not now of "
+    "off often on once one only or other others otherwise our ours ourselves out over own per rather really "
+    "same shall she should so some such than that the their theirs them themselves then there these they this "
+    "those through thus to too under until up upon us use used uses using very via was we were what when where "
+    "whether which while who whom whose why will with within without would yet you your yours yourself "
+    "yourselves "
+    "ما ماذا من هل في على عن إلى الى او أو و ف ثم هو هي هم هن هما أنا انا نحن أنت انت أنتم انتم ان أن إن لكن "
+    "لأن لان التي الذي الذين اللذين اللتين اللاتي هذا هذه ذلك تلك هؤلاء أولئك هنا هناك كان كانت يكون تكون "
+    "كانوا ليس ليست لا لم لن قد لقد كل بعض أي اي غير بين عند عندما حتى مع منذ قبل بعد فوق تحت خلال حول دون "
+    "كما مثل كيف متى أين اين لماذا إذا اذا أيضا ايضا فقط جدا يمكن يجب به بها له لها لهم فيه فيها منه منها "
+    "عليه عليها إليه اليه ذو ذات",
+    stop_words=frozenset(),
+))
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Sentences and list items of text, without bullets or numbering.
+    """
+    sentences = []
+    for part in SENTENCE_END.split(text):
+        sentence = BULLET.sub("", part).strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def tfidf_entries(documents: List[List[str]],
+                  max_terms: int = MAX_TERMS) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    Non-zero entries (rows, columns, values) of the L2-normalized TF-IDF matrix
+    of tokenized documents, over at most max_terms terms (those in the most
+    documents), and its terms. Large documents never need the dense matrix.
+    """
+    vocabulary: Dict[str, int] = {}
+    rows, columns = [], []
+    for row, words in enumerate(documents):
+        for word in words:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    terms = list(vocabulary)
+    if not terms:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32), []
+
+    cells, counts = np.unique(np.array(rows, dtype=np.int64) * len(terms) + np.array(columns), return_counts=True)
+    rows, columns = cells // len(terms), cells % len(terms)
+    document_frequency = np.bincount(columns, minlength=len(terms))
+    if len(terms) > max_terms:
+        keep = np.sort(np.argsort(-document_frequency, kind="stable")[:max_terms])
+        remap = np.full(len(terms), -1)
+        remap[keep] = np.arange(len(keep))
+        kept = remap[columns] >= 0
+        rows, columns, counts = rows[kept], remap[columns[kept]], counts[kept]
+        document_frequency = document_frequency[keep]
+        terms = [terms[index] for index in keep]
+
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    values = (np.log1p(counts) * idf[columns]).astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(documents)))
+    return rows, columns, values / norms[rows], terms
+
+
+def tfidf_matrix(documents: List[List[str]], max_terms: int = MAX_TERMS) -> Tuple[np.ndarray, List[str]]:
+    """
+    Dense L2-normalized TF-IDF rows for tokenized documents, and their terms.
+    """
+    rows, columns, values, terms = tfidf_entries(documents, max_terms)
+    matrix = np.zeros((len(documents), len(terms)), dtype=np.float32)
+    matrix[rows, columns] = values
+    return matrix, terms
+
+
+def textrank(similarity: np.ndarray, damping: float = 0.85, iterations: int = 100,
+             tolerance: float = 1e-6) -> np.ndarray:
+    """
+    PageRank scores of the nodes of a weighted, undirected similarity graph.
+    """
+    count = similarity.shape[0]
+    weights = similarity.astype(np.float64, copy=True)
+    np.fill_diagonal(weights, 0)
+    out_weight = weights.sum(axis=1, keepdims=True)
+    # A sentence sharing no words with the others links to every sentence
+    transition = np.where(out_weight > 0, weights / np.where(out_weight == 0, 1, out_weight), 1 / count)
+
+    scores = np.full(count, 1 / count)
+    for _ in range(iterations):
+        updated = (1 - damping) / count + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+def rank_sentences(text: str, limit: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """
+    Sentences of text and the indices of (at most limit of) them from most to
+    least central. Near-duplicates of a higher-ranked sentence are left out.
+    """
+    sentences, words = [], []
+    for sentence in split_sentences(text):
+        sentence_words = normalize_words(sentence)
+        if len(sentence_words) >= MIN_SENTENCE_WORDS:
+            sentences.append(sentence)
+            words.append(sentence_words)
+    if not sentences:
+        # Only short lines: rank them all
+        sentences = split_sentences(text)
+        words = [normalize_words(sentence) for sentence in sentences]
+    if not sentences:
+        return [], []
+    rows, columns, values, terms = tfidf_entries(words)
+
+    candidates = np.arange(len(sentences))
+    if len(sentences) > MAX_SENTENCES:
+        # Only the sentences closest to the document as a whole are ranked
+        mean = np.bincount(columns, weights=values, minlength=len(terms)) / len(sentences)
+        centrality = np.bincount(rows, weights=values * mean[columns], minlength=len(sentences))
+        candidates = np.sort(np.argsort(-centrality, kind="stable")[:MAX_SENTENCES])
+        position = np.full(len(sentences), -1)
+        position[candidates] = np.arange(len(candidates))
+        kept = position[rows] >= 0
+        rows, columns, values = position[rows[kept]], columns[kept], values[kept]
+    vectors = np.zeros((len(candidates), len(terms)), dtype=np.float32)
+    vectors[rows, columns] = values
+    scores = textrank(vectors @ vectors.T)
+
+    ranking = []
+    for position in np.argsort(-scores, kind="stable"):
+        if limit is not None and len(ranking) >= limit:
+            break
+        if ranking and (vectors[ranking] @ vectors[position]).max() > REDUNDANCY_THRESHOLD:
+            continue
+        ranking.append(int(position))
+    return sentences, [int(candidates[position]) for position in ranking]
+
+
+def extractive_summary(text: str, key_points: Tuple[int, int] = (3, 7),
+                       summary_sentences: Optional[int] = None) -> dict:
+    """
+    Summary and key points made of the most central sentences of text.
+
+    The summary is the top summary_sentences sentences (by default one in ten,
+    between 2 and 5); key points are the next ones, one in five sentences but
+    between key_points[0] and key_points[1]. Both keep the order of the document.
+    """
+    sentence_count = len(split_sentences(text))
+    if summary_sentences is None:
+        summary_sentences = min(5, max(2, math.ceil(sentence_count / 10)))
+    point_count = min(key_points[1], max(key_points[0], math.ceil(sentence_count / 5)))
+    sentences, ranking = rank_sentences(text, summary_sentences + point_count)
+    summary = sorted(ranking[:summary_sentences])
+    points = sorted(ranking[summary_sentences:])
+    return {
+        "summary": " ".join(sentences[index] for index in summary),
+        "key_points": [sentences[index] for index in points],
+    }
+
+
+def _window_terms(sentences: List[str], window: int) -> Tuple[List[List[str]], Dict[str, Counter]]:
+    """
+    Candidate terms (words and word pairs adjacent in the text) of each window
+    of consecutive sentences, and how often each term is written in each form.
+    Stop words are kept as None, so a pair never spans a dropped word.
+    """
+    sentence_terms = []
+    forms: Dict[str, Counter] = defaultdict(Counter)
+    for sentence in sentences:
+        words = []
+        for written in WORD_PATTERN.findall(ARABIC_DIACRITICS.sub("", sentence)):
+            normalized = normalize_words(written, stop_words=TERM_STOP_WORDS)
+            words.append((normalized[0], written) if normalized else (None, written))
+        terms = []
+        for word, written in words:
+            if word and len(word) >= MIN_TERM_CHARS and not word.isdigit():
+                terms.append(word)
+                forms[word][written] += 1
+        for (first, first_written), (second, second_written) in zip(words, words[1:]):
+            if not first or not second or first.isdigit() or second.isdigit():
+                continue
+            term = f"{first} {second}"
+            terms.append(term)
+            forms[term][f"{first_written} {second_written}"] += 1
+        sentence_terms.append(terms)
+
+    windows = [sum(sentence_terms[start:start + window], [])
+               for start in range(max(1, len(sentence_terms) - window + 1))]
+    return windows, forms
+
+
+def key_terms(text: str, count: int = 12, window: int = 2) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    The count most important terms of text and how strongly they are related.
+
+    Returns their labels (as written in the text), their scores, and a
+    count x count matrix of co-occurrence weights: the number of sentence
+    windows two terms share, normalized by how common each term is (0 to 1).
+    """
+    windows, forms = _window_terms(split_sentences(text), window)
+    rows, columns, values, terms = tfidf_entries(windows)
+    if not terms:
+        return [], np.zeros(0), np.zeros((0, 0))
+    # A recurring word pair names a concept better than either word alone
+    length = np.array([term.count(" ") + 1 for term in terms])
+    scores = np.bincount(columns, weights=values, minlength=len(terms)) * length
+
+    selected: List[int] = []
+    for index in np.argsort(-scores, kind="stable"):
+        words = set(terms[index].split())
+        # A word pair must recur to be a term; a term overlapping a better one adds nothing
+        if len(words) > 1 and sum(forms[terms[index]].values()) < 2:
+            continue
+        if any(words <= set(terms[other].split()) or set(terms[other].split()) <= words for other in selected):
+            continue
+        selected.append(int(index))
+        if len(selected) == count:
+            break
+
+    position = np.full(len(terms), -1)
+    position[selected] = np.arange(len(selected))
+    kept = position[columns] >= 0
+    presence = np.zeros((len(windows), len(selected)), dtype=np.float32)
+    presence[rows[kept], position[columns[kept]]] = 1
+    shared = presence.T @ presence
+    windows_with = np.sqrt(np.diag(shared))
+    weights = np.clip(shared / np.outer(windows_with, windows_with), 0, 1)
+    np.fill_diagonal(weights, 0)
+    labels = [forms[terms[index]].most_common(1)[0][0] for index in selected]
+    return labels, scores[selected], weights
@@ -0,0 +1,124 @@
+import functools
+import re
+import langdetect
+from langdetect import DetectorFactory
+
+# Language detection shared by every app.
+#
+# Almost all of our input is Arabic or English, which the Unicode script of
+# the letters tells apart without any statistics. Only a bounded sample of
+# the text is looked at, so the cost does not grow with the document, and
+# n-gram detection (langdetect) is only used for Latin-script text that does
+# not read as English. Results are memoized on the sample, so the several
+# detections of one request cost one.
+
+# Characters looked at: the start, middle and end of the text
+SAMPLE_CHARS = 3000
+# Share of the words that makes a text Arabic; mixed texts are mostly
+# Arabic prose with English terms, which should be answered in Arabic
+ARABIC_RATIO = 0.3
+# Share of English function words above which Latin text is taken as English
+ENGLISH_WORD_RATIO = 0.15
+
+SCRIPTS = {
+    "arabic": re.compile(r"[\u0620-\u064A\u066E-\u06D3\u06D5\u06EE-\u06FF\u0750-\u077F\u08A0-\u08FF"
+                         r"\uFB50-\uFDFF\uFE70-\uFEFF]+"),
+    "latin": re.compile(r"[A-Za-z\u00C0-\u024F]+"),
+    "cyrillic": re.compile(r"[\u0400-\u04FF]+"),
+    "devanagari": re.compile(r"[\u0900-\u097F]+"),
+    "kana": re.compile(r"[\u3040-\u30FF]+"),
+    "han": re.compile(r"[\u4E00-\u9FFF]+"),
+}
+# Letters that Persian (peh, tcheh, jeh, gaf) and Urdu (tteh, ddal, rreh,
+# noon ghunna, yeh barree, heh doachashmee) use and Arabic does not
+FARSI_LETTERS = re.compile(r"[\u067E\u0686\u0698\u06AF]")
+URDU_LETTERS = re.compile(r"[\u0679\u0688\u0691\u06BA\u06D2\u06BE]")
+# The range the chatbot has always checked for
+ARABIC_CHARACTER = re.compile(r"[\u0600-\u06FF]")
+LATIN_WORD = re.compile(r"[A-Za-z]+")
+ENGLISH_WORDS = frozenset(
+    "the of and to in is are was were for on with that this it as by be at from or an "
+    "what how why which who you your can will not have has do does but if so than then into about "
+    "after before between during each every more most should would could their they them there".split()
+)
+
+# langdetect codes of the languages the apps know by name
+LANGUAGE_NAMES = {
+    'ar': 'arabic',
+    'en': 'english',
+    'fr': 'french',
+    'es': 'spanish',
+    'de': 'german',
+    'zh-cn': 'chinese',
+    'zh-tw': 'chinese',
+    'ru': 'russian',
+    'ja': 'japanese',
+    'hi': 'hindi',
+    'ur': 'urdu',
+    'fa': 'farsi',
+    'tr': 'turkish'
+}
+
+# langdetect is randomized; a fixed seed gives the same answer every time
+DetectorFactory.seed = 0
+
+
+def sample(text: str, size: int = SAMPLE_CHARS) -> str:
+    """
+    At most size characters of text, from its start, middle and end.
+    """
+    if len(text) <= size:
+        return text
+    part = size // 3
+    middle = (len(text) - part) // 2
+    return text[:part] + " " + text[middle:middle + part] + " " + text[-part:]
+
+
+@functools.lru_cache(maxsize=1024)
+def _classify(text_sample: str) -> str:
+    # Runs of letters of one script: words, except in Chinese and Japanese
+    words = {script: len(pattern.findall(text_sample)) for script, pattern in SCRIPTS.items()}
+    total = sum(words.values())
+    if not total:
+        return 'english'
+
+    if words["arabic"] / total >= ARABIC_RATIO:
+        if len(URDU_LETTERS.findall(text_sample)) > words["arabic"] * 0.05:
+            return 'urdu'
+        if len(FARSI_LETTERS.findall(text_sample)) > words["arabic"] * 0.05:
+            return 'farsi'
+        return 'arabic'
+
+    script = max(words, key=words.get)
+    if script == "cyrillic":
+        return 'russian'
+    if script == "devanagari":
+        return 'hindi'
+    if script in ("kana", "han"):
+        return 'japanese' if words["kana"] else 'chinese'
+
+    latin_words = LATIN_WORD.findall(text_sample)
+    if latin_words and (sum(word.lower() in ENGLISH_WORDS for word in latin_words) / len(latin_words)
+                        >= ENGLISH_WORD_RATIO):
+        return 'english'
+    # Ambiguous Latin text: other European languages, or too few function words to tell
+    try:
+        return LANGUAGE_NAMES.get(langdetect.detect(text_sample), 'english')
+    except langdetect.LangDetectException:
+        return 'english'
+
+
+def detect_language(text: str) -> str:
+    """
+    Name of the language of text ('arabic', 'english', 'french', ...).
+    Defaults to 'english' for text without letters.
+    """
+    return _classify(sample(text or ""))
+
+
+def contains_arabic(text: str) -> bool:
+    """
+    Whether text has any Arabic-script character. The chatbot answers in
+    Arabic as soon as a message has one, however much English is around it.
+    """
+    return ARABIC_CHARACTER.search(text or "") is not None
@@ -0,0 +1,116 @@
+import contextlib
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+import langdetect
+from django.core.management.base import BaseCommand
+from langdetect import DetectorFactory
+from common import language
+
+SAMPLES = {
+    "english": [
+        "Progressive overload means adding weight, reps or sets every week.",
+        "Rest two to three minutes between heavy compound sets.",
+        "Keep the bar close to the shins during the deadlift.",
+    ],
+    "arabic": [
+        "التحميل التدريجي يعني زيادة الوزن أو التكرارات كل أسبوع.",
+        "استرح من دقيقتين إلى ثلاث دقائق بين المجموعات الثقيلة.",
+        "اشرب حوالي 500 مليلتر من الماء قبل التمرين بساعتين.",
+    ],
+    "mixed": [
+        "تمرين squat يقوي عضلات الساقين والجذع.",
+        "الكرياتين monohydrate هو أكثر المكملات دراسة.",
+        "Rest two to three minutes between heavy compound sets.",
+    ],
+    "french": [
+        "La surcharge progressive consiste à augmenter la charge chaque semaine.",
+        "Reposez-vous deux à trois minutes entre les séries lourdes.",
+    ],
+}
+
+
+def legacy_detect(text):
+    """The per-app detector this replaces: langdetect on the whole text."""
+    try:
+        return 'arabic' if langdetect.detect(text) == 'ar' else 'english'
+    except Exception:
+        return 'english'
+
+
+@contextlib.contextmanager
+def unseeded():
+    """
+    langdetect as the apps used it, randomized. Importing common.language
+    seeds it for the whole process, which would hide the legacy instability.
+    """
+    seed = DetectorFactory.seed
+    DetectorFactory.seed = None
+    try:
+        yield
+    finally:
+        DetectorFactory.seed = seed
+
+
+def make_text(sentences, chars, seed=0):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < chars:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)[:chars]
+
+
+class Command(BaseCommand):
+    help = "Compare the shared language detector with langdetect on the full text (speed and stability)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="20,200,10000,1000000",
+                            help="Text sizes in characters; 20 is about a short chat message")
+        parser.add_argument("--repeat", type=int, default=20, help="Calls per text, for timing and stability")
+        parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size]
+        repeat = options["repeat"]
+        results = []
+        for kind, sentences in SAMPLES.items():
+            for size in sizes:
+                text = make_text(sentences, size)
+                row = {"text": kind, "chars": size}
+                for name, detect, seeding in [("langdetect_full_text", legacy_detect, unseeded),
+                                              ("shared_detector", language.detect_language, contextlib.nullcontext)]:
+                    answers, seconds = Counter(), []
+                    with seeding():
+                        for _ in range(repeat):
+                            # Cold calls: the memo would make every call after the first free
+                            language._classify.cache_clear()
+                            start = time.perf_counter()
+                            answers[detect(text)] += 1
+                            seconds.append(time.perf_counter() - start)
+                    row[name] = {
+                        "ms": round(min(seconds) * 1000, 3),
+                        "answers": sorted(answers),
+                        # Share of the calls that disagree with the most common answer
+                        "disagreement": round(1 - answers.most_common(1)[0][1] / repeat, 3),
+                    }
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    language.detect_language(text)
+                row["shared_detector_memoized_ms"] = round((time.perf_counter() - start) / repeat * 1000, 4)
+                results.append(row)
+                legacy, shared = row["langdetect_full_text"], row["shared_detector"]
+                self.stdout.write(
+                    f"{kind:<8} {size:>8} chars  langdetect {legacy['ms']:>9.3f} ms {legacy['answers']} "
+                    f"{legacy['disagreement']:.0%} disagree  shared {shared['ms']:>7.3f} ms {shared['answers']} "
+                    f"{shared['disagreement']:.0%} disagree  memoized {row['shared_detector_memoized_ms']:.4f} ms"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps({"repeat": repeat, "results": results}, indent=2),
+                                               encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
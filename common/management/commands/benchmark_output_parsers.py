@@ -0,0 +1,104 @@
+import json
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from common import benchmarks
+from flashcards_agent.utils import extract_flashcards_from_output
+from quizes_agent.utils import extract_quizzes_from_output
+from summraiz_agent.utils import extract_summary_from_output
+
+CORPUS = Path(benchmarks.__file__).with_name("output_corpus.json")
+
+EXTRACTORS = {
+    "flashcards": (benchmarks.legacy_extract_flashcards_from_output, extract_flashcards_from_output),
+    "quizzes": (benchmarks.legacy_extract_quizzes_from_output, extract_quizzes_from_output),
+    "summary": (benchmarks.legacy_extract_summary_from_output, extract_summary_from_output),
+}
+
+
+def adversarial_cases(size):
+    """Outputs of about size characters shaped to make backtracking regexes slow."""
+    card = "Q: What is progressive overload and why does it matter for strength?\n"
+    question = ("Q: Which rest period suits heavy compound sets?\nA. 10 seconds\nB. 30 seconds\n"
+                "C. Two to three minutes\nD. Ten minutes\nCorrect Answer: C\n\n")
+    return [
+        # Questions that never get an answer
+        {"name": "questions_without_answers", "kind": "flashcards",
+         "text": "Observation: " + card * (size // len(card))},
+        # No Thought: after the Observation, so every lookahead scans to the end
+        {"name": "observation_without_thought", "kind": "flashcards",
+         "text": "Observation: " + "Q: What is a rep?\nA: One complete movement.\n\n" * (size // 45)},
+        {"name": "single_long_line", "kind": "flashcards",
+         "text": "Q: " + "overload " * (size // 9) + "\nA: gradual increase"},
+        {"name": "many_questions", "kind": "quizzes",
+         "text": "Observation: " + question * (size // len(question))},
+        # The legacy pattern backtracks exponentially here: tens of seconds at 2,000 characters
+        {"name": "arabic_questions_without_answer_lines", "kind": "quizzes", "legacy_max_chars": 1500,
+         "text": "س: ما هو التحميل التدريجي؟\nأ. زيادة الوزن\nب. الراحة\n" * (size // 50)},
+        {"name": "repeated_key_points", "kind": "summary",
+         "text": "Summary: Training basics.\n\n" + "Key Point 1: Increase the load gradually.\n" * (size // 42)},
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare the line parsers with the regex extractors they replaced (speed and agreement)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,100000", help="Adversarial output sizes in characters")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+
+    def time_call(self, extract, text, repeat):
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = extract(text)
+            seconds.append(time.perf_counter() - start)
+        return result, round(min(seconds) * 1000, 3)
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        corpus = json.loads(CORPUS.read_text(encoding="utf-8"))["cases"]
+        results = []
+
+        self.stdout.write("Corpus (agent outputs with known results)")
+        for case in corpus:
+            legacy, parser = EXTRACTORS[case["kind"]]
+            legacy_result, legacy_ms = self.time_call(legacy, case["text"], repeat)
+            parser_result, parser_ms = self.time_call(parser, case["text"], repeat)
+            row = {
+                "case": case["name"], "chars": len(case["text"]),
+                "legacy_ms": legacy_ms, "parser_ms": parser_ms,
+                "legacy_correct": legacy_result == case["expected"],
+                "parser_correct": parser_result == case["expected"],
+            }
+            results.append(row)
+            self.stdout.write(
+                f"{case['name']:<38} legacy {legacy_ms:>8.3f} ms {'ok' if row['legacy_correct'] else 'WRONG':<5}  "
+                f"parser {parser_ms:>8.3f} ms {'ok' if row['parser_correct'] else 'WRONG'}"
+            )
+
+        self.stdout.write("Adversarial outputs")
+        for size in [int(size) for size in options["sizes"].split(",") if size]:
+            for case in adversarial_cases(size):
+                legacy, parser = EXTRACTORS[case["kind"]]
+                parser_result, parser_ms = self.time_call(parser, case["text"], repeat)
+                row = {"case": case["name"], "chars": len(case["text"]), "parser_ms": parser_ms}
+                if len(case["text"]) > case.get("legacy_max_chars", len(case["text"])):
+                    row.update(legacy_ms=None, agree=None)
+                    legacy_column = f"{'skipped':>12}"
+                else:
+                    legacy_result, row["legacy_ms"] = self.time_call(legacy, case["text"], repeat)
+                    row["agree"] = legacy_result == parser_result
+                    legacy_column = f"{row['legacy_ms']:>9.3f} ms"
+                results.append(row)
+                agreement = {True: "same", False: "different", None: ""}[row["agree"]]
+                self.stdout.write(
+                    f"{case['name']:<38} {len(case['text']):>8} chars  legacy {legacy_column}  "
+                    f"parser {parser_ms:>8.3f} ms  {agreement}"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps({"repeat": repeat, "results": results}, indent=2),
+                                               encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class GenerationLock(models.Model):
+    """
+    A generation in progress in some worker process, so identical requests
+    in other processes wait for its result instead of repeating it.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    # Random token of the holder; only the holder releases the lock
+    owner = models.CharField(max_length=32)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} (until {self.expires_at})"
@@ -0,0 +1,278 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Parsers for the plain-text formats the agent prompts ask for.
+#
+# The old extractors ran several lazy DOTALL regexes with lookaheads over the
+# whole agent log, once per Observation section and again over the full text.
+# These parsers read the text once, line by line, and keep only the item being
+# built, so they are linear in the length of the output. Text can be fed in
+# arbitrary chunks (e.g. as a streamed completion arrives); feed() returns the
+# items completed by that chunk.
+#
+# Formats:
+#   CardParser     Q: / A: and س: / ج: flashcards
+#   QuizParser     Q: / س: questions with A.-D. / أ.-د. options and a correct answer line
+#   SummaryParser  "Summary:", "Key Point N:", "Main Topics:", ... and their Arabic labels
+
+# Lines of the verbose agent log; items inside "Observation:" sections are preferred
+AGENT_MARKER = re.compile(r"^(Observation|Thought|Action Input|Action|Final Answer)\s*:\s*")
+# Optional Markdown bold around a label, e.g. "**Q:**"
+_BOLD = r"(?:\*\*)?"
+
+
+def _label(names: str) -> re.Pattern:
+    return re.compile(rf"^\s*{_BOLD}\s*(?:{names})\s*{_BOLD}\s*:\s*{_BOLD}\s*")
+
+
+class LineParser(ABC):
+    """
+    Base class: splits the fed text into lines, tracks the agent log section
+    each line belongs to, and collects the items completed by subclasses.
+    """
+
+    def __init__(self):
+        self._pending: List[str] = []
+        self.in_observation = False
+        self.items: List[dict] = []
+        # Whether each item started inside an Observation section
+        self.observed: List[bool] = []
+
+    def feed(self, chunk: str) -> List[dict]:
+        start = len(self.items)
+        self._pending.append(chunk)
+        if "\n" in chunk:
+            # Joined only when a line is complete, so long lines are not copied per chunk
+            *lines, rest = "".join(self._pending).split("\n")
+            self._pending = [rest] if rest else []
+            for line in lines:
+                self._line(line.rstrip("\r"))
+        return self.items[start:]
+
+    def close(self) -> List[dict]:
+        """
+        Finish the input; returns the items completed by its end.
+        """
+        start = len(self.items)
+        if self._pending:
+            line = "".join(self._pending)
+            self._pending = []
+            self._line(line.rstrip("\r"))
+        self.finish()
+        return self.items[start:]
+
+    def results(self, prefer_observations: bool = True) -> List[dict]:
+        """
+        Every item, or only those from Observation sections if there are any.
+        """
+        if prefer_observations and any(self.observed):
+            return [item for item, observed in zip(self.items, self.observed) if observed]
+        return list(self.items)
+
+    def _line(self, line: str):
+        marker = AGENT_MARKER.match(line)
+        if marker:
+            self.finish()
+            self.in_observation = marker.group(1) == "Observation"
+            line = line[marker.end():]
+            if not line.strip():
+                return
+        self.handle(line)
+
+    def emit(self, item: dict, observed: bool):
+        self.items.append(item)
+        self.observed.append(observed)
+
+    @abstractmethod
+    def handle(self, line: str):
+        """
+        Read one line of the output, outside the agent log markers.
+        """
+
+    @abstractmethod
+    def finish(self):
+        """
+        End the item being built, emitting it if it is complete.
+        """
+
+
+class CardParser(LineParser):
+    """
+    Flashcards: a question line, an answer line, and optional continuation lines.
+    A card ends at the next question, a blank line or the end of an agent log section.
+    """
+
+    QUESTION = _label("Q|س")
+    ANSWER = _label("A|ج")
+
+    def __init__(self):
+        super().__init__()
+        self._question: Optional[List[str]] = None
+        self._answer: Optional[List[str]] = None
+        self._observed = False
+
+    def handle(self, line: str):
+        question = self.QUESTION.match(line)
+        if question:
+            self.finish()
+            self._question, self._observed = [line[question.end():]], self.in_observation
+            return
+        if self._question is None:
+            return
+        if self._answer is None:
+            answer = self.ANSWER.match(line)
+            if answer:
+                self._answer = [line[answer.end():]]
+            elif line.strip():
+                self._question.append(line)
+        elif line.strip():
+            self._answer.append(line)
+        else:
+            self.finish()
+
+    def finish(self):
+        if self._question is not None and self._answer is not None:
+            question = "\n".join(self._question).strip()
+            answer = "\n".join(self._answer).strip()
+            if question and answer:
+                self.emit({"question": question, "answer": answer}, self._observed)
+        self._question = self._answer = None
+
+
+class QuizParser(LineParser):
+    """
+    Multiple-choice questions: a question, four options in order and the
+    letter of the correct one. Incomplete questions are dropped.
+    """
+
+    QUESTION = _label("Q|س")
+    OPTION = re.compile(r"^\s*([A-D])[.)]\s*(.*)$|^\s*([أبجد])(?:\s*[.:)\-]\s*|\s+)(.*)$")
+    CORRECT = re.compile(rf"^\s*{_BOLD}\s*(?:Correct Answer|الإجابة الصحيحة|الجواب الصحيح)\s*{_BOLD}\s*:?\s*"
+                         rf"{_BOLD}\s*\(?([A-Dأبجد])\b")
+    LETTERS = ("ABCD", "أبجد")
+
+    def __init__(self):
+        super().__init__()
+        self._question: Optional[List[str]] = None
+        self._options: Dict[str, List[str]] = {}
+        self._letters = ""
+        self._observed = False
+
+    def handle(self, line: str):
+        question = self.QUESTION.match(line)
+        if question:
+            self._reset()
+            self._question, self._observed = [line[question.end():]], self.in_observation
+            return
+        if self._question is None or not line.strip():
+            return
+
+        if len(self._options) == 4:
+            correct = self.CORRECT.match(line)
+            if correct:
+                self.emit({
+                    "question": "\n".join(self._question).strip(),
+                    "options": {letter: "\n".join(text).strip() for letter, text in self._options.items()},
+                    "correct_answer": correct.group(1)
+                }, self._observed)
+                self._reset()
+                return
+
+        option = self.OPTION.match(line)
+        if option:
+            letter, text = (option.group(1), option.group(2)) if option.group(1) else (option.group(3), option.group(4))
+            letters = self._letters or next(letters for letters in self.LETTERS if letter in letters)
+            # Only the next option in order, so a line that merely starts with a letter is not one
+            if letters[len(self._options):len(self._options) + 1] == letter:
+                self._letters = letters
+                self._options[letter] = [text]
+                return
+
+        if self._options:
+            self._options[next(reversed(self._options))].append(line)
+        else:
+            self._question.append(line)
+
+    def _reset(self):
+        self._question = None
+        self._options = {}
+        self._letters = ""
+
+    def finish(self):
+        self._reset()
+
+
+class SummaryParser(LineParser):
+    """
+    Labeled fields of a summary. Emits {"field": ..., "text": ...} per field,
+    with field "key_point" for each "Key Point N:". A field runs until the next
+    label, a blank line after some text, or the end of an agent log section.
+    """
+
+    FIELDS = {
+        "Summary": "summary",
+        "ملخص": "summary",
+        "Key Point": "key_point",
+        "نقطة رئيسية": "key_point",
+        "Main Topics": "main_topics",
+        "المواضيع الرئيسية": "main_topics",
+        "Tone Analysis": "tone_analysis",
+        "تحليل النبرة": "tone_analysis",
+        "Sentiment Analysis": "sentiment_analysis",
+        "تحليل المشاعر": "sentiment_analysis",
+        "Important Quotes": "important_quotes",
+        "اقتباسات مهمة": "important_quotes",
+        "Conclusions & Insights": "conclusions",
+        "استنتاجات ورؤى": "conclusions",
+        "Target Audience": "target_audience",
+        "الجمهور المستهدف": "target_audience",
+        "Key Terms": "key_terms",
+        "مصطلحات رئيسية": "key_terms",
+    }
+    LABEL = re.compile(
+        rf"^\s*(?:[-•#]+\s*)?{_BOLD}\s*({'|'.join(map(re.escape, FIELDS))})(?:\s*(\d+))?\s*{_BOLD}\s*:\s*{_BOLD}\s*"
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._field: Optional[str] = None
+        self._text: List[str] = []
+        self._observed = False
+
+    def handle(self, line: str):
+        label = self.LABEL.match(line)
+        if label and (label.group(2) is None) == (self.FIELDS[label.group(1)] != "key_point"):
+            self.finish()
+            self._field, self._observed = self.FIELDS[label.group(1)], self.in_observation
+            self._text = [line[label.end():]] if line[label.end():].strip() else []
+        elif self._field is None:
+            return
+        elif line.strip():
+            self._text.append(line)
+        elif self._text:
+            self.finish()
+
+    def finish(self):
+        if self._field is not None and self._text:
+            self.emit({"field": self._field, "text": "\n".join(self._text).strip()}, self._observed)
+        self._field = None
+        self._text = []
+
+
+def parse_text(parser: LineParser, text: str, prefer_observations: bool = True) -> List[dict]:
+    """
+    Parse a complete text at once.
+    """
+    parser.feed(text)
+    parser.close()
+    return parser.results(prefer_observations)
+
+
+def parse_stream(parser: LineParser, chunks: Iterable[str]) -> Iterator[dict]:
+    """
+    Yield items as soon as the chunks read so far complete them.
+    """
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
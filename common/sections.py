@@ -0,0 +1,80 @@
+import re
+from typing import List, NamedTuple, Optional
+from .splitter import iter_chunks
+
+# Splitting long documents into sections for map-reduce generation.
+#
+# Sections follow the structure of the document where it has one (Markdown
+# headings, "Chapter 3", "الفصل الثالث", "2.1. Warm-up"), otherwise its
+# paragraphs. Neighbouring blocks are packed together up to max_chars, and a
+# block that is longer on its own is cut at sentence boundaries.
+
+HEADING_PATTERN = re.compile(
+    r"^(?:#{1,6}\s+\S.*"
+    r"|(?:chapter|section|part|unit|lesson)\s+[\w.-]+.{0,80}"
+    r"|(?:الفصل|الباب|القسم|الجزء|الوحدة|الدرس)\s+\S.{0,80}"
+    # Numbering ends in "." or ")"; a bare number starts ordinary lines
+    # such as "3 sets of 10 reps" or "2.5 g of protein per kg"
+    r"|\d+(?:\.\d+)*[.)]\s+\S.{0,80})$",
+    re.IGNORECASE
+)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class Section(NamedTuple):
+    # Heading the section starts under, if the document has headings
+    title: Optional[str]
+    text: str
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip()
+    # A numbered line ending like a sentence is a list item, not a heading
+    return bool(line) and HEADING_PATTERN.match(line) is not None and not line.endswith((".", ":", "؛"))
+
+
+def _blocks(text: str) -> List[Section]:
+    """
+    Headed blocks if the text has at least two headings, otherwise paragraphs.
+    """
+    lines = text.splitlines()
+    headings = [index for index, line in enumerate(lines) if _is_heading(line)]
+    if len(headings) < 2:
+        return [Section(None, paragraph.strip()) for paragraph in PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+
+    blocks = []
+    preamble = "\n".join(lines[:headings[0]]).strip()
+    if preamble:
+        blocks.append(Section(None, preamble))
+    for start, end in zip(headings, headings[1:] + [len(lines)]):
+        body = "\n".join(lines[start:end]).strip()
+        blocks.append(Section(lines[start].strip().lstrip("#").strip(), body))
+    return blocks
+
+
+def split_sections(text: str, max_chars: int = 12000) -> List[Section]:
+    """
+    Split text into sections of at most max_chars characters.
+    """
+    sections: List[Section] = []
+    title, parts, size = None, [], 0
+
+    def flush():
+        if parts:
+            sections.append(Section(title, "\n\n".join(parts)))
+
+    for block in _blocks(text):
+        if len(block.text) > max_chars:
+            flush()
+            title, parts, size = None, [], 0
+            sections.extend(Section(block.title, chunk.text) for chunk in iter_chunks(block.text, max_chars, 0))
+            continue
+        if parts and size + len(block.text) + 2 > max_chars:
+            flush()
+            title, parts, size = None, [], 0
+        if not parts:
+            title = block.title
+        parts.append(block.text)
+        size += len(block.text) + 2
+    flush()
+    return sections
@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import GenerationLock
+
+# Request coalescing.
+#
+# When a class opens the same shared document, dozens of identical generation
+# requests arrive within seconds. Only the first one calls Gemini; the others
+# wait for it and share its result. SingleFlight does this between threads of
+# one process; run_exclusive extends it across processes with the
+# GenerationLock table, the waiters picking the result up from a shared cache.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; concurrent callers with the same
+    key wait for it and get its result (or its exception).
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared); shared is False for the caller that ran fn.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+def acquire_lock(key: str, lease_seconds: float) -> Optional[str]:
+    """
+    Take the lock for key, replacing an expired one.
+    Returns the owner token, or None if another process holds it.
+    """
+    now = timezone.now()
+    GenerationLock.objects.filter(key=key, expires_at__lt=now).delete()
+    owner = uuid.uuid4().hex
+    try:
+        with transaction.atomic():
+            GenerationLock.objects.create(key=key, owner=owner, expires_at=now + timedelta(seconds=lease_seconds))
+    except IntegrityError:
+        return None
+    return owner
+
+
+def release_lock(key: str, owner: str):
+    GenerationLock.objects.filter(key=key, owner=owner).delete()
+
+
+def is_locked(key: str) -> bool:
+    return GenerationLock.objects.filter(key=key, expires_at__gte=timezone.now()).exists()
+
+
+def run_exclusive(key: str, compute: Callable[[], Any], lookup: Callable[[], Any],
+                  lease_seconds: float = 120, poll_interval: float = 0.25) -> Tuple[Any, bool]:
+    """
+    Run compute under the lock for key, across processes.
+
+    If another process holds the lock, poll lookup (normally a shared cache
+    read) until it returns its result. If that process gives up without a
+    result, take over; after waiting lease_seconds, compute regardless.
+    Returns (result, shared) like SingleFlight.do.
+    """
+    deadline = time.monotonic() + lease_seconds
+    while True:
+        owner = acquire_lock(key, lease_seconds)
+        if owner is not None:
+            try:
+                return compute(), False
+            finally:
+                release_lock(key, owner)
+
+        while is_locked(key):
+            result = lookup()
+            if result is not None:
+                return result, True
+            if time.monotonic() > deadline:
+                return compute(), False
+            time.sleep(poll_interval)
+
+        # The holder finished; its result is in the cache unless it failed
+        result = lookup()
+        if result is not None:
+            return result, True
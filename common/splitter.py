@@ -0,0 +1,113 @@
+import re
+from typing import Iterable, Iterator, NamedTuple, Union
+
+# A sentence ends at Latin or Arabic punctuation followed by whitespace, or at a newline.
+# "؟" is the Arabic question mark and "۔" the Arabic-script full stop.
+SENTENCE_BOUNDARY = re.compile(r"[.!?؟۔…](?=\s)|\n")
+WHITESPACE = re.compile(r"\s")
+
+
+class Chunk(NamedTuple):
+    text: str
+    # Character offsets of text in the original document: document[start:end] == text
+    start: int
+    end: int
+
+
+def _windows(pieces: Union[str, Iterable[str]], size: int) -> Iterator[str]:
+    """
+    Cut the input into slices of at most size characters.
+    A large string is only ever copied one slice at a time.
+    """
+    if isinstance(pieces, str):
+        pieces = [pieces]
+    for piece in pieces:
+        for offset in range(0, len(piece), size):
+            yield piece[offset:offset + size]
+
+
+def _find_cut(buffer: str, chunk_size: int, minimum: int) -> int:
+    """
+    Position at which to end a chunk taken from the front of buffer.
+    Prefers the last sentence boundary, then the last whitespace, in the
+    second half of the window (and past minimum, the end of the previous
+    chunk); otherwise cuts at chunk_size exactly.
+    """
+    window = buffer[:chunk_size + 1]
+    floor = max(chunk_size // 2, minimum)
+
+    last = None
+    for last in SENTENCE_BOUNDARY.finditer(window, floor, chunk_size + 1):
+        pass
+    if last is not None:
+        return last.end()
+
+    for position in range(chunk_size - 1, floor - 1, -1):
+        if window[position].isspace():
+            return position + 1
+    return chunk_size
+
+
+def _trimmed(buffer: str, buffer_start: int, start: int, end: int):
+    """
+    Chunk for buffer[start:end] without surrounding whitespace, or None if blank.
+    """
+    while start < end and buffer[start].isspace():
+        start += 1
+    while end > start and buffer[end - 1].isspace():
+        end -= 1
+    if start == end:
+        return None
+    return Chunk(buffer[start:end], buffer_start + start, buffer_start + end)
+
+
+def iter_chunks(pieces: Union[str, Iterable[str]], chunk_size: int = 1200,
+                chunk_overlap: int = 100) -> Iterator[Chunk]:
+    """
+    Split text into chunks of at most chunk_size characters in a single pass.
+
+    pieces is either a string or any iterable of strings (e.g. pages streamed
+    from a file); they are treated as one continuous document. Chunks end at
+    sentence boundaries where possible, and consecutive chunks share about
+    chunk_overlap characters, starting on a word boundary. Only a window of
+    roughly two chunks is held in memory, so the running time is linear in the
+    input and memory does not depend on its size.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    buffer = ""
+    buffer_start = 0
+    emitted_end = 0
+    last_end = 0
+
+    for window in _windows(pieces, chunk_size):
+        buffer += window
+        while len(buffer) > chunk_size:
+            # The chunk must reach past the end of the previous one by at least
+            # one non-space character, or it would repeat the overlap only
+            minimum = emitted_end - buffer_start
+            while minimum < chunk_size and buffer[minimum].isspace():
+                minimum += 1
+            cut = _find_cut(buffer, chunk_size, minimum + 1)
+            chunk = _trimmed(buffer, buffer_start, 0, cut)
+            if chunk is not None and chunk.end > last_end:
+                yield chunk
+                last_end = chunk.end
+            emitted_end = buffer_start + cut
+
+            # Start the next chunk chunk_overlap characters back, after a space,
+            # but always after the start of the chunk just emitted
+            lowest = chunk.start - buffer_start + 1 if chunk is not None else 1
+            next_start = max(cut - chunk_overlap, lowest)
+            if chunk_overlap:
+                space = WHITESPACE.search(buffer, next_start, cut)
+                next_start = space.end() if space else cut
+            buffer = buffer[next_start:]
+            buffer_start += next_start
+
+    # Whatever is left, unless it is only overlap that was already emitted
+    if buffer_start + len(buffer) > emitted_end:
+        chunk = _trimmed(buffer, buffer_start, 0, len(buffer))
+        if chunk is not None and chunk.end > last_end:
+            yield chunk
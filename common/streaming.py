@@ -0,0 +1,41 @@
+import json
+import logging
+from typing import Iterable, Tuple
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events for generation endpoints that return results as they
+# are produced. Each event is a name and a JSON payload; a failure while
+# streaming ends the stream with an "error" event, since the status code has
+# already been sent.
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[Tuple[str, object]]) -> StreamingHttpResponse:
+    """
+    Stream (event, data) pairs as text/event-stream.
+    """
+    def stream():
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.exception(f"Error while streaming: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keep nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def wants_stream(request) -> bool:
+    flag = request.data.get("stream", False)
+    if isinstance(flag, str):
+        flag = flag.lower() in ("1", "true")
+    return bool(flag)
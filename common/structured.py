@@ -0,0 +1,109 @@
+import json
+import logging
+from typing import Callable, Iterator, Optional
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# Direct generation: one generate_content call constrained to a JSON schema,
+# instead of a LangChain agent loop (planning call, tool call, final answer)
+# whose verbose log then has to be scraped with regular expressions.
+#
+# Schemas use the subset Gemini accepts: type, properties, required, items,
+# enum and description. Counts are checked by the caller's validator.
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Values of the "mode" request field; the agent loop is only used on request
+DIRECT_MODE = "direct"
+AGENT_MODE = "agent"
+GENERATION_MODES = (DIRECT_MODE, AGENT_MODE)
+# Local extractive generation without any model call, for quick previews;
+# only offered by the endpoints that support it
+FAST_MODE = "fast"
+
+
+class StructuredOutputError(ValueError):
+    """
+    The model returned something that does not match the expected schema.
+    """
+
+
+def validate(data, schema: dict, path: str = "$"):
+    """
+    Check data against a JSON schema of the subset above.
+    Raises StructuredOutputError naming the first offending path.
+    """
+    expected = schema.get("type")
+    checks = {
+        "object": lambda value: isinstance(value, dict),
+        "array": lambda value: isinstance(value, list),
+        "string": lambda value: isinstance(value, str),
+        "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+        "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+        "boolean": lambda value: isinstance(value, bool),
+    }
+    if expected in checks and not checks[expected](data):
+        raise StructuredOutputError(f"{path}: expected {expected}")
+    if "enum" in schema and data not in schema["enum"]:
+        raise StructuredOutputError(f"{path}: {data!r} is not one of {schema['enum']}")
+
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in data:
+                raise StructuredOutputError(f"{path}: missing {key}")
+        for key, value_schema in schema.get("properties", {}).items():
+            if key in data:
+                validate(data[key], value_schema, f"{path}.{key}")
+    elif expected == "array" and "items" in schema:
+        for index, item in enumerate(data):
+            validate(item, schema["items"], f"{path}[{index}]")
+
+
+def generate_structured(prompt: str, schema: dict, model_name: str = DEFAULT_MODEL,
+                        temperature: float = 0.7, max_output_tokens: Optional[int] = None,
+                        check: Optional[Callable] = None, attempts: int = 2):
+    """
+    Generate JSON matching schema with a single model call per attempt.
+
+    check, if given, receives the parsed data and may normalize it, returning
+    the value to use, or raise StructuredOutputError to reject it. A rejected
+    or unparsable response is retried up to attempts times in total.
+    """
+    generation_config = {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+        "temperature": temperature,
+    }
+    if max_output_tokens:
+        generation_config["max_output_tokens"] = max_output_tokens
+
+    model = genai.GenerativeModel(model_name)
+    error = None
+    for attempt in range(attempts):
+        response = model.generate_content(prompt, generation_config=generation_config)
+        try:
+            data = json.loads(response.text)
+            validate(data, schema)
+            return check(data) if check else data
+        except (ValueError, TypeError) as e:
+            # json.JSONDecodeError and StructuredOutputError are both ValueErrors
+            error = e
+            logger.warning(f"Invalid structured output (attempt {attempt + 1}/{attempts}): {e}")
+    raise StructuredOutputError(str(error))
+
+
+def stream_text(prompt: str, model_name: str = DEFAULT_MODEL,
+                generation_config: Optional[dict] = None) -> Iterator[str]:
+    """
+    Plain text completion, yielded in chunks as the model produces them.
+    """
+    model = genai.GenerativeModel(model_name)
+    for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # A chunk without text, e.g. one carrying only the finish reason
+            continue
+        if text:
+            yield text
@@ -0,0 +1,357 @@
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from langchain_core.language_models.chat_models import SimpleChatModel
+from rest_framework.test import APIClient
+from common import cache
+from common.callbacks import run_agent
+from common.dedupe import MinHashDeduper
+from common.extractive import extractive_summary, key_terms
+from common import benchmarks
+from common.language import contains_arabic, detect_language
+from common.models import GenerationLock
+from common.parsing import CardParser, LineParser, QuizParser
+from common.sections import split_sections
+from common.singleflight import run_exclusive
+from common.splitter import iter_chunks
+from diagram_agent import utils as diagram_utils
+from flashcards_agent import utils as flashcards_utils
+from quizes_agent import utils as quizzes_utils
+from summraiz_agent import utils as summary_utils
+
+
+class FinalAnswerChatModel(SimpleChatModel):
+    """
+    Chat model that answers at once, without tools or network calls.
+    """
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        return "Final Answer: done"
+
+    @property
+    def _llm_type(self):
+        return "final-answer"
+
+
+class AgentMemoryTests(SimpleTestCase):
+    factories = [
+        (flashcards_utils, flashcards_utils.create_agent),
+        (quizzes_utils, quizzes_utils.create_quizzes_agent),
+        (summary_utils, summary_utils.create_agent),
+        (diagram_utils, diagram_utils.create_diagram_agent),
+    ]
+
+    def setUp(self):
+        self.llm = FinalAnswerChatModel()
+        # The agents are verbose; keep their log out of the test output
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+        self.addCleanup(self.quiet.__exit__, None, None, None)
+
+    def test_requests_do_not_share_memory(self):
+        for module, create in self.factories:
+            with self.subTest(module=module.__name__), mock.patch.object(module, "llm", self.llm):
+                first = create()
+                run_agent(first, "a private document")
+                second = create()
+                self.assertIsNot(first.memory, second.memory)
+                self.assertEqual(second.memory.chat_memory.messages, [])
+
+    def test_memory_stays_flat_across_requests(self):
+        # About 20 KB per request; a shared buffer memory would keep all of it
+        document = "Progressive overload means adding weight or reps every week. " * 330
+
+        def handle_request(index):
+            run_agent(flashcards_utils.create_agent(), f"{index} {document}")
+
+        with mock.patch.object(flashcards_utils, "llm", self.llm):
+            for index in range(50):
+                handle_request(index)
+
+            tracemalloc.start()
+            try:
+                baseline = tracemalloc.get_traced_memory()[0]
+                for index in range(1000):
+                    handle_request(index)
+                growth = tracemalloc.get_traced_memory()[0] - baseline
+            finally:
+                tracemalloc.stop()
+
+        # 1,000 retained inputs would be about 20 MB
+        self.assertLess(growth, 2 * 1024 * 1024)
+
+
+class LRUCacheBackendTests(SimpleTestCase):
+    def test_evicts_least_recently_used_entries(self):
+        backend = cache.LRUCacheBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertEqual(backend.get("a"), 1)
+        self.assertIsNone(backend.get("b"))
+
+    def test_evicts_by_size_and_expires(self):
+        backend = cache.LRUCacheBackend(max_bytes=20)
+        backend.set("a", "x" * 10)
+        backend.set("b", "y" * 10)
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend.get("b"), "y" * 10)
+
+        backend = cache.LRUCacheBackend(ttl=-1)
+        backend.set("a", 1)
+        self.assertIsNone(backend.get("a"))
+
+
+@override_settings(GENERATION_CACHE={"BACKEND": "lru"})
+class GenerationCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache._backend = None
+        self.addCleanup(setattr, cache, "_backend", None)
+        self.client = APIClient()
+        patcher = mock.patch(
+            "flashcards_agent.views.generate_flashcards_direct",
+            return_value=[{"question": "What is progressive overload?", "answer": "Adding load over time"}]
+        )
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data, **headers):
+        return self.client.post("/agent/generate/", data, format="json", headers=headers)
+
+    def test_identical_text_is_served_from_cache(self):
+        first = self.post({"text": "Progressive  overload\nmeans more load."})
+        second = self.post({"text": "Progressive overload means more load."})
+        self.assertEqual(first["Cache-Status"], "generation; fwd=miss; stored")
+        self.assertEqual(second["Cache-Status"], "generation; hit")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_parameters_are_part_of_the_key(self):
+        key = cache.cache_key("diagram", "Rest between sets.", {"include_colors": True}, "1")
+        self.assertNotEqual(key, cache.cache_key("diagram", "Rest between sets.", {"include_colors": False}, "1"))
+        self.assertNotEqual(key, cache.cache_key("diagram", "Rest between sets.", {"include_colors": True}, "2"))
+        self.assertNotEqual(key, cache.cache_key("quizzes", "Rest between sets.", {"include_colors": True}, "1"))
+
+    def test_bypass_flag_regenerates(self):
+        self.post({"text": "Rest between sets."})
+        bypass = self.post({"text": "Rest between sets.", "no_cache": True})
+        self.assertEqual(bypass["Cache-Status"], "generation; fwd=bypass; stored")
+        no_cache = self.post({"text": "Rest between sets."}, **{"Cache-Control": "no-cache"})
+        self.assertEqual(no_cache["Cache-Status"], "generation; fwd=bypass; stored")
+        self.assertEqual(self.generate.call_count, 3)
+
+    def test_concurrent_identical_requests_share_one_generation(self):
+        def slow_generation(text):
+            time.sleep(0.3)
+            return [{"question": "Why rest?", "answer": "To recover"}]
+        self.generate.side_effect = slow_generation
+
+        statuses = []
+        def request():
+            statuses.append(APIClient().post("/agent/generate/", {"text": "Rest between sets."},
+                                             format="json")["Cache-Status"])
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.generate.call_count, 1)
+        self.assertEqual(statuses.count("generation; fwd=miss; stored"), 1)
+        self.assertEqual(statuses.count("generation; fwd=miss; stored; collapsed"), 9)
+
+
+class MinHashDeduperTests(SimpleTestCase):
+    def test_drops_near_duplicate_questions(self):
+        deduper = MinHashDeduper()
+        self.assertTrue(deduper.add("What is progressive overload in strength training?"))
+        self.assertFalse(deduper.add("What is progressive overload in strength training"))
+        self.assertTrue(deduper.add("How long should you rest between heavy sets?"))
+        self.assertTrue(deduper.add("ما هو التحميل التدريجي؟"))
+        self.assertFalse(deduper.add("ما هو التحميل التدريجي"))
+
+
+class ExtractiveTests(SimpleTestCase):
+    def test_picks_central_sentences_in_document_order(self):
+        text = (
+            "Progressive overload is the gradual increase of training load over time. "
+            "Muscles adapt to progressive overload by growing stronger. "
+            "The gym opens at six in the morning on weekdays. "
+            "Without progressive overload, strength gains stall. "
+            "Rest days let muscles recover from the training load."
+        )
+        result = extractive_summary(text, key_points=(1, 2), summary_sentences=2)
+        self.assertIn("Progressive overload is the gradual increase", result["summary"])
+        self.assertNotIn("The gym opens", result["summary"])
+        self.assertTrue(1 <= len(result["key_points"]) <= 2)
+        for point in result["key_points"]:
+            self.assertNotIn(point, result["summary"])
+
+    def test_handles_arabic(self):
+        result = extractive_summary("التحميل التدريجي يزيد قوة العضلات مع الوقت. "
+                                    "العضلات تتكيف مع التحميل التدريجي وتصبح أقوى. "
+                                    "النوم ضروري لتعافي العضلات بعد التمرين.", summary_sentences=1)
+        self.assertIn("التحميل التدريجي", result["summary"])
+
+    def test_key_terms_prefer_recurring_phrases(self):
+        labels, scores, weights = key_terms(
+            "Progressive overload builds strength. Muscles adapt to progressive overload. "
+            "Sleep helps muscles recover.", count=4
+        )
+        self.assertEqual(labels[0], "Progressive overload")
+        self.assertNotIn("overload", labels)
+        self.assertEqual(weights.shape, (len(labels), len(labels)))
+        self.assertTrue((weights >= 0).all() and (weights <= 1).all())
+
+    def test_key_terms_skip_stop_words(self):
+        labels, _, _ = key_terms(
+            "You can train three times per day. Strength and conditioning builds power. "
+            "You can rest per day as needed. Strength and conditioning coaches plan the load.", count=8
+        )
+        lowered = [label.lower() for label in labels]
+        self.assertNotIn("you can", lowered)
+        self.assertNotIn("per day", lowered)
+        # Pairs come from words adjacent in the text, not across a dropped stop word
+        self.assertNotIn("strength conditioning", lowered)
+        self.assertIn("strength", lowered)
+
+    def test_key_terms_skip_arabic_stop_words(self):
+        labels, _, _ = key_terms("يمكن أن تتدرب في النادي. التحميل التدريجي يبني القوة. "
+                                 "يمكن أن ترتاح في البيت. التحميل التدريجي يحتاج إلى الصبر.", count=8)
+        self.assertEqual(labels[0], "التحميل التدريجي")
+        self.assertFalse(any(word in label.split() for label in labels for word in ("يمكن", "أن", "في", "إلى")))
+
+
+class LanguageDetectionTests(SimpleTestCase):
+    def test_classifies_by_script(self):
+        self.assertEqual(detect_language("Rest two to three minutes between heavy sets."), "english")
+        self.assertEqual(detect_language("استرح من دقيقتين إلى ثلاث دقائق بين المجموعات."), "arabic")
+        # Arabic prose with English terms is Arabic
+        self.assertEqual(detect_language("ما هو creatine monohydrate؟"), "arabic")
+        self.assertEqual(detect_language("Прогрессивная перегрузка"), "russian")
+        self.assertEqual(detect_language(""), "english")
+
+    def test_contains_arabic_needs_one_character(self):
+        # Mostly English, so not Arabic text, but the chatbot still answers in Arabic
+        message = "How many sets of squats should I do per week? شكرا"
+        self.assertEqual(detect_language(message), "english")
+        self.assertTrue(contains_arabic(message))
+        self.assertFalse(contains_arabic("How many sets of squats should I do per week?"))
+        self.assertFalse(contains_arabic(None))
+
+    def test_long_texts_are_sampled_and_stable(self):
+        text = "La surcharge progressive consiste à augmenter la charge chaque semaine. " * 50000
+        self.assertEqual({detect_language(text) for _ in range(3)}, {"french"})
+
+
+class OutputParserTests(SimpleTestCase):
+    def test_corpus(self):
+        extractors = {
+            "flashcards": flashcards_utils.extract_flashcards_from_output,
+            "quizzes": quizzes_utils.extract_quizzes_from_output,
+            "summary": summary_utils.extract_summary_from_output,
+        }
+        with open(Path(benchmarks.__file__).with_name("output_corpus.json"), encoding="utf-8") as corpus:
+            for case in json.load(corpus)["cases"]:
+                with self.subTest(case["name"]):
+                    self.assertEqual(extractors[case["kind"]](case["text"]), case["expected"])
+
+    def test_chunked_feed_matches_whole_text(self):
+        text = ("Observation: Q: Which rest period suits heavy sets?\nA. 10 seconds\nB. 30 seconds\n"
+                "C. Two to three minutes\nD. Ten minutes\nCorrect Answer: C\nThought: done")
+        parser, completed = QuizParser(), []
+        for start in range(0, len(text), 7):
+            completed += parser.feed(text[start:start + 7])
+        completed += parser.close()
+        self.assertEqual(len(completed), 1)
+        self.assertEqual(completed, quizzes_utils.extract_quizzes_from_output(text))
+
+        cards = CardParser()
+        self.assertEqual(cards.feed("Q: What is a rep?\nA: One movement"), [])
+        self.assertEqual(cards.feed(".\n\n"), [{"question": "What is a rep?", "answer": "One movement."}])
+
+    def test_incomplete_parser_fails_when_created(self):
+        class QuestionParser(LineParser):
+            def handle(self, line):
+                pass
+
+        with self.assertRaises(TypeError):
+            QuestionParser()
+
+
+class SplitterTests(SimpleTestCase):
+    def document(self, seed, length):
+        rng = random.Random(seed)
+        words = ["rest", "sets", "reps", "التحميل", "التدريجي", "squat", "1200", "kg"]
+        ends = [" ", " ", " ", ". ", "؟ ", "\n", "\n\n", ""]
+        return "".join(rng.choice(words) + rng.choice(ends) for _ in range(length))[:length]
+
+    def test_chunks_are_bounded_exact_and_cover_the_document(self):
+        for seed in range(30):
+            document = self.document(seed, 3000)
+            for size, overlap in [(200, 0), (200, 40), (97, 13)]:
+                chunks = list(iter_chunks(document, size, overlap))
+                covered = set()
+                for chunk in chunks:
+                    self.assertLessEqual(len(chunk.text), size)
+                    self.assertEqual(document[chunk.start:chunk.end], chunk.text)
+                    covered.update(range(chunk.start, chunk.end))
+                self.assertEqual([chunk.start for chunk in chunks], sorted(chunk.start for chunk in chunks))
+                missing = [i for i, char in enumerate(document) if not char.isspace() and i not in covered]
+                self.assertEqual(missing, [], f"seed {seed}, size {size}")
+
+    def test_streamed_pieces_match_the_whole_text(self):
+        document = self.document(7, 5000)
+        pieces = [document[start:start + 333] for start in range(0, len(document), 333)]
+        self.assertEqual(list(iter_chunks(pieces, 300, 50)), list(iter_chunks(document, 300, 50)))
+
+    def test_prefers_arabic_and_latin_sentence_ends(self):
+        document = "التحميل التدريجي مهم؟ " * 10 + "Rest between sets. " * 10
+        for chunk in iter_chunks(document, 100, 0):
+            self.assertTrue(chunk.text.endswith(("؟", ".")), chunk.text)
+        with self.assertRaises(ValueError):
+            list(iter_chunks(document, 100, 100))
+
+
+class SectionsTests(SimpleTestCase):
+    def test_sections_follow_headings(self):
+        text = ("Intro line. " * 5 + "\n\n# Strength\n3 sets of 10 reps\nbuild a base.\n\n"
+                "# Recovery\n2.5 g of carbs per kg\nrefuel the muscles.\n\n1. Sleep\nSeven to nine hours.")
+        sections = split_sections(text, 60)
+        self.assertEqual([section.title for section in sections], [None, "Strength", "Recovery", "1. Sleep"])
+        self.assertIn("3 sets of 10 reps", sections[1].text)
+
+    def test_sections_are_bounded_and_keep_all_text(self):
+        paragraphs = [f"Paragraph {index}. " + "Rest between heavy sets. " * (index % 7 + 1) for index in range(40)]
+        text = "\n\n".join(paragraphs) + "\n\n" + "No headings here at all. " * 200
+        sections = split_sections(text, 500)
+        self.assertTrue(all(len(section.text) <= 500 for section in sections))
+        self.assertEqual("".join(text.split()), "".join("".join(section.text for section in sections).split()))
+
+
+class GenerationLockTests(TestCase):
+    def test_waits_for_the_holder_in_another_process(self):
+        GenerationLock.objects.create(key="k", owner="other", expires_at=timezone.now() + timedelta(seconds=60))
+        lookups = iter([None, {"summary": "shared"}])
+        compute = mock.Mock()
+
+        result, shared = run_exclusive("k", compute, lambda: next(lookups), poll_interval=0)
+        self.assertEqual(result, {"summary": "shared"})
+        self.assertTrue(shared)
+        compute.assert_not_called()
+
+    def test_takes_over_an_expired_lock(self):
+        GenerationLock.objects.create(key="k", owner="other", expires_at=timezone.now() - timedelta(seconds=1))
+        result, shared = run_exclusive("k", lambda: "computed", lambda: None)
+        self.assertEqual((result, shared), ("computed", False))
+        self.assertFalse(GenerationLock.objects.exists())
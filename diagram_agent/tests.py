@@ -1,3 +1,85 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import utils
+from .utils import generate_diagram_fast, render_hierarchical_mermaid, render_mermaid
+
+
+def section_graph(title, group_label, node_label):
+    return {
+        "title": title,
+        "groups": [{"label": group_label, "nodes": [{"id": "a", "label": node_label, "category": "concept"}]}],
+        "edges": [],
+    }
+
+
+class RenderMermaidTests(TestCase):
+    def test_groups_get_namespaced_subgraph_ids(self):
+        graph = section_graph("Training", "Benefits", "Strength")
+        graph["groups"].append({"label": "Benefits", "nodes": [{"id": "b", "label": "Endurance", "category": "concept"}]})
+        code = render_mermaid(graph, include_colors=False, include_clicks=False)
+        self.assertIn('subgraph NG1 ["Benefits"]', code)
+        self.assertIn('subgraph NG2 ["Benefits"]', code)
+
+    def test_sections_sharing_a_group_label_keep_separate_subgraphs(self):
+        code = render_hierarchical_mermaid(
+            [section_graph("Strength", "Benefits", "Muscle"), section_graph("Cardio", "Benefits", "Heart health")],
+            include_colors=False, include_clicks=False,
+        )
+        lines = [line.strip() for line in code.splitlines()]
+        self.assertIn('subgraph S1NG1 ["Benefits"]', lines)
+        self.assertIn('subgraph S2NG1 ["Benefits"]', lines)
+        self.assertNotIn('subgraph "Benefits"', code)
+        # Each subgraph is opened and closed once, and the nodes stay in their own section
+        self.assertEqual(sum(line.startswith("subgraph") for line in lines), lines.count("end"))
+        self.assertLess(lines.index('subgraph S1NG1 ["Benefits"]'), lines.index('S1N1["Muscle"]'))
+        self.assertLess(lines.index('S1N1["Muscle"]'), lines.index('subgraph S2 ["Cardio"]'))
+        self.assertIn("S1 --> S2", lines)
+
+
+class FastDiagramTests(TestCase):
+    def test_terms_without_co_occurrence_get_no_edge(self):
+        labels = ["Overload", "Recovery", "Sleep", "Protein", "Stretching"]
+        weights = np.zeros((5, 5))
+        weights[3, 1] = weights[1, 3] = 0.5
+        with mock.patch("diagram_agent.utils.key_terms", return_value=(labels, np.ones(5), weights)):
+            code = generate_diagram_fast("text", include_colors=False, include_clicks=False, language="arabic")
+        self.assertTrue(code.startswith("graph RL"))
+        self.assertIn("خريطة المفاهيم", code)
+        # Protein hangs off Recovery; Stretching shares no window with a higher-ranked term
+        self.assertIn('subgraph NG2 ["Recovery"]\n        N2["Recovery"]\n        N3["Protein"]', code)
+        self.assertIn("N2 --> N3", code)
+        self.assertNotIn("Stretching", code)
+        self.assertNotIn("N1 --> N", code)
+
+
+class HierarchicalDiagramTests(TestCase):
+    text = "\n\n".join(f"Part {index}. " + f"Exercise {index} needs rest between heavy sets. " * 40
+                       for index in range(3))
+
+    def test_failed_sections_are_reported(self):
+        def generate(text, language):
+            if text.startswith("Part 1."):
+                raise ValueError("bad output")
+            return section_graph("Part", "Benefits", text[:6])
+
+        with mock.patch.object(utils, "generate_section_graph", side_effect=generate):
+            result = utils.generate_diagram_hierarchical(self.text, include_clicks=False, section_chars=2500,
+                                                         language="english")
+        self.assertEqual(result["sections"], 3)
+        self.assertEqual(result["failed_sections"], [1])
+        self.assertIn('["Part 0"]', result["diagram_code"])
+        self.assertIn('["Part 2"]', result["diagram_code"])
+        self.assertNotIn('["Part 1"]', result["diagram_code"])
+
+    @override_settings(GENERATION_CACHE={"ENABLED": False})
+    def test_partial_diagrams_are_not_cached(self):
+        result = {"diagram_code": "graph LR", "sections": 3, "failed_sections": [1]}
+        with mock.patch("diagram_agent.views.generate_diagram_hierarchical", return_value=result):
+            response = APIClient().post("/agent/generate_diagram/", {"text": "Rest.", "hierarchical": True},
+                                        format="json")
+        self.assertEqual(response["Cache-Control"], "no-store")
+        self.assertEqual(response.json(), result)
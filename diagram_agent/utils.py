@@ -2,13 +2,17 @@ import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
+from common.agents import build_agent
+from common.language import detect_language
 import re
 import logging
-import langdetect
 import random
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from common.extractive import key_terms
+from common.sections import split_sections
+from common.structured import StructuredOutputError, generate_structured
 
 # Set up logging to help with debugging
 logging.basicConfig(level=logging.INFO)
@@ -20,17 +24,8 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # Define a base URL for knowledge resources
 BASE_KNOWLEDGE_URL = "https://example.com/knowledge"  # Change this to your actual base URL
 
-def detect_language(text):
-    """Detect if text is Arabic or English."""
-    try:
-        language = langdetect.detect(text)
-        if language == 'ar':
-            return 'arabic'
-        else:
-            return 'english'
-    except:
-        # Default to English if detection fails
-        return 'english'
+# Part of the result cache key; bump it whenever the prompts or the output format change
+PROMPT_VERSION = "1"
 
 def get_color_palette():
     """Return a visually clear and consistent color palette."""
@@ -215,6 +210,286 @@ def diagram_tool(input_text, include_colors=True, include_clicks=True, base_url=
         logger.error(f"Error in diagram tool: {str(e)}")
         return f"Error generating diagram: {str(e)}"
 
+DIAGRAM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "groups": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "label": {"type": "string"},
+                    "nodes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "string"},
+                                "label": {"type": "string"},
+                                "category": {"type": "string", "enum": ["feature", "benefit", "technology"]}
+                            },
+                            "required": ["id", "label", "category"]
+                        }
+                    }
+                },
+                "required": ["label", "nodes"]
+            }
+        },
+        "edges": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "source": {"type": "string"},
+                    "target": {"type": "string"}
+                },
+                "required": ["source", "target"]
+            }
+        }
+    },
+    "required": ["title", "groups", "edges"]
+}
+
+def _mermaid_label(text):
+    """Quote-safe Mermaid label."""
+    return text.strip().replace('"', "#quot;")
+
+def _render_groups(graph, prefix, include_colors, base_url, indent="    "):
+    """
+    Mermaid lines for the groups and edges of one graph in DIAGRAM_SCHEMA form.
+    Node ids are replaced with safe ones (prefix1, prefix2, ...) and groups become
+    subgraphs prefixG1, prefixG2, ...; edges between unknown nodes are dropped.
+    Returns the lines, the click lines and a map of node label to id.
+    """
+    color_palette = get_color_palette()
+    lines, clicks = [], []
+    node_ids, label_ids = {}, {}
+    for group_index, group in enumerate(graph["groups"], start=1):
+        # Subgraphs are matched by id, so two groups with the same label stay separate
+        lines.append(f'{indent}subgraph {prefix}G{group_index} ["{_mermaid_label(group["label"])}"]')
+        for node in group["nodes"]:
+            if node["id"] in node_ids:
+                continue
+            node_id = node_ids[node["id"]] = f"{prefix}{len(node_ids) + 1}"
+            label_ids.setdefault(node["label"].strip().lower(), node_id)
+            style = f':::{node["category"]}' if include_colors and node["category"] in color_palette else ""
+            lines.append(f'{indent}    {node_id}["{_mermaid_label(node["label"])}"]{style}')
+            slug = re.sub(r'[^\w]+', '-', node["label"].lower()).strip('-') or node_id.lower()
+            clicks.append(f'click {node_id} "{base_url}/{quote(slug)}" _blank')
+        lines.append(f"{indent}end")
+    for edge in graph["edges"]:
+        if edge["source"] in node_ids and edge["target"] in node_ids:
+            lines.append(f'{indent}{node_ids[edge["source"]]} --> {node_ids[edge["target"]]}')
+    return lines, clicks, label_ids
+
+def _finish_mermaid(body, clicks, language, include_colors, include_clicks):
+    """Graph header and class definitions before body, click lines after it."""
+    lines = ["graph RL" if language == 'arabic' else "graph LR"]
+    if include_colors:
+        lines += [f"classDef {category} fill:{color},stroke:#333,stroke-width:1px"
+                  for category, color in get_color_palette().items()]
+    lines += body
+    if include_clicks and clicks:
+        lines.append("")
+        lines += clicks
+    return "\n".join(lines)
+
+def render_mermaid(graph, language='english', include_colors=True, include_clicks=True,
+                   base_url=BASE_KNOWLEDGE_URL):
+    """
+    Render a diagram in DIAGRAM_SCHEMA form as Mermaid code.
+    Node ids are replaced with safe ones (N1, N2, ...); edges between unknown nodes are dropped.
+    """
+    body, clicks, _ = _render_groups(graph, "N", include_colors, base_url)
+    body = [f'subgraph "{_mermaid_label(graph["title"])}"'] + body + ["end"]
+    return _finish_mermaid(body, clicks, language, include_colors, include_clicks)
+
+def render_hierarchical_mermaid(graphs, language='english', include_colors=True, include_clicks=True,
+                                base_url=BASE_KNOWLEDGE_URL):
+    """
+    Stitch one graph per document section into a single Mermaid diagram.
+
+    Each section becomes a subgraph (S1, S2, ...) whose node ids are namespaced
+    with the section (S1N1, S2N1, ...). At the top level, sections are linked in
+    document order, and a concept that appears in several sections is joined to
+    its first occurrence with a dotted link.
+    """
+    body, clicks = [], []
+    first_seen = {}
+    shared_links = []
+    for index, graph in enumerate(graphs, start=1):
+        section_id = f"S{index}"
+        lines, section_clicks, label_ids = _render_groups(
+            graph, f"{section_id}N", include_colors, base_url, indent="        "
+        )
+        body.append(f'    subgraph {section_id} ["{_mermaid_label(graph["title"])}"]')
+        body += lines
+        body.append("    end")
+        clicks += section_clicks
+        for label, node_id in label_ids.items():
+            if label in first_seen:
+                shared_links.append(f"    {first_seen[label]} -.- {node_id}")
+            else:
+                first_seen[label] = node_id
+
+    body += [f"    S{index} --> S{index + 1}" for index in range(1, len(graphs))]
+    body += shared_links
+    return _finish_mermaid(body, clicks, language, include_colors, include_clicks)
+
+def generate_diagram_direct(input_text, include_colors=True, include_clicks=True, base_url=BASE_KNOWLEDGE_URL,
+                            language=None):
+    """
+    Generate a Mermaid diagram from a single schema-constrained Gemini call.
+    The model describes groups, nodes and edges; the Mermaid code is rendered here,
+    so it is always syntactically valid.
+    """
+    language = language or detect_language(input_text)
+    if language == 'arabic':
+        prompt = f"""
+        حلل النص التالي إلى مخطط: عنوان رئيسي، ومجموعات من العقد، وروابط بين العقد.
+        صنف كل عقدة كـ feature أو benefit أو technology، واستخدم معرفات قصيرة وفريدة للعقد.
+        يجب أن تكون جميع العناوين باللغة العربية.
+        
+        {input_text}
+        """
+    else:
+        prompt = f"""
+        Turn the following text description into a diagram: a main title, groups of nodes,
+        and edges between nodes. Classify every node as feature, benefit or technology,
+        and give nodes short unique ids.
+        
+        {input_text}
+        """
+
+    def check(graph):
+        if not any(group["nodes"] for group in graph["groups"]):
+            raise StructuredOutputError("Diagram has no nodes")
+        return render_mermaid(graph, language, include_colors, include_clicks, base_url)
+
+    return generate_structured(prompt, DIAGRAM_SCHEMA, temperature=0.1, max_output_tokens=2048, check=check)
+
+# Fast mode: a concept map built locally, without Gemini
+FAST_TERMS = 12
+FAST_HUBS = 3
+
+def generate_diagram_fast(input_text, include_colors=True, include_clicks=True, base_url=BASE_KNOWLEDGE_URL,
+                          language=None):
+    """
+    Concept map of the key terms of the text and the terms they appear with.
+
+    The top FAST_HUBS terms head one group each (one palette color per group).
+    Every other term hangs off the higher-ranked term it co-occurs with most,
+    and joins that term's group; a term that shares no window with a
+    higher-ranked one is left out. Rendered like the Gemini diagrams, with the
+    same classDefs and click links.
+    """
+    language = language or detect_language(input_text)
+    labels, _, weights = key_terms(input_text, FAST_TERMS)
+    if not labels:
+        raise ValueError("No key terms found in the text")
+
+    categories = list(get_color_palette())
+    hubs = min(FAST_HUBS, len(labels))
+    group_of = {hub: hub for hub in range(hubs)}
+    edges = [(first, second) for first in range(hubs) for second in range(first + 1, hubs)
+             if weights[first, second] > 0]
+    for term in range(hubs, len(labels)):
+        candidates = [other for other in range(term) if other in group_of]
+        parent = max(candidates, key=lambda other: weights[term, other])
+        if weights[term, parent] == 0:
+            continue
+        group_of[term] = group_of[parent]
+        edges.append((parent, term))
+
+    graph = {
+        "title": "خريطة المفاهيم" if language == 'arabic' else "Concept map",
+        "groups": [
+            {
+                "label": labels[hub],
+                "nodes": [{"id": f"t{term}", "label": labels[term], "category": categories[hub % len(categories)]}
+                          for term in range(len(labels)) if group_of.get(term) == hub]
+            }
+            for hub in range(hubs)
+        ],
+        "edges": [{"source": f"t{source}", "target": f"t{target}"} for source, target in edges]
+    }
+    return render_mermaid(graph, language, include_colors, include_clicks, base_url)
+
+# Hierarchical mode: one graph per section, generated concurrently and stitched together
+HIERARCHICAL_CHARS = 8000
+SECTION_CHARS = 6000
+MAX_PARALLEL_SECTIONS = 4
+
+def generate_section_graph(section_text, language):
+    """
+    Diagram of one section in DIAGRAM_SCHEMA form, with a few groups and nodes
+    so the merged diagram stays readable.
+    """
+    if language == 'arabic':
+        prompt = f"""
+        حلل هذا الجزء من مستند أطول إلى مخطط صغير: عنوان قصير للجزء، ومجموعة إلى ثلاث مجموعات،
+        ولا يزيد عدد العقد عن عشر، وروابط بين العقد.
+        صنف كل عقدة كـ feature أو benefit أو technology، واستخدم معرفات قصيرة وفريدة للعقد.
+        يجب أن تكون جميع العناوين باللغة العربية.
+        
+        {section_text}
+        """
+    else:
+        prompt = f"""
+        Turn this part of a longer document into a small diagram: a short title for the part,
+        one to three groups of nodes, at most ten nodes in total, and edges between nodes.
+        Classify every node as feature, benefit or technology, and give nodes short unique ids.
+        
+        {section_text}
+        """
+
+    def check(graph):
+        if not any(group["nodes"] for group in graph["groups"]):
+            raise StructuredOutputError("Diagram has no nodes")
+        return graph
+
+    return generate_structured(prompt, DIAGRAM_SCHEMA, temperature=0.1, max_output_tokens=2048, check=check)
+
+def generate_diagram_hierarchical(input_text, include_colors=True, include_clicks=True,
+                                  base_url=BASE_KNOWLEDGE_URL, max_workers=MAX_PARALLEL_SECTIONS,
+                                  section_chars=SECTION_CHARS, language=None):
+    """
+    Generate a Mermaid diagram of a long text with one subgraph per section.
+
+    Sections are diagrammed concurrently; sections that fail are left out of
+    the diagram and reported in failed_sections, next to diagram_code and the
+    number of sections.
+    """
+    language = language or detect_language(input_text)
+    sections = split_sections(input_text, section_chars)
+    if len(sections) < 2:
+        diagram_code = generate_diagram_direct(input_text, include_colors, include_clicks, base_url, language)
+        return {"diagram_code": diagram_code, "sections": len(sections), "failed_sections": []}
+
+    def diagram_section(section):
+        try:
+            graph = generate_section_graph(section.text, language)
+        except Exception as e:
+            logger.warning(f"Section diagram failed: {e}")
+            return None
+        # The document's own heading names the section when there is one
+        if section.title:
+            graph["title"] = section.title
+        return graph
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        graphs = list(executor.map(diagram_section, sections))
+    failed_sections = [index for index, graph in enumerate(graphs) if graph is None]
+    graphs = [graph for graph in graphs if graph is not None]
+    if not graphs:
+        raise StructuredOutputError("Every section failed to diagram")
+    return {
+        "diagram_code": render_hierarchical_mermaid(graphs, language, include_colors, include_clicks, base_url),
+        "sections": len(sections),
+        "failed_sections": failed_sections
+    }
+
 # Tool for generating diagrams using LangChain
 diagram_tool_obj = Tool(
     name="Mermaid Diagram Generator",
@@ -225,15 +500,9 @@ diagram_tool_obj = Tool(
 # Initialize LangChain Agent
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.2)
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-
-diagram_agent = initialize_agent(
-    tools=[diagram_tool_obj],
-    llm=llm,
-    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    memory=memory
-)
+def create_diagram_agent():
+    """Diagram agent with fresh memory, one per request."""
+    return build_agent([diagram_tool_obj], llm)
 
 # Extract function with fixes for links and language support
 def extract_diagram_from_output(output_text, base_url=BASE_KNOWLEDGE_URL):
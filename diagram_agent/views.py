@@ -1,14 +1,20 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from common.cache import cached_generation
+from common.callbacks import run_agent
+from common.structured import DIRECT_MODE, FAST_MODE, GENERATION_MODES
 from .utils import (
-    diagram_agent, 
+    create_diagram_agent, 
     extract_diagram_from_output, 
     diagram_tool, 
+    generate_diagram_direct,
+    generate_diagram_fast,
+    generate_diagram_hierarchical,
+    HIERARCHICAL_CHARS,
     BASE_KNOWLEDGE_URL,
+    PROMPT_VERSION,
     detect_language
 )
-import io
-import sys
 import re
 import logging
 
@@ -17,6 +23,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @api_view(["POST"])
+@cached_generation(
+    "diagram",
+    params={"mode": DIRECT_MODE, "hierarchical": None, "include_colors": True, "include_clicks": True, "base_url": BASE_KNOWLEDGE_URL},
+    version=PROMPT_VERSION
+)
 def generate_diagram(request):
     """
     API view to generate Mermaid diagrams from text descriptions.
@@ -35,14 +46,68 @@ def generate_diagram(request):
         else:
             return Response({"error": "Text description is required"}, status=400)
     
+    mode = request.data.get("mode", DIRECT_MODE)
+    modes = GENERATION_MODES + (FAST_MODE,)
+    if mode not in modes:
+        return Response({"error": f"mode must be one of {', '.join(modes)}"}, status=400)
+    
     # Detect language of the input text
     language = detect_language(text)
     logger.info(f"Detected language: {language}")
     
-    # Capture the console output during agent execution
-    old_stdout = sys.stdout
-    new_stdout = io.StringIO()
-    sys.stdout = new_stdout
+    if mode == FAST_MODE:
+        # Local concept map, for previews and when Gemini is unavailable
+        try:
+            diagram_code = generate_diagram_fast(
+                text,
+                include_colors=include_colors,
+                include_clicks=include_clicks,
+                base_url=base_url,
+                language=language
+            )
+            return Response({"diagram_code": diagram_code})
+        except Exception as e:
+            logger.exception(f"Error generating diagram: {str(e)}")
+            return Response({
+                "error": f"Error generating diagram: {str(e)}",
+                "details": "Check server logs for more information"
+            }, status=500)
+    
+    # One subgraph per section for long texts unless the client says otherwise
+    hierarchical = request.data.get("hierarchical")
+    if hierarchical is None:
+        hierarchical = len(text) > HIERARCHICAL_CHARS
+    elif isinstance(hierarchical, str):
+        hierarchical = hierarchical.lower() in ("1", "true")
+    
+    if mode == DIRECT_MODE:
+        # Schema-constrained Gemini calls; the Mermaid code is rendered locally
+        try:
+            if hierarchical:
+                results = generate_diagram_hierarchical(
+                    text,
+                    include_colors=include_colors,
+                    include_clicks=include_clicks,
+                    base_url=base_url,
+                    language=language
+                )
+                # Incomplete; the next request should try the failed sections again
+                headers = {"Cache-Control": "no-store"} if results["failed_sections"] else None
+                return Response(results, headers=headers)
+            diagram_code = generate_diagram_direct(
+                text,
+                include_colors=include_colors,
+                include_clicks=include_clicks,
+                base_url=base_url,
+                language=language
+            )
+            return Response({"diagram_code": diagram_code})
+        except Exception as e:
+            logger.exception(f"Error generating diagram: {str(e)}")
+            return Response({
+                "error": f"Error generating diagram: {str(e)}",
+                "details": "Check server logs for more information"
+            }, status=500)
     
     try:
         # Generate diagram with working links
@@ -66,12 +131,11 @@ def generate_diagram(request):
                 قم بإنشاء مخطط Mermaid من النص التالي:
                 {text}
                 """
-                result = diagram_agent.invoke({"input": input_with_instruction})
+                result, agent_output = run_agent(create_diagram_agent(), {"input": input_with_instruction})
             else:
-                result = diagram_agent.invoke({"input": text})
+                result, agent_output = run_agent(create_diagram_agent(), {"input": text})
             
-            # Get the full agent output for debugging
-            agent_output = new_stdout.getvalue()
+            # Observations of this request, for debugging
             logger.debug(f"Full agent output: {agent_output}")
             
             if isinstance(result, dict) and 'output' in result:
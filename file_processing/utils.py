@@ -1,5 +1,6 @@
 import re
-from langchain.document_loaders import UnstructuredFileLoader
+import codecs
+from langchain.document_loaders import PyPDFLoader, UnstructuredFileLoader
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import TextFormatter
 import pytesseract
@@ -68,4 +69,75 @@ def docx_to_text(docx_path):
     documents = loader.load()
     text = "\n\n".join([doc.page_content for doc in documents])
     
-    return text
\ No newline at end of file
+    return text
+
+
+SUPPORTED_FORMATS = ["pdf", "docx", "pptx", "jpg", "jpeg", "png", "bmp", "tiff", "gif", "txt"]
+IMAGE_FORMATS = ["jpg", "jpeg", "png", "bmp", "tiff", "gif"]
+
+def detect_text_encoding(txt_path, block_size=1024 * 1024):
+    """
+    Find an encoding that can decode the whole text file.
+    Decodes block by block so the file is never held in memory.
+    
+    Args:
+        txt_path (str): Path to the text file
+        block_size (int): Number of bytes read per block
+        
+    Returns:
+        str: 'utf-8', or 'cp1256' (Windows Arabic) if the file is not valid UTF-8
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(txt_path, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1256'
+
+def iter_text_file(txt_path, block_size=64 * 1024):
+    """
+    Yield a plain text file in blocks of whole lines of about block_size characters.
+    """
+    encoding = detect_text_encoding(txt_path)
+    with open(txt_path, 'r', encoding=encoding, errors='replace') as file:
+        lines = []
+        size = 0
+        for line in file:
+            lines.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield "".join(lines)
+                lines = []
+                size = 0
+        if lines:
+            yield "".join(lines)
+
+def iter_file_pages(file_path, file_ext):
+    """
+    Stream the text of a file page by page (or element by element).
+    
+    Unlike the *_to_text helpers, nothing waits for the whole document:
+    callers can start working on the first page while later ones are extracted.
+    
+    Args:
+        file_path (str): Path to the file
+        file_ext (str): Lower-case file extension without the dot
+        
+    Yields:
+        str: Text of the next page, slide element, image or text block
+    """
+    if file_ext == "pdf":
+        for doc in PyPDFLoader(file_path).lazy_load():
+            yield doc.page_content
+    elif file_ext in ["docx", "pptx"]:
+        for doc in UnstructuredFileLoader(file_path, mode="elements").lazy_load():
+            yield doc.page_content
+    elif file_ext in IMAGE_FORMATS:
+        yield image_to_text(file_path)
+    elif file_ext == "txt":
+        yield from iter_text_file(file_path)
+    else:
+        raise ValueError(f"Unsupported file format: .{file_ext}")
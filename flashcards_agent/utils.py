@@ -1,33 +1,28 @@
 import os
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
-import langdetect
+from common.agents import build_agent
+from common.language import detect_language
+from common.parsing import CardParser, parse_stream, parse_text
+from common.dedupe import MinHashDeduper
+from common.sections import split_sections
+from common.structured import StructuredOutputError, generate_structured, stream_text
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def detect_language(text):
-    """Detect if text is Arabic or English."""
-    try:
-        language = langdetect.detect(text)
-        if language == 'ar':
-            return 'arabic'
-        else:
-            return 'english'
-    except:
-        # Default to English if detection fails
-        return 'english'
+# Part of the result cache key; bump it whenever the prompts or the output format change
+PROMPT_VERSION = "1"
 
-def flashcard_tool(input_text):
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    
-    # Detect language
-    language = detect_language(input_text)
-    
+def flashcard_prompt(input_text, language):
+    """Prompt for flashcards in the plain Q:/A: (س:/ج:) text format."""
     if language == 'arabic':
         prompt = """
         قم بإنشاء بطاقات تعليمية من النص التالي:
@@ -52,10 +47,162 @@ def flashcard_tool(input_text):
         
         Generate at least 5 flashcards. Do not include any additional text, thoughts, or explanations.
         """
-    
-    response = model.generate_content(prompt.format(input_text=input_text))
+    return prompt.format(input_text=input_text)
+
+def flashcard_tool(input_text):
+    model = genai.GenerativeModel("gemini-1.5-flash")
+    response = model.generate_content(flashcard_prompt(input_text, detect_language(input_text)))
     return response.text
 
+FLASHCARDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "flashcards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"}
+                },
+                "required": ["question", "answer"]
+            }
+        }
+    },
+    "required": ["flashcards"]
+}
+
+def _check_flashcards(data):
+    flashcards = [
+        {"question": card["question"].strip(), "answer": card["answer"].strip()}
+        for card in data["flashcards"]
+        if card["question"].strip() and card["answer"].strip()
+    ]
+    if not flashcards:
+        raise StructuredOutputError("No flashcards generated")
+    return flashcards
+
+def generate_flashcards_direct(input_text, count=None, focus=None, language=None):
+    """
+    Generate flashcards with a single schema-constrained Gemini call.
+    Asks for count cards if given (otherwise at least 5), optionally
+    concentrating on one kind of material (focus).
+    Returns a list of {"question", "answer"} dicts.
+    """
+    language = language or detect_language(input_text)
+    if language == 'arabic':
+        amount = f"{count} بطاقة تعليمية" if count else "5 بطاقات تعليمية على الأقل"
+        focus_line = f"ركز على: {focus}." if focus else ""
+        prompt = f"""
+        قم بإنشاء {amount} من النص التالي.
+        {focus_line}
+        يجب أن تكون جميع الأسئلة والأجوبة باللغة العربية.
+        
+        {input_text}
+        """
+    else:
+        amount = f"{count} flashcards" if count else "at least 5 flashcards"
+        focus_line = f"Concentrate on {focus}." if focus else ""
+        prompt = f"""
+        Generate {amount} from the following text.
+        Each flashcard has a question and a short answer taken from the text.
+        {focus_line}
+        
+        {input_text}
+        """
+    return generate_structured(prompt, FLASHCARDS_SCHEMA, temperature=0.7, check=_check_flashcards)
+
+def stream_flashcards(input_text, language=None):
+    """
+    Generate flashcards with a streamed text completion, yielding each card
+    as soon as it is complete, so the first ones arrive long before the rest.
+    Falls back to generate_flashcards_direct if no card could be parsed.
+    """
+    language = language or detect_language(input_text)
+    parsed = 0
+    for card in parse_stream(CardParser(), stream_text(flashcard_prompt(input_text, language))):
+        parsed += 1
+        yield card
+    if not parsed:
+        logger.warning("No flashcards in the streamed output, falling back to direct generation")
+        yield from generate_flashcards_direct(input_text, language=language)
+
+# Large decks: many small batched calls run concurrently, each on its own slice of the text
+MAX_CARDS = 300
+CARDS_PER_BATCH = 15
+MAX_PARALLEL_BATCHES = 4
+MAX_ROUNDS = 3
+MIN_SLICE_CHARS = 2000
+# Cards whose questions are at least this similar (MinHash over word shingles) are dropped
+DUPLICATE_THRESHOLD = 0.6
+
+# Batches that share a slice of text are steered to different material
+FOCUSES = {
+    'arabic': ["التعريفات والمصطلحات الرئيسية", "العمليات والخطوات", "الأرقام والكميات والحقائق",
+               "الأسباب والنتائج", "المقارنات والاختلافات", "التطبيقات العملية"],
+    'english': ["definitions and key terms", "processes and steps", "numbers, quantities and facts",
+                "causes, effects and reasons", "comparisons and differences", "practical applications"]
+}
+
+def plan_batches(input_text, count, language, round_index=0):
+    """
+    (text slice, number of cards, focus) for each batch needed for count cards.
+    Every slice of the text gets at least one batch; a slice that gets several
+    gives each a different focus.
+    """
+    target = math.ceil(count * 1.2)
+    batches = math.ceil(target / CARDS_PER_BATCH)
+    slices = split_sections(input_text, max(MIN_SLICE_CHARS, math.ceil(len(input_text) / batches)))
+    batches = max(batches, len(slices))
+    amount = min(CARDS_PER_BATCH, max(3, math.ceil(target / batches)))
+
+    focuses = FOCUSES['arabic' if language == 'arabic' else 'english']
+    shared = batches > len(slices) or round_index > 0
+    plan = []
+    for batch in range(batches):
+        repeat = batch // len(slices) + round_index
+        focus = focuses[repeat % len(focuses)] if shared else None
+        plan.append((slices[batch % len(slices)].text, amount, focus))
+    return plan
+
+def iter_flashcard_batches(input_text, count, language=None):
+    """
+    Generate a deck of count flashcards, yielding lists of new cards as batches finish.
+
+    Batches run concurrently, at most MAX_PARALLEL_BATCHES at a time. Near-duplicate
+    questions are dropped; if that leaves the deck short, further rounds with
+    other focuses are run, up to MAX_ROUNDS.
+    """
+    language = language or detect_language(input_text)
+    deduper = MinHashDeduper(DUPLICATE_THRESHOLD)
+    produced = 0
+    for round_index in range(MAX_ROUNDS):
+        if produced >= count:
+            return
+        executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_BATCHES)
+        try:
+            futures = [
+                executor.submit(generate_flashcards_direct, text, amount, focus, language)
+                for text, amount, focus in plan_batches(input_text, count - produced, language, round_index)
+            ]
+            for future in as_completed(futures):
+                try:
+                    cards = future.result()
+                except Exception as e:
+                    logger.warning(f"Flashcard batch failed: {e}")
+                    continue
+                new_cards = [card for card in cards if deduper.add(card["question"])][:count - produced]
+                if new_cards:
+                    produced += len(new_cards)
+                    yield new_cards
+                if produced >= count:
+                    return
+        finally:
+            # Stop queued batches once the deck is full or the client went away
+            executor.shutdown(wait=False, cancel_futures=True)
+    if not produced:
+        raise StructuredOutputError("No flashcards generated")
+
 # Define tool for LangChain agent
 flashcard_tool_obj = Tool(
     name="Flashcard Generator",
@@ -65,63 +212,15 @@ flashcard_tool_obj = Tool(
 
 # Initialize LangChain agent with Gemini
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-agent = initialize_agent(
-    tools=[flashcard_tool_obj],
-    llm=llm,
-    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,  # You can set this to False later
-    memory=memory
-)
+
+def create_agent():
+    """Flashcard agent with fresh memory, one per request."""
+    return build_agent([flashcard_tool_obj], llm)
 
 # Create a function to extract flashcards from agent output
 def extract_flashcards_from_output(output_text):
-    import re
-    
-    # Check if output contains Arabic question/answer format
-    if 'س:' in output_text and 'ج:' in output_text:
-        # This pattern captures the Arabic Q&A pairs from the Observation sections
-        observation_sections = re.findall(r'Observation: (.*?)(?=Thought:|$)', output_text, re.DOTALL)
-        
-        all_flashcards = []
-        for section in observation_sections:
-            # Extract Arabic Q&A pairs from each observation section
-            qa_pairs = re.findall(r'س: (.*?)\nج: (.*?)(?=\s*س:|$)', section, re.DOTALL)
-            for question, answer in qa_pairs:
-                all_flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
-                
-        # If no matches found in observation sections, try the entire text
-        if not all_flashcards:
-            qa_pairs = re.findall(r'س: (.*?)\nج: (.*?)(?=\s*س:|$)', output_text, re.DOTALL)
-            for question, answer in qa_pairs:
-                all_flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
-    else:
-        # This pattern captures the English Q&A pairs from the Observation sections
-        observation_sections = re.findall(r'Observation: (.*?)(?=Thought:|$)', output_text, re.DOTALL)
-        
-        all_flashcards = []
-        for section in observation_sections:
-            # Extract English Q&A pairs from each observation section
-            qa_pairs = re.findall(r'Q: (.*?)\nA: (.*?)(?=\s*Q:|$)', section, re.DOTALL)
-            for question, answer in qa_pairs:
-                all_flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
-                
-        # If no matches found in observation sections, try the entire text
-        if not all_flashcards:
-            qa_pairs = re.findall(r'Q: (.*?)\nA: (.*?)(?=\s*Q:|$)', output_text, re.DOTALL)
-            for question, answer in qa_pairs:
-                all_flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
-    
-    return all_flashcards
\ No newline at end of file
+    """
+    Flashcards (Q:/A: or س:/ج:) in the agent output, taken from its
+    Observation sections if it has any, otherwise from the whole text.
+    """
+    return parse_text(CardParser(), output_text)
@@ -1,55 +1,73 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .utils import agent, extract_flashcards_from_output, detect_language
-import io
-import sys
-import contextlib
+from common.cache import cached_generation
+from common.callbacks import run_agent
+from common.streaming import sse_response, wants_stream
+from common.structured import DIRECT_MODE, GENERATION_MODES
+from .utils import (
+    create_agent,
+    extract_flashcards_from_output,
+    generate_flashcards_direct,
+    iter_flashcard_batches,
+    stream_flashcards,
+    MAX_CARDS,
+    PROMPT_VERSION
+)
 
 @api_view(["POST"])
+@cached_generation("flashcards", params={"mode": DIRECT_MODE, "count": None}, version=PROMPT_VERSION)
 def generate_flashcards(request):
     text = request.data.get("text", "")
     
     if not text:
         return Response({"error": "Text is required"}, status=400)
     
-    # Detect language of the input text
-    language = detect_language(text)
+    mode = request.data.get("mode", DIRECT_MODE)
+    if mode not in GENERATION_MODES:
+        return Response({"error": f"mode must be one of {', '.join(GENERATION_MODES)}"}, status=400)
     
-    # Capture the console output during agent execution
-    old_stdout = sys.stdout
-    new_stdout = io.StringIO()
-    sys.stdout = new_stdout
+    # Optional deck size (direct mode only)
+    count = request.data.get("count")
+    if count is not None:
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= MAX_CARDS:
+            return Response({"error": f"count must be an integer between 1 and {MAX_CARDS}"}, status=400)
     
-    try:
-        # Run the agent
-        agent.invoke(text)
+    if mode == DIRECT_MODE:
+        stream = wants_stream(request)
+
+        def batches():
+            if count is None and stream:
+                # One streamed Gemini call, each card sent as soon as it is complete
+                return ([card] for card in stream_flashcards(text))
+            if count is None:
+                # One schema-constrained Gemini call, no agent loop
+                return iter([generate_flashcards_direct(text)])
+            # Concurrent batches over slices of the text, near-duplicates removed
+            return iter_flashcard_batches(text, count)
+        
+        if stream:
+            # Server-sent events: one "flashcards" event per finished batch (or card), then "done"
+            def events():
+                total = 0
+                for batch in batches():
+                    total += len(batch)
+                    yield "flashcards", {"flashcards": batch}
+                yield "done", {"total": total}
+            return sse_response(events())
         
-        # Get the console output
-        agent_output = new_stdout.getvalue()
-    finally:
-        # Restore stdout
-        sys.stdout = old_stdout
+        try:
+            return Response({"flashcards": [card for batch in batches() for card in batch]})
+        except Exception as e:
+            return Response({"error": f"Failed to generate flashcards: {str(e)}"}, status=500)
     
-    # Extract flashcards from the output
-    flashcards = extract_flashcards_from_output(agent_output)
+    # Run the agent, capturing the observations of this request only
+    _, agent_output = run_agent(create_agent(), text)
     
-    if not flashcards:
-        # Fallback to a direct search if no flashcards were found in the observations
-        import re
-        
-        if language == 'arabic':
-            qa_pairs = re.findall(r'س: (.*?)\nج: (.*?)(?=\s*س:|$)', agent_output, re.DOTALL)
-            for question, answer in qa_pairs:
-                flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
-        else:
-            qa_pairs = re.findall(r'Q: (.*?)\nA: (.*?)(?=\s*Q:|$)', agent_output, re.DOTALL)
-            for question, answer in qa_pairs:
-                flashcards.append({
-                    "question": question.strip(),
-                    "answer": answer.strip()
-                })
+    # Extract flashcards from the observations, or the whole output if there are none there
+    flashcards = extract_flashcards_from_output(agent_output)
     
     return Response({"flashcards": flashcards})
\ No newline at end of file
@@ -1,3 +1,127 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+from common.sections import Section
+from . import utils
+
+ARABIC_TEXT = "التحميل التدريجي يعني زيادة الوزن أو التكرارات كل أسبوع. " * 5
+
+
+class AllocationTests(SimpleTestCase):
+    def test_questions_follow_section_length(self):
+        sections = [Section(None, "a" * 6000), Section(None, "b" * 3000), Section(None, "c" * 1000)]
+        self.assertEqual(utils.allocate_questions(sections, 10), [6, 3, 1])
+        allocation = utils.allocate_questions(sections, 7)
+        self.assertEqual(sum(allocation), 7)
+        self.assertEqual(allocation, sorted(allocation, reverse=True))
+
+
+@override_settings(GENERATION_CACHE={"ENABLED": False})
+class QuizLanguageTests(SimpleTestCase):
+    def test_detected_language_reaches_the_generators(self):
+        quiz = {"question": "س؟", "options": {"أ": "1", "ب": "2", "ج": "3", "د": "4"}, "correct_answer": "أ"}
+        sectioned_result = {"quizzes": [quiz], "sections": 1, "failed_sections": []}
+        with mock.patch("quizes_agent.views.generate_quizzes_sectioned", return_value=sectioned_result) as sectioned, \
+                mock.patch("quizes_agent.views.generate_quizzes_direct", return_value=[quiz]) as direct:
+            APIClient().post("/agent/generate_quizzes/", {"text": ARABIC_TEXT, "count": 3}, format="json")
+            APIClient().post("/agent/generate_quizzes/", {"text": ARABIC_TEXT}, format="json")
+        self.assertEqual(sectioned.call_args.kwargs["language"], "arabic")
+        self.assertEqual(direct.call_args.kwargs["language"], "arabic")
+
+
+def make_quiz(question):
+    return {"question": question, "options": {"A": "1", "B": "2", "C": "3", "D": "4"}, "correct_answer": "A"}
+
+
+class SectionedQuizTests(SimpleTestCase):
+    text = "\n\n".join(f"Part {index}. " + f"Exercise {index} needs rest between heavy sets. " * 40
+                       for index in range(3))
+
+    def test_failed_sections_are_retried_then_reported(self):
+        calls = {}
+        def generate(text, amount, language, attempts):
+            self.assertEqual(attempts, 1)
+            index = int(text.split(".")[0].split()[-1])
+            calls[index] = calls.get(index, 0) + 1
+            # Section 0 never succeeds, section 1 on its second attempt
+            if index == 0 or (index == 1 and calls[index] == 1):
+                raise ValueError("bad output")
+            return [make_quiz(f"Why does exercise {index} need rest, variant {n}?") for n in range(amount)]
+
+        with mock.patch.object(utils, "generate_quizzes_direct", side_effect=generate), \
+                mock.patch.object(utils.time, "sleep"):
+            result = utils.generate_quizzes_sectioned(self.text, 6, section_chars=2500, language="english")
+
+        self.assertEqual(result["sections"], 3)
+        self.assertEqual(result["failed_sections"], [0])
+        self.assertEqual(calls, {0: utils.GENERATION_ATTEMPTS, 1: 2, 2: 1})
+        self.assertTrue(result["quizzes"])
+        self.assertFalse(any("exercise 0" in quiz["question"] for quiz in result["quizzes"]))
+
+    @override_settings(GENERATION_CACHE={"ENABLED": False})
+    def test_partial_results_are_not_cached(self):
+        result = {"quizzes": [make_quiz("Why rest?")], "sections": 3, "failed_sections": [0]}
+        with mock.patch("quizes_agent.views.generate_quizzes_sectioned", return_value=result):
+            response = APIClient().post("/agent/generate_quizzes/", {"text": "Rest.", "count": 3}, format="json")
+        self.assertEqual(response["Cache-Control"], "no-store")
+        self.assertEqual(response.json()["failed_sections"], [0])
+
+
+class StreamingGenerationTests(SimpleTestCase):
+    def test_questions_are_sent_as_they_are_completed(self):
+        output = ("Q: Which rest period suits heavy sets?\nA. 10 seconds\nB. 30 seconds\n"
+                  "C. Two to three minutes\nD. Ten minutes\nCorrect Answer: C\n\n"
+                  "Q: What is progressive overload?\nA. Less load\nB. More load over time\n"
+                  "C. No rest\nD. Only cardio\nCorrect Answer: B\n")
+        produced = []
+        def chunks():
+            for start in range(0, len(output), 20):
+                produced.append(start)
+                yield mock.Mock(text=output[start:start + 20])
+
+        model = mock.Mock()
+        model.generate_content.return_value = chunks()
+        with mock.patch("common.structured.genai.GenerativeModel", return_value=model):
+            response = APIClient().post("/agent/generate_quizzes/", {"text": "Rest between sets.", "stream": True},
+                                        format="json")
+            events = iter(response.streaming_content)
+            first = next(events).decode()
+            # Sent before the model has produced the second question
+            self.assertLess(produced[-1], output.index("Q: What is progressive"))
+            rest = b"".join(events).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn("Two to three minutes", first)
+        self.assertEqual(rest.count("event: quizzes"), 1)
+        self.assertIn('event: done\ndata: {"total": 2}', rest)
+        self.assertTrue(model.generate_content.call_args.kwargs["stream"])
+
+    @override_settings(GENERATION_CACHE={"ENABLED": False})
+    def test_sections_are_sent_as_they_finish(self):
+        text = "\n\n".join(f"Part {index}. " + f"Exercise {index} needs rest between heavy sets. " * 150
+                           for index in range(3))
+        sent = threading.Event()
+        def generate(text, amount, language, attempts):
+            index = int(text.split(".")[0].split()[-1])
+            if index == 1:
+                raise ValueError("bad output")
+            if index == 2:
+                # The last section waits until the first one has been sent
+                self.assertTrue(sent.wait(5))
+            return [make_quiz(f"Why does exercise {index} need rest, variant {n}?") for n in range(amount)]
+
+        with mock.patch.object(utils, "generate_quizzes_direct", side_effect=generate), \
+                mock.patch.object(utils.time, "sleep"):
+            response = APIClient().post("/agent/generate_quizzes/", {"text": text, "count": 6, "stream": True},
+                                        format="json")
+            events = iter(response.streaming_content)
+            first = next(events).decode()
+            sent.set()
+            rest = b"".join(events).decode()
+
+        self.assertIn("exercise 0", first)
+        self.assertNotIn("exercise 2", first)
+        self.assertEqual(rest.count("event: quizzes"), 1)
+        self.assertIn('"failed_sections": [1]', rest)
 
-# Create your tests here.
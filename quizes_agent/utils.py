@@ -1,33 +1,31 @@
 import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
-import langdetect
+from common.agents import build_agent
+from common.language import detect_language
+from common.parsing import QuizParser, parse_stream, parse_text
+from common.dedupe import MinHashDeduper, dedupe
+from common.sections import split_sections
+from common.structured import StructuredOutputError, generate_structured, stream_text
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def detect_language(text):
-    """Detect if text is Arabic or English."""
-    try:
-        language = langdetect.detect(text)
-        if language == 'ar':
-            return 'arabic'
-        else:
-            return 'english'
-    except:
-        # Default to English if detection fails
-        return 'english'
+# Part of the result cache key; bump it whenever the prompts or the output format change
+PROMPT_VERSION = "1"
 
-def quiz_tool(input_text):
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    
-    # Detect language
-    language = detect_language(input_text)
-    
+def quiz_prompt(input_text, language):
+    """
+    Prompt and generation config for questions in the plain text format
+    (Q:, A.-D., Correct Answer:, or their Arabic equivalents).
+    """
     if language == 'arabic':
         # Arabic prompt with explicit instructions to respond in Arabic only
         prompt = """
@@ -79,13 +77,229 @@ def quiz_tool(input_text):
     if language == 'arabic':
         generation_config["stop_sequences"] = ["Q:", "Question:"]
     
-    response = model.generate_content(
-        prompt.format(input_text=input_text),
-        generation_config=generation_config
-    )
-    
+    return prompt.format(input_text=input_text), generation_config
+
+def quiz_tool(input_text):
+    model = genai.GenerativeModel("gemini-1.5-flash")
+    prompt, generation_config = quiz_prompt(input_text, detect_language(input_text))
+    response = model.generate_content(prompt, generation_config=generation_config)
     return response.text
 
+QUIZZES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "quizzes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "correct_option": {"type": "integer", "description": "Index of the correct option, 0 to 3"}
+                },
+                "required": ["question", "options", "correct_option"]
+            }
+        }
+    },
+    "required": ["quizzes"]
+}
+
+# Option letters used in the response, matching the text format of quiz_tool
+OPTION_LETTERS = {
+    'arabic': ["أ", "ب", "ج", "د"],
+    'english': ["A", "B", "C", "D"]
+}
+
+def format_quizzes(quizzes, language):
+    """
+    Convert schema output to the response format: options keyed by letter
+    and the letter of the correct option. Malformed questions are dropped.
+    """
+    letters = OPTION_LETTERS['arabic' if language == 'arabic' else 'english']
+    formatted = []
+    for quiz in quizzes:
+        options = [option.strip() for option in quiz["options"]]
+        if len(options) != 4 or not all(options) or not 0 <= quiz["correct_option"] < 4:
+            continue
+        formatted.append({
+            "question": quiz["question"].strip(),
+            "options": dict(zip(letters, options)),
+            "correct_answer": letters[quiz["correct_option"]]
+        })
+    if not formatted:
+        raise StructuredOutputError("No valid quiz questions generated")
+    return formatted
+
+def generate_quizzes_direct(input_text, count=None, language=None, attempts=2):
+    """
+    Generate multiple-choice questions with a single schema-constrained Gemini call.
+    Asks for exactly count questions if given, otherwise at least 5.
+    Returns quizzes in the same format as the agent path.
+    """
+    language = language or detect_language(input_text)
+    if language == 'arabic':
+        amount = f"{count} أسئلة اختبار متعددة الخيارات بالضبط" if count else "5 أسئلة اختبار متعددة الخيارات على الأقل"
+        prompt = f"""
+        قم بإنشاء {amount} من النص التالي.
+        لكل سؤال 4 خيارات، واحد منها فقط صحيح.
+        هام جداً: يجب أن تكون جميع الأسئلة والخيارات باللغة العربية حصراً.
+        
+        {input_text}
+        """
+    else:
+        amount = f"exactly {count}" if count else "at least 5"
+        prompt = f"""
+        Create {amount} multiple-choice quiz questions from the following text.
+        Each question has 4 options with only one correct answer.
+        
+        {input_text}
+        """
+    return generate_structured(
+        prompt, QUIZZES_SCHEMA, temperature=0.7,
+        check=lambda data: format_quizzes(data["quizzes"], language), attempts=attempts
+    )
+
+def stream_quizzes(input_text, language=None):
+    """
+    Generate questions with a streamed text completion, yielding each one
+    as soon as its correct answer line arrives.
+    Falls back to generate_quizzes_direct if no question could be parsed.
+    """
+    language = language or detect_language(input_text)
+    prompt, generation_config = quiz_prompt(input_text, language)
+    parsed = 0
+    for quiz in parse_stream(QuizParser(), stream_text(prompt, generation_config=generation_config)):
+        parsed += 1
+        yield quiz
+    if not parsed:
+        logger.warning("No quiz questions in the streamed output, falling back to direct generation")
+        yield from generate_quizzes_direct(input_text, language=language)
+
+# Long texts and explicit counts: questions are generated per section, concurrently
+MAX_QUESTIONS = 100
+SECTION_CHARS = 8000
+MAX_PARALLEL_SECTIONS = 4
+# Questions at least this similar (word shingles) to an earlier one are dropped
+DUPLICATE_THRESHOLD = 0.6
+# Model calls per section before it is reported as failed
+GENERATION_ATTEMPTS = 3
+
+def allocate_questions(sections, count):
+    """
+    Number of questions per section, proportional to section length
+    (largest remainder), so long sections get more questions.
+    """
+    total = sum(len(section.text) for section in sections)
+    shares = [count * len(section.text) / total for section in sections]
+    allocation = [int(share) for share in shares]
+    by_remainder = sorted(range(len(sections)), key=lambda i: shares[i] - allocation[i], reverse=True)
+    for i in by_remainder[:count - sum(allocation)]:
+        allocation[i] += 1
+    return allocation
+
+def generate_section_quizzes(text, amount, language):
+    """
+    Questions for one section, retried on its own (GENERATION_ATTEMPTS model
+    calls in total, backing off between them). Returns None if every attempt failed.
+    """
+    for attempt in range(GENERATION_ATTEMPTS):
+        try:
+            return generate_quizzes_direct(text, amount, language, attempts=1)
+        except Exception as e:
+            logger.warning(f"Section quiz generation failed (attempt {attempt + 1}/{GENERATION_ATTEMPTS}): {e}")
+            if attempt + 1 < GENERATION_ATTEMPTS:
+                time.sleep(2 ** attempt)
+    return None
+
+def plan_sections(input_text, count, section_chars=SECTION_CHARS):
+    """Sections of the text and the (index, section, questions) of those that get any."""
+    sections = split_sections(input_text, section_chars)
+    allocation = allocate_questions(sections, count)
+    work = [(index, section, amount) for index, (section, amount) in enumerate(zip(sections, allocation)) if amount]
+    return sections, work
+
+def iter_quiz_sections(input_text, count, max_workers=MAX_PARALLEL_SECTIONS, section_chars=SECTION_CHARS,
+                       language=None):
+    """
+    Generate count questions covering the whole text, yielding (section index,
+    questions) as each section finishes, for streaming.
+
+    Sections run concurrently, at most max_workers at a time. Each yields up to
+    its share of count, a few extra having been asked for so that near-duplicates
+    of questions already yielded can be dropped. A section that failed every
+    attempt yields None.
+    """
+    language = language or detect_language(input_text)
+    _, work = plan_sections(input_text, count, section_chars)
+    deduper = MinHashDeduper(DUPLICATE_THRESHOLD)
+    produced = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {}
+        for index, section, amount in work:
+            future = executor.submit(generate_section_quizzes, section.text, amount + max(1, amount // 4), language)
+            futures[future] = index, amount
+        for future in as_completed(futures):
+            index, amount = futures[future]
+            quizzes = future.result()
+            if quizzes is None:
+                yield index, None
+                continue
+            quizzes = [quiz for quiz in quizzes if deduper.add(quiz["question"])][:amount]
+            produced += len(quizzes)
+            yield index, quizzes
+    finally:
+        # Stop queued sections if the client went away
+        executor.shutdown(wait=False, cancel_futures=True)
+    if not produced:
+        raise StructuredOutputError("No quiz questions generated")
+
+def generate_quizzes_sectioned(input_text, count, max_workers=MAX_PARALLEL_SECTIONS, section_chars=SECTION_CHARS,
+                               language=None):
+    """
+    Generate count questions covering the whole text.
+
+    The text is split into sections, questions are generated for the sections
+    concurrently (a few extra per section, each section retried on its own),
+    near-duplicates across sections are dropped and count questions are picked
+    round-robin across sections, in document order. May return fewer than count
+    if too many were duplicates. Returns the quizzes, the number of sections and
+    the sections that still failed (failed_sections).
+    """
+    language = language or detect_language(input_text)
+    sections, work = plan_sections(input_text, count, section_chars)
+
+    def generate(item):
+        index, section, amount = item
+        # A few extra, since some will be duplicates
+        return index, generate_section_quizzes(section.text, amount + max(1, amount // 4), language)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(generate, work))
+
+    failed_sections = [index for index, quizzes in results if quizzes is None]
+    candidates = [(index, position, quiz) for index, quizzes in results if quizzes is not None
+                  for position, quiz in enumerate(quizzes)]
+    if not candidates:
+        raise StructuredOutputError("No quiz questions generated")
+    candidates = dedupe(candidates, key=lambda candidate: candidate[2]["question"], threshold=DUPLICATE_THRESHOLD)
+
+    # Round-robin over sections so every part of the document is covered
+    per_section = {}
+    for candidate in candidates:
+        per_section.setdefault(candidate[0], []).append(candidate)
+    selected = []
+    while len(selected) < count and any(per_section.values()):
+        for queue in per_section.values():
+            if queue and len(selected) < count:
+                selected.append(queue.pop(0))
+    selected.sort(key=lambda candidate: candidate[:2])
+    return {
+        "quizzes": [quiz for _, _, quiz in selected],
+        "sections": len(sections),
+        "failed_sections": failed_sections
+    }
+
 # Define tool for LangChain agent with system instructions to respect the language
 quiz_tool_obj = Tool(
     name="Quiz Generator",
@@ -96,111 +310,14 @@ quiz_tool_obj = Tool(
 # Initialize LangChain agent with Gemini
 # For Arabic text, set a higher temperature to encourage more creative generation
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-quizzes_agent = initialize_agent(
-    tools=[quiz_tool_obj],
-    llm=llm,
-    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    memory=memory
-)
+
+def create_quizzes_agent():
+    """Quiz agent with fresh memory, one per request."""
+    return build_agent([quiz_tool_obj], llm)
 
 def extract_quizzes_from_output(output_text):
-    import re
-    
-    # Check if output contains Arabic question format
-    if 'س:' in output_text and ('أ.' in output_text or 'أ:' in output_text):
-        # Extract Arabic quiz questions from Observation sections
-        observation_sections = re.findall(r'Observation: (.*?)(?=Thought:|$)', output_text, re.DOTALL)
-        
-        all_quizzes = []
-        for section in observation_sections:
-            # Pattern to match Arabic quiz questions with flexible format
-            quiz_pattern = r'س: (.*?)(?:\n|\r\n)(أ|أ\.)\.?\s*(.*?)(?:\n|\r\n)(ب|ب\.)\.?\s*(.*?)(?:\n|\r\n)(ج|ج\.)\.?\s*(.*?)(?:\n|\r\n)(د|د\.)\.?\s*(.*?)(?:\n|\r\n)الإجابة الصحيحة:?\s*([أ-د])'
-            quizzes = re.findall(quiz_pattern, section, re.DOTALL)
-            
-            for quiz in quizzes:
-                question = quiz[0].strip()
-                option_a = quiz[2].strip()
-                option_b = quiz[4].strip()
-                option_c = quiz[6].strip()
-                option_d = quiz[8].strip()
-                correct_answer = quiz[9].strip()
-                
-                all_quizzes.append({
-                    "question": question,
-                    "options": {
-                        "أ": option_a,
-                        "ب": option_b,
-                        "ج": option_c,
-                        "د": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
-        
-        # If no matches found in observation sections, try the entire text with more flexible pattern
-        if not all_quizzes:
-            # More flexible pattern to match different formats that might appear
-            quiz_pattern = r'س: (.*?)(?:\n|\r\n|\s+)(أ|أ\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(ب|ب\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(ج|ج\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(د|د\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(?:الإجابة الصحيحة:?|الجواب الصحيح:?)\s*([أ-د])'
-            quizzes = re.findall(quiz_pattern, output_text, re.DOTALL)
-            
-            for quiz in quizzes:
-                question = quiz[0].strip()
-                option_a = quiz[2].strip()
-                option_b = quiz[4].strip()
-                option_c = quiz[6].strip()
-                option_d = quiz[8].strip()
-                correct_answer = quiz[9].strip()
-                
-                all_quizzes.append({
-                    "question": question,
-                    "options": {
-                        "أ": option_a,
-                        "ب": option_b,
-                        "ج": option_c,
-                        "د": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
-    else:
-        # Extract English quiz questions from Observation sections
-        observation_sections = re.findall(r'Observation: (.*?)(?=Thought:|$)', output_text, re.DOTALL)
-        
-        all_quizzes = []
-        for section in observation_sections:
-            # Pattern to match English quiz questions in the specified format
-            quiz_pattern = r'Q: (.*?)\nA\. (.*?)\nB\. (.*?)\nC\. (.*?)\nD\. (.*?)\nCorrect Answer: ([A-D])'
-            quizzes = re.findall(quiz_pattern, section, re.DOTALL)
-            
-            for quiz in quizzes:
-                question, option_a, option_b, option_c, option_d, correct_answer = map(str.strip, quiz)
-                all_quizzes.append({
-                    "question": question,
-                    "options": {
-                        "A": option_a,
-                        "B": option_b,
-                        "C": option_c,
-                        "D": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
-        
-        # If no matches found in observation sections, try the entire text
-        if not all_quizzes:
-            quiz_pattern = r'Q: (.*?)\nA\. (.*?)\nB\. (.*?)\nC\. (.*?)\nD\. (.*?)\nCorrect Answer: ([A-D])'
-            quizzes = re.findall(quiz_pattern, output_text, re.DOTALL)
-            
-            for quiz in quizzes:
-                question, option_a, option_b, option_c, option_d, correct_answer = map(str.strip, quiz)
-                all_quizzes.append({
-                    "question": question,
-                    "options": {
-                        "A": option_a,
-                        "B": option_b,
-                        "C": option_c,
-                        "D": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
-    
-    return all_quizzes
\ No newline at end of file
+    """
+    Multiple-choice questions (English or Arabic format) in the agent output,
+    taken from its Observation sections if it has any, otherwise from the whole text.
+    """
+    return parse_text(QuizParser(), output_text)
@@ -1,97 +1,116 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .utils import quizzes_agent, extract_quizzes_from_output, detect_language
-import io
-import sys
+from common.cache import cached_generation
+from common.callbacks import run_agent
+from common.streaming import sse_response, wants_stream
+from common.structured import DIRECT_MODE, GENERATION_MODES
+from .utils import (
+    create_quizzes_agent,
+    extract_quizzes_from_output,
+    detect_language,
+    generate_quizzes_direct,
+    generate_quizzes_sectioned,
+    iter_quiz_sections,
+    stream_quizzes,
+    MAX_QUESTIONS,
+    SECTION_CHARS,
+    PROMPT_VERSION
+)
 
 @api_view(["POST"])
+@cached_generation("quizzes", params={"mode": DIRECT_MODE, "count": None}, version=PROMPT_VERSION)
 def generate_quizzes(request):
     text = request.data.get("text", "")
     
     if not text:
         return Response({"error": "Text is required"}, status=400)
     
+    mode = request.data.get("mode", DIRECT_MODE)
+    if mode not in GENERATION_MODES:
+        return Response({"error": f"mode must be one of {', '.join(GENERATION_MODES)}"}, status=400)
+    
+    # Optional target number of questions (direct mode only)
+    count = request.data.get("count")
+    if count is not None:
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= MAX_QUESTIONS:
+            return Response({"error": f"count must be an integer between 1 and {MAX_QUESTIONS}"}, status=400)
+    
     # Detect language of the input text
     language = detect_language(text)
     
-    # Capture the console output during agent execution
-    old_stdout = sys.stdout
-    new_stdout = io.StringIO()
-    sys.stdout = new_stdout
+    if mode == DIRECT_MODE:
+        sectioned = count is not None or len(text) > SECTION_CHARS
+        if sectioned:
+            # Without a count, long texts get about one question per section, at least 5
+            count = count or min(MAX_QUESTIONS, max(5, len(text) // SECTION_CHARS + 1))
+        
+        if wants_stream(request):
+            # Server-sent events: "quizzes" events as questions are ready, then "done"
+            def events():
+                total = 0
+                if sectioned:
+                    # The questions of each section are sent as soon as the section is done
+                    failed_sections = []
+                    for index, quizzes in iter_quiz_sections(text, count, language=language):
+                        if quizzes is None:
+                            failed_sections.append(index)
+                        elif quizzes:
+                            total += len(quizzes)
+                            yield "quizzes", {"quizzes": quizzes}
+                    yield "done", {"total": total, "failed_sections": sorted(failed_sections)}
+                    return
+                # One streamed Gemini call, each question sent as soon as it is complete
+                for quiz in stream_quizzes(text, language=language):
+                    total += 1
+                    yield "quizzes", {"quizzes": [quiz]}
+                yield "done", {"total": total}
+            return sse_response(events())
+        
+        try:
+            if sectioned:
+                # Sections generated concurrently, duplicates across sections removed
+                results = generate_quizzes_sectioned(text, count, language=language)
+                # Incomplete; the next request should try the failed sections again
+                headers = {"Cache-Control": "no-store"} if results["failed_sections"] else None
+                return Response({
+                    "quizzes": results["quizzes"],
+                    "sections": results["sections"],
+                    "failed_sections": results["failed_sections"]
+                }, headers=headers)
+            # One schema-constrained Gemini call, no agent loop
+            return Response({"quizzes": generate_quizzes_direct(text, language=language)})
+        except Exception as e:
+            error_message = "فشل في إنشاء الاختبارات" if language == 'arabic' else "Failed to generate quizzes"
+            return Response({"error": f"{error_message}: {str(e)}", "language": language}, status=500)
     
-    try:
-        # Create a system message that explicitly instructions the LLM to respond in Arabic if input is Arabic
-        if language == 'arabic':
-            # Add language instruction to the input
-            input_with_instruction = f"""
-            هام جداً: يجب أن تكون جميع الإجابات باللغة العربية فقط.
-            
-            النص المدخل:
-            {text}
-            """
-            # Run the agent to generate quizzes with the instruction
-            quizzes_agent.invoke(input_with_instruction)
-        else:
-            # Run the agent with original text for English
-            quizzes_agent.invoke(text)
+    # Create a system message that explicitly instructions the LLM to respond in Arabic if input is Arabic
+    if language == 'arabic':
+        # Add language instruction to the input
+        input_with_instruction = f"""
+        هام جداً: يجب أن تكون جميع الإجابات باللغة العربية فقط.
         
-        # Extract the output from the system
-        agent_output = new_stdout.getvalue()
-    finally:
-        # Restore stdout to normal
-        sys.stdout = old_stdout
+        النص المدخل:
+        {text}
+        """
+        # Run the agent to generate quizzes with the instruction
+        _, agent_output = run_agent(create_quizzes_agent(), input_with_instruction)
+    else:
+        # Run the agent with original text for English
+        _, agent_output = run_agent(create_quizzes_agent(), text)
     
     # Extract quizzes from the output
     quizzes = extract_quizzes_from_output(agent_output)
     
     if not quizzes:
         # Fallback - direct generation if extraction failed
-        import re
         from .utils import quiz_tool
         
         # Call quiz_tool directly to avoid agent overhead
-        direct_output = quiz_tool(text)
-        
-        if language == 'arabic':
-            # More flexible pattern for direct Arabic output
-            quiz_pattern = r'س: (.*?)(?:\n|\r\n|\s+)(أ|أ\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(ب|ب\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(ج|ج\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(د|د\.)\.?\s*(.*?)(?:\n|\r\n|\s+)(?:الإجابة الصحيحة:?|الجواب الصحيح:?)\s*([أ-د])'
-            quiz_matches = re.findall(quiz_pattern, direct_output, re.DOTALL)
-            
-            for match in quiz_matches:
-                question = match[0].strip()
-                option_a = match[2].strip()
-                option_b = match[4].strip()
-                option_c = match[6].strip()
-                option_d = match[8].strip()
-                correct_answer = match[9].strip()
-                
-                quizzes.append({
-                    "question": question,
-                    "options": {
-                        "أ": option_a,
-                        "ب": option_b,
-                        "ج": option_c,
-                        "د": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
-        else:
-            # Direct extraction from the output for English
-            quiz_pattern = r'Q: (.*?)\nA\. (.*?)\nB\. (.*?)\nC\. (.*?)\nD\. (.*?)\nCorrect Answer: ([A-D])'
-            quiz_matches = re.findall(quiz_pattern, direct_output, re.DOTALL)
-            
-            for match in quiz_matches:
-                question, option_a, option_b, option_c, option_d, correct_answer = map(str.strip, match)
-                quizzes.append({
-                    "question": question,
-                    "options": {
-                        "A": option_a,
-                        "B": option_b,
-                        "C": option_c,
-                        "D": option_d
-                    },
-                    "correct_answer": correct_answer
-                })
+        quizzes = extract_quizzes_from_output(quiz_tool(text))
     
     if not quizzes:
         if language == 'arabic':
@@ -0,0 +1,51 @@
+import time
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+from . import utils
+
+
+class StudyPackTests(SimpleTestCase):
+    def test_parts_arrive_as_they_finish(self):
+        def part(delay, result=None):
+            def build(text, language):
+                time.sleep(delay)
+                if result is None:
+                    raise RuntimeError("quota exceeded")
+                return result
+            return build
+
+        builders = {
+            "summary": part(0.2, {"summary": "Rest matters."}),
+            "quizzes": part(0.1),
+            "flashcards": part(0, {"flashcards": []}),
+            "diagram": part(5, {"diagram_code": "graph LR"}),
+        }
+        timeouts = dict(utils.PART_TIMEOUTS, diagram=0.5)
+        started = time.monotonic()
+        with mock.patch.dict(utils.BUILDERS, builders):
+            results = list(utils.iter_study_pack("Rest between sets.", "english", timeouts=timeouts))
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([part for part, _, _ in results], ["flashcards", "quizzes", "summary", "diagram"])
+        self.assertEqual(results[2][1], {"summary": "Rest matters."})
+        self.assertEqual(results[1][2], "quota exceeded")
+        self.assertIn("Timed out", results[3][2])
+
+
+@override_settings(GENERATION_CACHE={"ENABLED": False})
+class PartialStudyPackTests(SimpleTestCase):
+    def test_summary_missing_sections_is_not_cached(self):
+        summary = {"summary": "Rest matters.", "key_points": ["Rest."], "main_topics": ["Rest"],
+                   "sections": 3, "failed_sections": [1]}
+        with mock.patch.object(utils.summary_utils, "generate_summary_long", return_value=summary), \
+                mock.patch.dict(utils.BUILDERS, flashcards=lambda text, language: {"flashcards": []}):
+            response = APIClient().post("/agent/generate_study_pack/", {
+                "text": "Rest between heavy sets. " * 2000, "parts": ["summary", "flashcards"]
+            }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["errors"], {})
+        self.assertEqual(response.json()["partial"], ["summary"])
+        self.assertEqual(response.json()["summary"]["failed_sections"], [1])
+        self.assertEqual(response["Cache-Control"], "no-store")
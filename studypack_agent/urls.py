@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import generate_study_pack
+
+urlpatterns = [
+    path("generate_study_pack/", generate_study_pack, name="generate_study_pack"),
+]
@@ -0,0 +1,113 @@
+import logging
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from diagram_agent import utils as diagram_utils
+from flashcards_agent import utils as flashcards_utils
+from quizes_agent import utils as quizzes_utils
+from summraiz_agent import utils as summary_utils
+
+logger = logging.getLogger(__name__)
+
+# A study pack is the summary, quiz, flashcards and diagram of one text,
+# generated concurrently instead of in four requests one after another.
+
+PARTS = ("summary", "quizzes", "flashcards", "diagram")
+
+# Seconds each part may take before it is reported as timed out
+PART_TIMEOUTS = {
+    "summary": 90,
+    "quizzes": 120,
+    "flashcards": 90,
+    "diagram": 60,
+}
+
+# Part of the result cache key; changes with the prompts of any part
+PROMPT_VERSION = ".".join([
+    summary_utils.PROMPT_VERSION,
+    quizzes_utils.PROMPT_VERSION,
+    flashcards_utils.PROMPT_VERSION,
+    diagram_utils.PROMPT_VERSION
+])
+
+def prepare_text(text):
+    """Unicode-normalize the text once for every part; line breaks are kept for sectioning."""
+    return unicodedata.normalize("NFC", text).strip()
+
+def build_summary(text, language):
+    """Same output as generate_summary in direct mode."""
+    if len(text) > summary_utils.LONG_DOCUMENT_CHARS:
+        results = summary_utils.generate_summary_long(text, language=language)
+        results["key_points"] = results["key_points"] or ["No key points identified."]
+        return results
+    results = summary_utils.generate_summary_direct(text, language=language)
+    return {
+        "summary": results["summary"],
+        "key_points": results["key_points"] or ["No key points identified."]
+    }
+
+def build_quizzes(text, language):
+    """Same output as generate_quizzes in direct mode."""
+    if len(text) > quizzes_utils.SECTION_CHARS:
+        count = min(quizzes_utils.MAX_QUESTIONS, max(5, len(text) // quizzes_utils.SECTION_CHARS + 1))
+        return quizzes_utils.generate_quizzes_sectioned(text, count, language=language)
+    return {"quizzes": quizzes_utils.generate_quizzes_direct(text, language=language)}
+
+def build_flashcards(text, language):
+    """Same output as generate_flashcards in direct mode."""
+    return {"flashcards": flashcards_utils.generate_flashcards_direct(text, language=language)}
+
+def build_diagram(text, language):
+    """Same output as generate_diagram in direct mode."""
+    if len(text) > diagram_utils.HIERARCHICAL_CHARS:
+        return diagram_utils.generate_diagram_hierarchical(text, language=language)
+    return {"diagram_code": diagram_utils.generate_diagram_direct(text, language=language)}
+
+def is_partial(result):
+    """Whether a long-text part left some sections out (see failed_sections)."""
+    return bool(result.get("failed_sections"))
+
+BUILDERS = {
+    "summary": build_summary,
+    "quizzes": build_quizzes,
+    "flashcards": build_flashcards,
+    "diagram": build_diagram,
+}
+
+def iter_study_pack(text, language, parts=PARTS, timeouts=PART_TIMEOUTS):
+    """
+    Generate the parts concurrently and yield (part, result, error) as each one finishes.
+
+    A part that fails, or is still running after its timeout, is yielded with
+    result None and an error message; the others are not affected. The total
+    time is that of the slowest part, not the sum.
+
+    Timed-out parts are not cancelled: every part starts at once, and a running
+    Gemini call cannot be interrupted from another thread. It is left to finish
+    in its worker thread and its result is discarded; the pool is shut down
+    without waiting, so the response never waits for it.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(parts))
+    started = time.monotonic()
+    try:
+        pending = {executor.submit(BUILDERS[part], text, language): part for part in parts}
+        while pending:
+            deadline = min(started + timeouts[part] for part in pending.values())
+            done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                part = pending.pop(future)
+                try:
+                    yield part, future.result(), None
+                except Exception as e:
+                    logger.warning(f"Study pack part {part} failed: {e}")
+                    yield part, None, str(e)
+
+            now = time.monotonic()
+            for future, part in list(pending.items()):
+                if now >= started + timeouts[part]:
+                    # Already running, so cancel() would be a no-op: it finishes unobserved
+                    del pending[future]
+                    logger.warning(f"Study pack part {part} timed out")
+                    yield part, None, f"Timed out after {timeouts[part]} seconds"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,62 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from common.cache import cached_generation
+from common.language import detect_language
+from common.streaming import sse_response, wants_stream
+from .utils import is_partial, iter_study_pack, prepare_text, PARTS, PROMPT_VERSION
+
+@api_view(["POST"])
+@cached_generation("study_pack", params={"parts": list(PARTS)}, version=PROMPT_VERSION)
+def generate_study_pack(request):
+    """
+    Generates the summary, quizzes, flashcards and diagram of one text concurrently.
+
+    "parts" selects a subset. With "stream": true each part is sent as a
+    server-sent event named after it as soon as it is ready, a failed or timed
+    out part as a "part_failed" event, and a final "done" event lists both.
+    Parts of a long text that left some sections out are listed in "partial".
+    """
+    text = prepare_text(request.data.get("text", ""))
+
+    if not text:
+        return Response({"error": "Text is required"}, status=400)
+
+    parts = request.data.get("parts", list(PARTS))
+    if not isinstance(parts, list) or not parts or any(part not in PARTS for part in parts):
+        return Response({"error": f"parts must be a list of {', '.join(PARTS)}"}, status=400)
+    parts = [part for part in PARTS if part in parts]
+
+    # Detected once for every part
+    language = detect_language(text)
+
+    if wants_stream(request):
+        def events():
+            yield "start", {"language": language, "parts": parts}
+            completed, failed, partial = [], [], []
+            for part, result, error in iter_study_pack(text, language, parts):
+                if error is None:
+                    completed.append(part)
+                    if is_partial(result):
+                        partial.append(part)
+                    yield part, result
+                else:
+                    failed.append(part)
+                    yield "part_failed", {"part": part, "error": error}
+            yield "done", {"completed": completed, "failed": failed, "partial": partial}
+        return sse_response(events())
+
+    response = {"language": language, "errors": {}, "partial": []}
+    for part, result, error in iter_study_pack(text, language, parts):
+        if error is None:
+            response[part] = result
+            if is_partial(result):
+                response["partial"].append(part)
+        else:
+            response["errors"][part] = error
+
+    if len(response["errors"]) == len(parts):
+        return Response({"error": "Failed to generate the study pack", **response}, status=500)
+    if response["errors"] or response["partial"]:
+        # Incomplete; the next request should try the missing parts and sections again
+        return Response(response, headers={"Cache-Control": "no-store"})
+    return Response(response)
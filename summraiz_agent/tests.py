@@ -1,3 +1,77 @@
-from django.test import TestCase
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+from common import cache
+from common.structured import StructuredOutputError
+from . import utils
 
-# Create your tests here.
+SUMMARY = {"summary": "Rest matters.", "key_points": ["Rest two minutes."]}
+
+
+class LongDocumentTests(SimpleTestCase):
+    def test_sections_and_merge_share_one_retry_policy(self):
+        text = "\n\n".join(f"Paragraph {index}. " + "Rest between heavy sets. " * 40 for index in range(8))
+        calls = []
+        def generate(prompt, schema, **kwargs):
+            calls.append(schema)
+            self.assertEqual(kwargs["attempts"], 1)
+            if schema is utils.LONG_SUMMARY_SCHEMA:
+                # The merge succeeds on its last attempt
+                if calls.count(schema) < utils.GENERATION_ATTEMPTS:
+                    raise StructuredOutputError("bad merge")
+                return dict(SUMMARY, main_topics=["Rest"])
+            if "Paragraph 0." in prompt:
+                raise StructuredOutputError("bad section")
+            return dict(SUMMARY)
+
+        with mock.patch.object(utils, "generate_structured", side_effect=generate), \
+                mock.patch.object(utils.time, "sleep"):
+            result = utils.generate_summary_long(text, section_chars=1200, language="english")
+
+        self.assertEqual(result["failed_sections"], [0])
+        self.assertEqual(result["summary"], "Rest matters.")
+        self.assertEqual(calls.count(utils.LONG_SUMMARY_SCHEMA), utils.GENERATION_ATTEMPTS)
+        self.assertEqual(calls.count(utils.SUMMARY_SCHEMA), utils.GENERATION_ATTEMPTS + result["sections"] - 1)
+
+
+@override_settings(GENERATION_CACHE={"ENABLED": False})
+class SummaryModeTests(SimpleTestCase):
+    def post(self, data):
+        return APIClient().post("/agent/generate_summary/", data, format="json")
+
+    def test_agent_mode_is_respected_for_long_documents(self):
+        text = "Rest between heavy sets. " * 2000
+        output = "Summary: Rest matters.\nKey Point 1: Rest two minutes."
+        with mock.patch("summraiz_agent.views.generate_summary_long") as generate_long, \
+                mock.patch("summraiz_agent.views.summary_tool", return_value=output):
+            response = self.post({"text": text, "mode": "agent"})
+            generate_long.assert_not_called()
+        self.assertEqual(response.json()["summary"], "Rest matters.")
+
+        self.assertEqual(self.post({"text": text, "mode": "agent", "long_document": True}).status_code, 400)
+
+
+@override_settings(GENERATION_CACHE={"BACKEND": "lru"})
+class LongDocumentCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache._backend = None
+        self.addCleanup(setattr, cache, "_backend", None)
+
+    def post(self, text):
+        return APIClient().post("/agent/generate_summary/", {"text": text}, format="json")
+
+    def test_partial_summaries_are_not_cached(self):
+        text = "Rest between heavy sets. " * 2000
+        results = dict(SUMMARY, main_topics=["Rest"], sections=4, failed_sections=[2])
+        with mock.patch("summraiz_agent.views.generate_summary_long", return_value=results) as generate_long:
+            response = self.post(text)
+            self.assertEqual(response["Cache-Control"], "no-store")
+            self.assertEqual(response["Cache-Status"], "generation; fwd=miss")
+            # The next request tries the failed sections again
+            self.post(text)
+            self.assertEqual(generate_long.call_count, 2)
+
+        with mock.patch("summraiz_agent.views.generate_summary_long", return_value=dict(results, failed_sections=[])):
+            response = self.post(text)
+        self.assertFalse(response.has_header("Cache-Control"))
+        self.assertEqual(response["Cache-Status"], "generation; fwd=miss; stored")
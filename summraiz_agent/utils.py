@@ -1,40 +1,36 @@
 import os
+import re
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
-import langdetect
-import re
+from common.agents import build_agent
+from common.language import detect_language
+from common.parsing import SummaryParser, parse_text
+from common.extractive import extractive_summary
+from common.sections import split_sections
+from common.structured import StructuredOutputError, generate_structured
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def detect_language(text):
-    """
-    Enhanced language detection with better handling for mixed texts.
-    Supports Arabic, English, and many other languages.
-    """
-    try:
-        language = langdetect.detect(text)
-        language_map = {
-            'ar': 'arabic',
-            'en': 'english',
-            'fr': 'french',
-            'es': 'spanish',
-            'de': 'german',
-            'zh': 'chinese',
-            'ru': 'russian',
-            'ja': 'japanese',
-            'hi': 'hindi',
-            'ur': 'urdu',
-            'fa': 'farsi',
-            'tr': 'turkish'
-        }
-        return language_map.get(language, 'english')
-    except:
-        return 'english'  # Default to English if detection fails
+# Part of the result cache key; bump it whenever the prompts or the output format change
+PROMPT_VERSION = "1"
+
+def key_point_range(input_text):
+    """Number of key points to ask for, depending on the length of the text."""
+    min_points = 3
+    max_points = 7
+    if len(input_text) > 3000:
+        max_points = 10
+    elif len(input_text) < 500:
+        max_points = 5
+    return min_points, max_points
 
 def summary_tool(input_text, detailed=True):
     """
@@ -50,12 +46,7 @@ def summary_tool(input_text, detailed=True):
     language = detect_language(input_text)
     
     # Calculate appropriate number of key points based on text length
-    min_points = 3
-    max_points = 7
-    if len(input_text) > 3000:
-        max_points = 10
-    elif len(input_text) < 500:
-        max_points = 5
+    min_points, max_points = key_point_range(input_text)
     
     if language == 'arabic':
         prompt = f"""
@@ -121,6 +112,188 @@ def summary_tool(input_text, detailed=True):
     response = model.generate_content(prompt)
     return response.text
 
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["summary", "key_points"]
+}
+
+def _check_summary(data):
+    summary = data["summary"].strip()
+    key_points = [point.strip() for point in data["key_points"] if point.strip()]
+    if not summary:
+        raise StructuredOutputError("Empty summary")
+    return {"summary": summary, "key_points": key_points}
+
+def generate_summary_direct(input_text, language=None):
+    """
+    Summary and key points from a single schema-constrained Gemini call.
+    Returns {"summary": str, "key_points": [str]}.
+    """
+    language = language or detect_language(input_text)
+    min_points, max_points = key_point_range(input_text)
+    if language == 'arabic':
+        prompt = f"""
+        لخص النص التالي في فقرة واحدة مكثفة، واستخرج {min_points}-{max_points} نقاط رئيسية مع شرح موجز لكل نقطة.
+        يجب أن يكون الملخص والنقاط باللغة العربية.
+        
+        {input_text}
+        """
+    else:
+        prompt = f"""
+        Summarize the following text in one concise paragraph, written in {language},
+        and extract {min_points}-{max_points} key points, each with a brief explanation.
+        
+        {input_text}
+        """
+    return generate_structured(prompt, SUMMARY_SCHEMA, temperature=0.7, check=_check_summary)
+
+def generate_summary_fast(input_text):
+    """
+    Extractive summary and key points picked locally with TextRank, no Gemini call.
+    Returns {"summary": str, "key_points": [str]} in tens of milliseconds.
+    """
+    return extractive_summary(input_text, key_point_range(input_text))
+
+# Long documents: summarize sections concurrently (map), then merge (reduce)
+LONG_DOCUMENT_CHARS = 30000
+SECTION_CHARS = 12000
+MAX_PARALLEL_SECTIONS = 4
+# Model calls per section summary and per merge, with backoff between them
+GENERATION_ATTEMPTS = 3
+# Merged section summaries longer than this are reduced in several rounds
+REDUCE_INPUT_CHARS = 40000
+
+LONG_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_points": {"type": "array", "items": {"type": "string"}},
+        "main_topics": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["summary", "key_points", "main_topics"]
+}
+
+def _generate_with_retries(prompt, schema, check):
+    """
+    generate_structured with GENERATION_ATTEMPTS model calls in total, backing
+    off between them; the one retry policy of the map and reduce steps.
+    """
+    for attempt in range(GENERATION_ATTEMPTS):
+        try:
+            return generate_structured(prompt, schema, temperature=0.3, check=check, attempts=1)
+        except Exception as e:
+            logger.warning(f"Summary generation failed (attempt {attempt + 1}/{GENERATION_ATTEMPTS}): {e}")
+            if attempt + 1 == GENERATION_ATTEMPTS:
+                raise
+            time.sleep(2 ** attempt)
+
+def summarize_section(text, language, title=None):
+    """
+    Summary and key points of one section, retried on its own when it fails.
+    Returns None if every attempt failed.
+    """
+    heading = f"{title}\n\n" if title else ""
+    if language == 'arabic':
+        prompt = f"""
+        هذا جزء من مستند طويل. لخص هذا الجزء في فقرة قصيرة واستخرج 3-5 نقاط رئيسية.
+        يجب أن يكون الملخص والنقاط باللغة العربية.
+        
+        {heading}{text}
+        """
+    else:
+        prompt = f"""
+        This is one section of a longer document, written in {language}.
+        Summarize this section in a short paragraph and extract 3-5 key points, in the same language.
+        
+        {heading}{text}
+        """
+    try:
+        return _generate_with_retries(prompt, SUMMARY_SCHEMA, _check_summary)
+    except Exception:
+        return None
+
+def _merge_summaries(partials, language, min_points, max_points):
+    """
+    The reduce step: merge section summaries into the final result.
+    """
+    combined = "\n\n".join(
+        f"[{index + 1}] {partial['summary']}\n" + "\n".join(f"- {point}" for point in partial["key_points"])
+        for index, partial in enumerate(partials)
+    )
+    if language == 'arabic':
+        prompt = f"""
+        فيما يلي ملخصات أجزاء مستند طويل بالترتيب. ادمجها في ملخص واحد للمستند بأكمله في فقرة مكثفة،
+        و{min_points}-{max_points} نقاط رئيسية، و3-5 مواضيع رئيسية. يجب أن تكون النتيجة باللغة العربية.
+        
+        {combined}
+        """
+    else:
+        prompt = f"""
+        Below are summaries of the sections of a long document, in order. Merge them into one summary
+        of the whole document in a concise paragraph, {min_points}-{max_points} key points and 3-5 main topics,
+        written in {language}.
+        
+        {combined}
+        """
+
+    def check(data):
+        result = _check_summary(data)
+        result["main_topics"] = [topic.strip() for topic in data["main_topics"] if topic.strip()]
+        return result
+
+    return _generate_with_retries(prompt, LONG_SUMMARY_SCHEMA, check)
+
+def generate_summary_long(input_text, max_workers=MAX_PARALLEL_SECTIONS, section_chars=SECTION_CHARS,
+                          language=None):
+    """
+    Map-reduce summary of a long document.
+
+    The text is split at section boundaries, sections are summarized
+    concurrently (at most max_workers at a time, each retried on its own),
+    and the section summaries are merged into summary, key_points and
+    main_topics. Sections that still fail are reported in failed_sections.
+    """
+    language = language or detect_language(input_text)
+    min_points, max_points = key_point_range(input_text)
+    sections = split_sections(input_text, section_chars)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        partials = list(executor.map(
+            lambda section: summarize_section(section.text, language, section.title), sections
+        ))
+    failed_sections = [index for index, partial in enumerate(partials) if partial is None]
+    partials = [partial for partial in partials if partial is not None]
+    if not partials:
+        raise StructuredOutputError("Every section failed to summarize")
+
+    # Many sections: merge groups of section summaries first
+    while sum(len(partial["summary"]) for partial in partials) > REDUCE_INPUT_CHARS and len(partials) > 1:
+        groups = []
+        group, size = [], 0
+        for partial in partials:
+            if group and size + len(partial["summary"]) > REDUCE_INPUT_CHARS // 2:
+                groups.append(group)
+                group, size = [], 0
+            group.append(partial)
+            size += len(partial["summary"])
+        groups.append(group)
+        if len(groups) == len(partials):
+            # Summaries too long to group; merge them in one step
+            break
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            partials = list(executor.map(
+                lambda group: _merge_summaries(group, language, min_points, max_points), groups
+            ))
+
+    result = _merge_summaries(partials, language, min_points, max_points)
+    result["sections"] = len(sections)
+    result["failed_sections"] = failed_sections
+    return result
+
 # Define tool for LangChain agent
 summary_tool_obj = Tool(
     name="Enhanced Text Analyzer",
@@ -134,20 +307,21 @@ summary_tool_obj = Tool(
 
 # Initialize LangChain agent with Gemini
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-agent = initialize_agent(
-    tools=[summary_tool_obj],
-    llm=llm,
-    agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    memory=memory
-)
+
+def create_agent():
+    """Summary agent with fresh memory, one per request."""
+    return build_agent([summary_tool_obj], llm)
+
+# Items of the main topics and important quotes lists
+LIST_ITEM_SEPARATOR = re.compile(r'\d+\.\s*|\-\s*|\•\s*')
+# One "term: definition" per line of the key terms
+KEY_TERM_PATTERN = re.compile(r'^\s*(?:[-•*]\s*)?([^:\n]+):[ \t]*(.+)$', re.MULTILINE)
 
 # Enhanced function to extract structured information from agent output
 def extract_summary_from_output(output_text):
     """
     Extract structured analysis information from the agent's output text.
-    Handles both Arabic and English formats with improved pattern matching.
+    Handles both Arabic and English formats; the first occurrence of each field is used.
     """
     # Initialize result dictionary with all possible fields
     result = {
@@ -162,59 +336,20 @@ def extract_summary_from_output(output_text):
         "key_terms": {}
     }
     
-    # Check if output contains Arabic format
-    is_arabic = 'ملخص:' in output_text or 'ملخص :' in output_text
-    
-    if is_arabic:
-        # Arabic extraction patterns
-        patterns = {
-            "summary": [r'ملخص: (.*?)(?=نقطة رئيسية|\n\n|$)', r'ملخص : (.*?)(?=نقطة رئيسية|\n\n|$)'],
-            "key_points": [r'نقطة رئيسية (\d+): (.*?)(?=نقطة رئيسية|\n\n|$)', r'نقطة رئيسية (\d+) : (.*?)(?=نقطة رئيسية|\n\n|$)'],
-            "main_topics": [r'المواضيع الرئيسية: (.*?)(?=تحليل النبرة|\n\n|$)', r'المواضيع الرئيسية : (.*?)(?=تحليل النبرة|\n\n|$)'],
-            "tone_analysis": [r'تحليل النبرة: (.*?)(?=تحليل المشاعر|\n\n|$)', r'تحليل النبرة : (.*?)(?=تحليل المشاعر|\n\n|$)'],
-            "sentiment_analysis": [r'تحليل المشاعر: (.*?)(?=اقتباسات مهمة|\n\n|$)', r'تحليل المشاعر : (.*?)(?=اقتباسات مهمة|\n\n|$)'],
-            "important_quotes": [r'اقتباسات مهمة: (.*?)(?=استنتاجات ورؤى|\n\n|$)', r'اقتباسات مهمة : (.*?)(?=استنتاجات ورؤى|\n\n|$)'],
-            "conclusions": [r'استنتاجات ورؤى: (.*?)(?=الجمهور المستهدف|\n\n|$)', r'استنتاجات ورؤى : (.*?)(?=الجمهور المستهدف|\n\n|$)'],
-            "target_audience": [r'الجمهور المستهدف: (.*?)(?=مصطلحات رئيسية|\n\n|$)', r'الجمهور المستهدف : (.*?)(?=مصطلحات رئيسية|\n\n|$)'],
-            "key_terms": [r'مصطلحات رئيسية: (.*?)(?=\n\n|$)', r'مصطلحات رئيسية : (.*?)(?=\n\n|$)']
-        }
-    else:
-        # English extraction patterns
-        patterns = {
-            "summary": [r'Summary: (.*?)(?=Key Point|\n\n|$)'],
-            "key_points": [r'Key Point (\d+): (.*?)(?=Key Point|\n\n|Main Topics:|$)'],
-            "main_topics": [r'Main Topics: (.*?)(?=Tone Analysis|\n\n|$)'],
-            "tone_analysis": [r'Tone Analysis: (.*?)(?=Sentiment Analysis|\n\n|$)'],
-            "sentiment_analysis": [r'Sentiment Analysis: (.*?)(?=Important Quotes|\n\n|$)'],
-            "important_quotes": [r'Important Quotes: (.*?)(?=Conclusions & Insights|\n\n|$)'],
-            "conclusions": [r'Conclusions & Insights: (.*?)(?=Target Audience|\n\n|$)'],
-            "target_audience": [r'Target Audience: (.*?)(?=Key Terms|\n\n|$)'],
-            "key_terms": [r'Key Terms: (.*?)(?=\n\n|$)']
-        }
-    
-    # Extract data using patterns
-    for field, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            if field == "key_points":
-                matches = re.findall(pattern, output_text, re.DOTALL)
-                if matches:
-                    for idx, point in matches:
-                        result["key_points"].append(point.strip())
-                    break
-            else:
-                match = re.search(pattern, output_text, re.DOTALL)
-                if match:
-                    if field in ["main_topics", "important_quotes"]:
-                        # Split list items
-                        items = re.split(r'\d+\.\s*|\-\s*|\•\s*', match.group(1).strip())
-                        result[field] = [item.strip() for item in items if item.strip()]
-                    elif field == "key_terms":
-                        # Process key terms to create a dictionary
-                        terms_text = match.group(1).strip()
-                        term_matches = re.findall(r'([^:]+):\s*([^•]+)(?=\n|$)', terms_text)
-                        result[field] = {term.strip(): desc.strip() for term, desc in term_matches}
-                    else:
-                        result[field] = match.group(1).strip()
-                    break
+    for item in parse_text(SummaryParser(), output_text, prefer_observations=False):
+        field, text = item["field"], item["text"]
+        if field == "key_point":
+            result["key_points"].append(text)
+        elif result[field]:
+            continue
+        elif field in ["main_topics", "important_quotes"]:
+            # Split list items
+            items = LIST_ITEM_SEPARATOR.split(text)
+            result[field] = [item.strip() for item in items if item.strip()]
+        elif field == "key_terms":
+            # Process key terms to create a dictionary
+            result[field] = {term.strip(): desc.strip() for term, desc in KEY_TERM_PATTERN.findall(text)}
+        else:
+            result[field] = text
     
-    return result
\ No newline at end of file
+    return result
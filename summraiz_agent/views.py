@@ -2,12 +2,14 @@
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .utils import agent, extract_summary_from_output, detect_language, summary_tool
-import io
-import sys
+from common.cache import cached_generation
+from common.callbacks import run_agent
+from common.structured import DIRECT_MODE, FAST_MODE, GENERATION_MODES
+from .utils import create_agent, extract_summary_from_output, detect_language, summary_tool, generate_summary_direct, generate_summary_fast, generate_summary_long, LONG_DOCUMENT_CHARS, PROMPT_VERSION
 import re
 
 @api_view(["POST"])
+@cached_generation("summary", params={"mode": DIRECT_MODE, "long_document": None}, version=PROMPT_VERSION)
 def generate_summary(request):
     """Generates a summary and key points from the provided text.
     
@@ -18,30 +20,64 @@ def generate_summary(request):
     if not text:
         return Response({"error": "Text is required"}, status=400)
     
+    mode = request.data.get("mode", DIRECT_MODE)
+    modes = GENERATION_MODES + (FAST_MODE,)
+    if mode not in modes:
+        return Response({"error": f"mode must be one of {', '.join(modes)}"}, status=400)
+    
     # Detect language of the input text
     language = detect_language(text)
     
+    if mode == FAST_MODE:
+        # Extractive preview picked locally; clients can ask for mode=direct to refine it
+        results = generate_summary_fast(text)
+        return Response({
+            "summary": results["summary"],
+            "key_points": results["key_points"] or ["No key points identified."],
+            "language": language
+        })
+    
+    # Long-document mode (direct mode only): explicit, or automatic for texts over LONG_DOCUMENT_CHARS
+    long_document = request.data.get("long_document")
+    if isinstance(long_document, str):
+        long_document = long_document.lower() in ("1", "true")
+    if long_document and mode != DIRECT_MODE:
+        return Response({"error": f"long_document requires mode {DIRECT_MODE}"}, status=400)
+    if long_document is None:
+        long_document = mode == DIRECT_MODE and len(text) > LONG_DOCUMENT_CHARS
+    
     try:
+        if long_document:
+            # Sections summarized concurrently, then merged
+            results = generate_summary_long(text)
+            # Incomplete; the next request should try the failed sections again
+            headers = {"Cache-Control": "no-store"} if results["failed_sections"] else None
+            return Response({
+                "summary": results["summary"],
+                "key_points": results["key_points"] or ["No key points identified."],
+                "main_topics": results["main_topics"],
+                "sections": results["sections"],
+                "failed_sections": results["failed_sections"],
+                "language": language
+            }, headers=headers)
+        
+        if mode == DIRECT_MODE:
+            # One schema-constrained Gemini call, no text format to scrape
+            results = generate_summary_direct(text)
+            return Response({
+                "summary": results["summary"],
+                "key_points": results["key_points"] or ["No key points identified."],
+                "language": language
+            })
+        
         # Try direct tool call first for better reliability
         direct_result = summary_tool(text)
         results = extract_summary_from_output(direct_result)
         
         # If direct call didn't work well, try the agent approach
         if not results["summary"] and not results["key_points"]:
-            # Capture the console output during agent execution
-            old_stdout = sys.stdout
-            new_stdout = io.StringIO()
-            sys.stdout = new_stdout
-            
-            try:
-                # Run the agent
-                agent.invoke(text)
-                
-                # Get the console output
-                agent_output = new_stdout.getvalue()
-            finally:
-                # Restore stdout
-                sys.stdout = old_stdout
+            # Run the agent, capturing the observations of this request only
+            _, agent_output = run_agent(create_agent(), text)
             
             # Extract summary and key points from the output
             results = extract_summary_from_output(agent_output)